@@ -0,0 +1,113 @@
+"""Compares the pandas and Polars backends of the cleaning stages."""
+import argparse
+import json
+import platform
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.append(str(PROJECT_ROOT / 'data_pipeline' / 'src' / 'data'))
+# pylint: disable=E0401,C0413
+import benchmark_pipeline
+import filter_data
+import filter_plan
+import generate_synthetic_data
+import process_data
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+
+def run_backend(raw_df, backend, repeat):
+    """
+    Cleans and filters the raw rows on a backend, best of repeat runs.
+    Returns the cleaned and filtered frames and the seconds of both stages.
+    """
+    best = {'process_data': float('inf'), 'filter_data': float('inf')}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cleaned_df = process_data.clean_data(raw_df, backend=backend)
+        cleaned = time.perf_counter()
+        filtered_df = filter_data.filter_outliers(cleaned_df, backend=backend)
+        best['process_data'] = min(best['process_data'], cleaned - start)
+        best['filter_data'] = min(best['filter_data'],
+                                  time.perf_counter() - cleaned)
+    return cleaned_df, filtered_df, best
+
+
+def benchmark_size(n_rows, seed, repeat):
+    """
+    Times both backends on n_rows synthetic rows and checks that they
+    return the same rows and values.
+    """
+    raw_df = generate_synthetic_data.generate_raw_data(n_rows, seed)
+    results = {}
+    for backend in filter_plan.BACKENDS:
+        results[backend] = run_backend(raw_df, backend, repeat)
+
+    reference = results['pandas']
+    records = []
+    for backend, (cleaned_df, filtered_df, seconds) in results.items():
+        pd.testing.assert_frame_equal(cleaned_df, reference[0])
+        pd.testing.assert_frame_equal(filtered_df, reference[1])
+        for stage, stage_seconds in seconds.items():
+            speedup = reference[2][stage] / stage_seconds
+            records.append({'backend': backend, 'stage': stage,
+                            'rows_in': n_rows, 'seconds': stage_seconds,
+                            'speedup': speedup})
+            print(f"{stage:<15} {backend:<8} {n_rows:>9} rows  "
+                  f"{stage_seconds:8.3f} s  x{speedup:.2f}")
+    return records
+
+
+def run_benchmarks(sizes, seed, repeat,
+                   results_folder=benchmark_pipeline.RESULTS_FOLDER):
+    """Runs the comparison for every size and stores the results as JSON."""
+    import polars
+
+    results = {
+        'commit': benchmark_pipeline.git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'polars': polars.__version__,
+        'polars_threads': polars.thread_pool_size(),
+        'seed': seed,
+        'sizes': {},
+    }
+    for n_rows in sizes:
+        print(f'--- {n_rows} rows')
+        results['sizes'][str(n_rows)] = benchmark_size(n_rows, seed, repeat)
+
+    results_folder = Path(results_folder)
+    results_folder.mkdir(parents=True, exist_ok=True)
+    results_file = results_folder / (
+        f"{results['timestamp'].replace(':', '')}_{results['commit']}"
+        f"_backends.json")
+    with open(results_file, 'w', encoding='utf8') as f:
+        json.dump(results, f, indent=4)
+    print(f'Results saved to {results_file}')
+    return results_file
+
+
+def main():
+    """Function accepting arguments"""
+    parser = argparse.ArgumentParser(
+        description='Compare the pandas and Polars backends of the '
+                    'cleaning stages on synthetic data.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='Numbers of raw rows to benchmark.')
+    parser.add_argument('--seed', type=int, default=42,
+                        help='Seed of the synthetic data generator.')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Runs per backend, the fastest is reported.')
+
+    args = parser.parse_args()
+
+    run_benchmarks(args.sizes, args.seed, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""Stage-by-stage benchmark of the pipeline on synthetic auction data."""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.append(str(PROJECT_ROOT / 'data_pipeline' / 'src' / 'data'))
+sys.path.append(str(PROJECT_ROOT / 'model_training'))
+# pylint: disable=E0401,C0413
+import encode_data
+import encode_data_const
+import filter_data
+import generate_synthetic_data
+import process_data
+import stage_metrics
+import train_model
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+RESULTS_FOLDER = Path(__file__).resolve().parent / 'results'
+
+
+def git_commit():
+    """Returns the current commit hash, or 'unknown' outside of git."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+            check=True, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def timed(stage, rows_in, function, *args):
+    """Runs a single stage and returns its output with the timing record."""
+    start = time.perf_counter()
+    output = function(*args)
+    seconds = time.perf_counter() - start
+    record = {
+        'stage': stage,
+        'rows_in': rows_in,
+        'rows_out': len(output) if hasattr(output, '__len__') else None,
+        'seconds': seconds,
+        'rows_per_second': rows_in / seconds if seconds > 0 else None,
+        'peak_rss_bytes': stage_metrics.peak_rss_bytes(),
+    }
+    print(f"{stage:<45} {rows_in:>9} rows  {seconds:8.3f} s")
+    return output, record
+
+
+def benchmark_size(n_rows, seed):
+    """Times every stage of the pipeline on n_rows synthetic rows."""
+    records = []
+    raw_df, record = timed(
+        'generate_raw_data', n_rows,
+        generate_synthetic_data.generate_raw_data, n_rows, seed)
+    records.append(record)
+
+    cleaned_df, record = timed(
+        'process_data', len(raw_df), process_data.clean_data, raw_df)
+    records.append(record)
+
+    filtered_df, record = timed(
+        'filter_data', len(cleaned_df), filter_data.filter_outliers,
+        cleaned_df)
+    records.append(record)
+
+    encoded_df, record = timed(
+        'encode_data_const', len(filtered_df), encode_data_const.encode_frame,
+        filtered_df.reset_index(drop=True))
+    records.append(record)
+
+    for config in encode_data.get_all_configurations():
+        _, record = timed(
+            f"encode_data_{''.join(config.values())}", len(filtered_df),
+            encode_data.encode_frame, filtered_df.reset_index(drop=True),
+            config)
+        records.append(record)
+
+    X, y = train_model.split_features(encoded_df)
+    train_size = int(0.8 * len(X))
+    model, record = timed(
+        'train_model_fit', train_size, train_model.train_regressor,
+        X[:train_size], y[:train_size])
+    records.append(record)
+
+    _, record = timed(
+        'train_model_predict', len(X) - train_size, model.predict,
+        X[train_size:])
+    records.append(record)
+
+    return records
+
+
+def run_benchmarks(sizes, seed, results_folder=RESULTS_FOLDER):
+    """Runs the benchmark for every size and stores the results as JSON."""
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'seed': seed,
+        'sizes': {},
+    }
+    # The encoders write side files (e.g. artist_order.json) to the
+    # working directory, so the stages run in a scratch directory
+    working_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch_directory:
+        os.chdir(scratch_directory)
+        try:
+            for n_rows in sizes:
+                print(f'--- {n_rows} rows')
+                results['sizes'][str(n_rows)] = benchmark_size(n_rows, seed)
+        finally:
+            os.chdir(working_directory)
+
+    results_folder = Path(results_folder)
+    results_folder.mkdir(parents=True, exist_ok=True)
+    results_file = results_folder / (
+        f"{results['timestamp'].replace(':', '')}_{results['commit']}.json")
+    with open(results_file, 'w', encoding='utf8') as f:
+        json.dump(results, f, indent=4)
+    print(f'Results saved to {results_file}')
+    return results_file
+
+
+def compare_results(baseline_file, current_file):
+    """Prints the relative change of every stage between two result files."""
+    with open(baseline_file, 'r', encoding='utf8') as f:
+        baseline = json.load(f)
+    with open(current_file, 'r', encoding='utf8') as f:
+        current = json.load(f)
+
+    print(f"{baseline['commit']} -> {current['commit']}")
+    for size, records in current['sizes'].items():
+        baseline_seconds = {record['stage']: record['seconds']
+                            for record in baseline['sizes'].get(size, [])}
+        print(f'--- {size} rows')
+        for record in records:
+            before = baseline_seconds.get(record['stage'])
+            if before is None:
+                continue
+            change = (record['seconds'] - before) / before * 100
+            print(f"{record['stage']:<45} {before:8.3f} s "
+                  f"-> {record['seconds']:8.3f} s  {change:+7.1f}%")
+
+
+def main():
+    """Function accepting arguments"""
+    parser = argparse.ArgumentParser(
+        description='Benchmark the pipeline stages on synthetic data.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='Numbers of raw rows to benchmark.')
+    parser.add_argument('--seed', type=int, default=42,
+                        help='Seed of the synthetic data generator.')
+    parser.add_argument('--compare', type=str, nargs=2,
+                        metavar=('BASELINE', 'CURRENT'),
+                        help='Compare two stored result files instead.')
+
+    args = parser.parse_args()
+
+    if args.compare:
+        compare_results(*args.compare)
+    else:
+        run_benchmarks(args.sizes, args.seed)
+
+
+if __name__ == '__main__':
+    main()
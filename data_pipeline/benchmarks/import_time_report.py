@@ -0,0 +1,91 @@
+"""Import-time report of the Flask app and the pipeline entry points."""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+# (module, folder containing the module)
+ENTRY_POINTS = [
+    ('app', 'flask_app'),
+    ('train_model', 'model_training'),
+    ('run_pipeline', 'data_pipeline/src/data'),
+    ('process_data', 'data_pipeline/src/data'),
+    ('filter_data', 'data_pipeline/src/data'),
+    ('filter_by_date', 'data_pipeline/src/data'),
+    ('encode_data_const', 'data_pipeline/src/data'),
+    ('encode_data', 'data_pipeline/src/data'),
+    ('feature_scaling', 'data_pipeline/src/features'),
+]
+
+
+def parse_importtime(stderr, module):
+    """
+    Parses the output of 'python -X importtime -c "import <module>"'.
+
+    Returns:
+    tuple: Cumulative import time of the module in seconds and a list of
+    (name, cumulative seconds) of the modules it imports directly.
+    """
+    total_seconds, direct_imports = 0.0, []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        # Nested imports are indented by two spaces per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            direct_imports.append((name.strip(), int(cumulative_us) / 1e6))
+        elif depth == 0 and name.strip() == module:
+            total_seconds = int(cumulative_us) / 1e6
+    return total_seconds, direct_imports
+
+
+def measure_entry_point(module, folder):
+    """Imports the module in a fresh interpreter and times it."""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        filter(None, [str(PROJECT_ROOT / folder), env.get('PYTHONPATH')]))
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=PROJECT_ROOT, env=env, capture_output=True, text=True,
+        check=False)
+    wall_seconds = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(
+            f'Importing {module} failed:\n{result.stderr[-2000:]}')
+    return (wall_seconds, *parse_importtime(result.stderr, module))
+
+
+def import_time_report(top=5):
+    """Prints the import time of every entry point and its heaviest imports."""
+    print(f"{'entry point':<20} {'interpreter':>12} {'imports':>10}  "
+          f"heaviest imports")
+    for module, folder in ENTRY_POINTS:
+        wall_seconds, total_seconds, imports = measure_entry_point(
+            module, folder)
+        heaviest = sorted(imports, key=lambda item: item[1], reverse=True)
+        heaviest = ', '.join(f'{name} {seconds:.2f}s'
+                             for name, seconds in heaviest[:top])
+        print(f'{module:<20} {wall_seconds:>11.2f}s {total_seconds:>9.2f}s  '
+              f'{heaviest}')
+
+
+def main():
+    """Function accepting arguments"""
+    parser = argparse.ArgumentParser(
+        description='Report the import time of the entry points.')
+    parser.add_argument('--top', type=int, default=5,
+                        help='Number of heaviest imports listed per entry point.')
+
+    args = parser.parse_args()
+
+    import_time_report(args.top)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""Resolution of artist name variants to canonical artists with MinHash LSH."""
+import argparse
+import json
+import re
+import zlib
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from pathlib import Path
+import numpy as np
+
+MAPPING_FILE = Path(__file__).resolve().parents[2] / 'references' / \
+    'artist_mapping.json'
+
+NGRAM_SIZE = 3
+# MinHash signature of NUM_BANDS bands with BAND_ROWS rows each. Names
+# sharing all rows of any band become candidate pairs.
+NUM_BANDS = 21
+BAND_ROWS = 3
+# Candidates are merged when their keys, and separately their surnames and
+# given names, are at least this similar
+SIMILARITY_THRESHOLD = 0.88
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = np.random.default_rng(7)
+# a < 2^31 and 32-bit n-gram hashes keep a * x + b below 2^64
+_HASH_A = _rng.integers(1, 1 << 31, NUM_BANDS * BAND_ROWS, dtype=np.uint64)
+_HASH_B = _rng.integers(0, _MERSENNE_PRIME, NUM_BANDS * BAND_ROWS,
+                        dtype=np.uint64)
+
+
+def artist_key(name):
+    """
+    Normalizes a name to lowercase words sorted alphabetically, so the
+    order of name and surname does not matter but the letters of each
+    word do (unlike sorting all letters, which merges anagrams).
+    """
+    words = re.sub(r'[^\w ]+', '', str(name).lower()).split()
+    return ' '.join(sorted(words))
+
+
+def name_parts(key):
+    """
+    Splits a key into the surname, taken as its longest word, and the
+    other words, since the words of a key are sorted alphabetically.
+    """
+    words = key.split()
+    if not words:
+        return '', ''
+    surname = max(words, key=len)
+    words.remove(surname)
+    return surname, ' '.join(words)
+
+
+def similar(first, second, threshold):
+    """Returns whether two strings are at least threshold similar."""
+    return SequenceMatcher(None, first, second).ratio() >= threshold
+
+
+def same_person(key, candidate, threshold=SIMILARITY_THRESHOLD):
+    """
+    Returns whether two keys can name the same artist: their surnames and
+    their given names must each be similar, so that a shared surname does
+    not merge different people (jan kowalska and anna kowalska).
+    """
+    surname, given = name_parts(key)
+    candidate_surname, candidate_given = name_parts(candidate)
+    return similar(surname, candidate_surname, threshold) and \
+        similar(given, candidate_given, threshold)
+
+
+def ngrams(key, size=NGRAM_SIZE):
+    """Returns the character n-grams of a key, padded at both ends."""
+    padded = f' {key} '
+    return {padded[i:i + size] for i in range(max(len(padded) - size + 1, 1))}
+
+
+def minhash_signature(key):
+    """Returns the MinHash signature of the n-grams of a key."""
+    hashes = np.array([zlib.crc32(gram.encode()) for gram in ngrams(key)],
+                      dtype=np.uint64)
+    # (a * x + b) mod p for every hash function and n-gram at once
+    permuted = (_HASH_A[:, None] * hashes[None, :] + _HASH_B[:, None]) \
+        % _MERSENNE_PRIME
+    return permuted.min(axis=1)
+
+
+def band_keys(signature):
+    """Returns the LSH bucket key of every band of a signature."""
+    return [(band, signature[band * BAND_ROWS:(band + 1) * BAND_ROWS]
+             .tobytes()) for band in range(NUM_BANDS)]
+
+
+class ArtistResolver:
+    """
+    Maps artist names to canonical artists.
+
+    Canonical keys are indexed in LSH buckets of their MinHash signatures.
+    A new key is compared only with the canonical keys sharing a bucket
+    with it, instead of with every artist, and joins the most similar one
+    above SIMILARITY_THRESHOLD with a similar surname and given name, or
+    becomes a canonical artist itself.
+    counts holds the rows resolved by this run only, so that rebuilding
+    the data from scratch does not add its rows to the saved counts again.
+    """
+
+    def __init__(self, threshold=SIMILARITY_THRESHOLD):
+        self.threshold = threshold
+        # key -> canonical key
+        self.mapping = {}
+        # canonical key -> number of rows resolved in this run
+        self.counts = Counter()
+        self._buckets = defaultdict(list)
+
+    def _index(self, key, buckets=None):
+        for bucket in buckets or band_keys(minhash_signature(key)):
+            self._buckets[bucket].append(key)
+
+    def candidates(self, buckets):
+        """Returns the canonical keys in the given LSH buckets."""
+        found = set()
+        for bucket in buckets:
+            found.update(self._buckets.get(bucket, ()))
+        return found
+
+    def resolve_key(self, key, count=1):
+        """Returns the canonical key of a normalized key, indexing new ones."""
+        canonical = self.mapping.get(key)
+        if canonical is None:
+            buckets = band_keys(minhash_signature(key))
+            best, best_similarity = None, self.threshold
+            # The key is the second sequence, so its index is built once
+            matcher = SequenceMatcher(None)
+            matcher.set_seq2(key)
+            for candidate in self.candidates(buckets):
+                matcher.set_seq1(candidate)
+                # The quick ratios are upper bounds of ratio()
+                if matcher.real_quick_ratio() < best_similarity or \
+                        matcher.quick_ratio() < best_similarity:
+                    continue
+                if not same_person(key, candidate, self.threshold):
+                    continue
+                score = matcher.ratio()
+                if score >= best_similarity:
+                    best, best_similarity = candidate, score
+            if best is None:
+                self._index(key, buckets)
+                best = key
+            canonical = self.mapping[key] = best
+        self.counts[canonical] += count
+        return canonical
+
+    def resolve_series(self, series):
+        """
+        Resolves a column of artist names. Every distinct name is resolved
+        once, the most frequent names first so that they become canonical.
+        """
+        keys = series.map(artist_key)
+        self.resolve_counts(keys.value_counts())
+        return keys.map(self.mapping)
+
+    def resolve_counts(self, key_counts):
+        """
+        Resolves normalized keys from their row counts, e.g. merged from
+        several partitions. The most frequent keys are resolved first and
+        ties in key order, so the result does not depend on the row order.
+        """
+        for key, count in sorted(key_counts.items(),
+                                 key=lambda item: (-item[1], item[0])):
+            self.resolve_key(key, int(count))
+
+    def save(self, file_path=MAPPING_FILE):
+        """Saves the mapping and the canonical counts of this run as JSON."""
+        file_path = Path(file_path)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(file_path, 'w', encoding='utf8') as f:
+            json.dump({'threshold': self.threshold, 'mapping': self.mapping,
+                       'counts': dict(self.counts)}, f, indent=4)
+
+    @classmethod
+    def load(cls, file_path=MAPPING_FILE):
+        """
+        Loads a saved resolver, or returns an empty one. The saved counts
+        are not loaded, since they belong to the run that saved them.
+        """
+        if not Path(file_path).exists():
+            return cls()
+        with open(file_path, 'r', encoding='utf8') as f:
+            saved = json.load(f)
+        resolver = cls(saved['threshold'])
+        resolver.mapping = saved['mapping']
+        for canonical in sorted(set(resolver.mapping.values())):
+            resolver._index(canonical)
+        return resolver
+
+
+def main():
+    """Function accepting arguments"""
+    import pandas as pd
+    # pylint: disable=E0401
+    import dataset_io
+
+    parser = argparse.ArgumentParser(
+        description='Build or update the canonical artist mapping.')
+    parser.add_argument('input_file', type=str,
+                        help='Path to a file with an ARTIST column.')
+    parser.add_argument('--mapping_file', type=str, default=str(MAPPING_FILE),
+                        help='Path to the JSON mapping file.')
+
+    args = parser.parse_args()
+
+    resolver = ArtistResolver.load(args.mapping_file)
+    artists = dataset_io.read_dataset(args.input_file)['ARTIST'].dropna()
+    resolver.resolve_series(artists.astype(str))
+    resolver.save(args.mapping_file)
+
+    mapping = pd.Series(resolver.mapping, dtype=object)
+    merged = mapping[mapping.index != mapping.values]
+    print(f"{mapping.nunique()} canonical artists, "
+          f"{len(merged)} variants merged. Mapping saved to "
+          f"{args.mapping_file}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Column dtypes of the cleaned auction data."""
+import pandas as pd
+# pylint: disable=E0401
+import columns_structure
+
+CATEGORICAL_COLUMNS = ['ARTIST'] + list(columns_structure.categorical_orders)
+
+DATE_COLUMNS = ['AUCTION DATE']
+
+# Columns with a fixed dtype, other numeric columns become float32
+FIXED_DTYPES = {'YEAR': 'int16'}
+
+
+def artist_categories(df):
+    """Returns the sorted artists of the data, the order used by OrdinalEncoder."""
+    return sorted(df['ARTIST'].dropna().astype(str).unique())
+
+
+def categorical_dtypes(df, artists=None):
+    """
+    Returns the category dtypes of the categorical columns present in df.
+    TECHNIQUE, SIGNATURE and CONDITION use the fixed orders from
+    columns_structure, ARTIST uses the given artists or those of the data.
+    """
+    dtypes = {
+        column: pd.CategoricalDtype(categories)
+        for column, categories in columns_structure.categorical_orders.items()
+        if column in df.columns}
+    if 'ARTIST' in df.columns:
+        dtypes['ARTIST'] = pd.CategoricalDtype(
+            artists if artists is not None else artist_categories(df))
+    return dtypes
+
+
+def to_categorical(df, artists=None):
+    """
+    Casts ARTIST, TECHNIQUE, SIGNATURE and CONDITION to category dtypes.
+    Values outside of the category lists become missing.
+    """
+    return df.astype(categorical_dtypes(df, artists))
+
+
+def compact_numeric(series, dtype=None):
+    """
+    Casts a numeric column to the given dtype, or to float32 for floats and
+    the smallest integer dtype for integers. Integer columns with missing
+    values become float32.
+    """
+    if series.isna().any():
+        return series.astype('float32')
+    if dtype is not None:
+        return series.astype(dtype)
+    if pd.api.types.is_float_dtype(series):
+        return series.astype('float32')
+    return pd.to_numeric(series, downcast='integer')
+
+
+def compact_column(df, column, artists=None):
+    """Returns the column cast by the dtype policy, or None if unchanged."""
+    series = df[column]
+    if column in CATEGORICAL_COLUMNS:
+        if pd.api.types.is_numeric_dtype(series):
+            # Encoded ordinals become the smallest integer dtype
+            if series.isna().any():
+                return series.astype('float32')
+            return pd.to_numeric(series, downcast='integer')
+        dtype = categorical_dtypes(df[[column]], artists)[column]
+        return None if series.dtype == dtype else series.astype(dtype)
+    if column in DATE_COLUMNS:
+        if pd.api.types.is_datetime64_any_dtype(series):
+            return None
+        return pd.to_datetime(series, errors='coerce')
+    if pd.api.types.is_bool_dtype(series) or \
+            not pd.api.types.is_numeric_dtype(series):
+        return None
+    return compact_numeric(series, FIXED_DTYPES.get(column))
+
+
+def apply_dtype_policy(df, artists=None):
+    """
+    Applies the compact dtype policy of the pipeline.
+
+    ARTIST, TECHNIQUE, SIGNATURE and CONDITION become category dtypes, or
+    the smallest integer dtype once they are ordinal encoded. YEAR becomes
+    int16, AUCTION DATE datetime64 and other numeric features float32.
+    Text columns (URL, ImageName) are left as they are.
+
+    Parameters:
+    df (DataFrame): Cleaned, filtered or encoded data.
+    artists (list): ARTIST categories, the artists of the data by default.
+
+    Returns:
+    DataFrame: The data with the policy dtypes.
+    """
+    columns = {}
+    for column in df.columns:
+        converted = compact_column(df, column, artists)
+        if converted is not None:
+            columns[column] = converted
+    return df.assign(**columns) if columns else df
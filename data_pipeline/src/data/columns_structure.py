@@ -164,3 +164,11 @@ periods_to_year = [
     ("17th", 1650),
     ("16th", 1550),
 ]
+
+# Stable category lists of the categorical columns.
+# ARTIST categories are taken from the data.
+categorical_orders = {
+    'TECHNIQUE': techniques_order,
+    'SIGNATURE': signature_order,
+    'CONDITION': condition_order,
+}
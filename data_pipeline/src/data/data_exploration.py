@@ -1,8 +1,8 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 import os
+# pylint: disable=E0401
+import profiling
 
 
 def load_dataset(file_path, X_range):
@@ -47,47 +47,90 @@ def load_dataset(file_path, X_range):
         raise Exception(f"An error occurred while processing the file: {e}")
 
 
+def as_profile(data):
+    """
+    Returns the profile of a DataFrame, computed in a single pass,
+    or the given profile from profiling.profile_file.
+    """
+    if isinstance(data, pd.DataFrame):
+        return profiling.profile_frame(data, exact_distinct=True)
+    return data
+
+
+def profile_stat(profile, stat):
+    """Returns a statistic of every column of a profile as a Series."""
+    return pd.Series({column: column_profile[stat] for column, column_profile
+                      in profile['columns'].items()}, dtype=object)
+
+
 def missing_data(data):
-    total = data.isnull().sum()
-    percent = (data.isnull().sum()/data.isnull().count()*100)
+    profile = as_profile(data)
+    total = profile_stat(profile, 'nulls').astype('int64')
+    percent = total / profile['rows'] * 100
     tt = pd.concat([total, percent], axis=1, keys=['Total', 'Percent'])
-    types = []
-    for col in data.columns:
-        dtype = str(data[col].dtype)
-        types.append(dtype)
-    tt['Types'] = types
+    tt['Types'] = profile_stat(profile, 'dtype')
     return (np.transpose(tt))
 
 
+def unique_percent(profile, total):
+    """
+    Percentage of unique non-null values. The distinct counts of a sampled
+    profile are not scaled like its counts, so the ratio is left empty.
+    """
+    if profile.get('sample_fraction', 1) < 1:
+        return pd.Series(np.nan, index=total.index)
+    return round((total / profile_stat(profile, 'count').astype('int64')
+                  * 100), 2)
+
+
 def value_counts(data):
-    total = data.nunique()  # Count of unique non-null values
-    # Percentage of unique non-null values
-    percent = round((data.nunique() / data.count() * 100), 2)
+    profile = as_profile(data)
+    # Count of unique non-null values
+    total = profile_stat(profile, 'distinct').astype('int64')
+    percent = unique_percent(profile, total)
     tt = pd.concat([total, percent], axis=1, keys=[
                    'Unique Values', 'Unique Values/Total Count (%)'])
 
-    types = []
-    for col in data.columns:
-        dtype = str(data[col].dtype)
-        types.append(dtype)
-
-    tt['Types'] = types
+    tt['Types'] = profile_stat(profile, 'dtype')
     return np.transpose(tt)
 
 
 def value_counts_for_article(data):
-    total = data.nunique()  # Count of unique non-null values
-    # Percentage of unique non-null values
-    percent = round((data.nunique() / data.count() * 100), 2)
+    profile = as_profile(data)
+    # Count of unique non-null values
+    total = profile_stat(profile, 'distinct').astype('int64')
+    percent = unique_percent(profile, total)
     tt = pd.concat([total, percent], axis=1, keys=[
                    'Unikatowe wartości', 'Stosunek do wszystkich (%)'])
 
     return np.transpose(tt)
 
 
+def most_frequent(data, col_name, head_length):
+    """
+    Returns the most frequent values of a column of a DataFrame or a profile.
+    """
+    if isinstance(data, pd.DataFrame):
+        return data[col_name].value_counts().head(head_length)
+    top = data['columns'][col_name]['top'][:head_length]
+    return pd.Series([count for _, count in top],
+                     index=[str(value) for value, _ in top], name='count')
+
+
 def plot_distribution(df, col_name, bins_no=50):
+    """
+    Plots the histogram of a column of a DataFrame, or the histogram
+    stored in a profile (with its number of bins) without the raw data.
+    """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     plt.figure(figsize=(10, 6))
-    sns.histplot(df[col_name], bins=bins_no, kde=True)
+    if isinstance(df, pd.DataFrame):
+        sns.histplot(df[col_name], bins=bins_no, kde=True)
+    else:
+        histogram = df['columns'][col_name]['histogram']
+        plt.stairs(histogram['counts'], histogram['edges'], fill=True)
     plt.title(f'Distribution of {col_name}')
     plt.xlabel(col_name)
     plt.ylabel('Frequency')
@@ -95,8 +138,10 @@ def plot_distribution(df, col_name, bins_no=50):
 
 
 def plot_categorical_distribution(df, col_name, head_length=20):
-    distribution = df[col_name].value_counts()
-    top_values = distribution.head(head_length)
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    top_values = most_frequent(df, col_name, head_length)
     if len(top_values) < head_length:
         head_length = len(top_values)
     plt.figure(figsize=(10, 8))
@@ -109,8 +154,10 @@ def plot_categorical_distribution(df, col_name, head_length=20):
 
 
 def plot_categorical_distribution_for_article(df, col_name, head_length=20):
-    distribution = df[col_name].value_counts()
-    top_values = distribution.head(head_length)
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    top_values = most_frequent(df, col_name, head_length)
     if len(top_values) < head_length:
         head_length = len(top_values)
     plt.figure(figsize=(10, 4))
@@ -0,0 +1,198 @@
+"""Reading and writing of the pipeline datasets."""
+import os
+import tempfile
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+# Rows converted to cell values at once when writing Excel files
+EXCEL_CHUNK_ROWS = 10000
+
+
+def read_dataset(file_path):
+    """Reads an Excel, CSV or Parquet dataset based on the file extension."""
+    extension = Path(file_path).suffix.lower()
+    if extension in ('.xls', '.xlsx'):
+        return pd.read_excel(file_path)
+    if extension == '.csv':
+        return pd.read_csv(file_path)
+    if extension == '.parquet':
+        return pd.read_parquet(file_path)
+    raise ValueError(
+        "Unsupported file format. Please use Excel, CSV or Parquet files.")
+
+
+def write_dataset(df, file_path):
+    """
+    Writes a dataset in the format given by the file extension.
+    Parquet keeps the dtypes (category, int16, float32, datetime64),
+    Excel and CSV store plain values. Excel files are streamed by a
+    write-only workbook (see write_excel).
+    """
+    extension = Path(file_path).suffix.lower()
+    if extension == '.xlsx':
+        write_excel(df, file_path)
+    elif extension == '.xls':
+        df.to_excel(file_path, index=False)
+    elif extension == '.csv':
+        df.to_csv(file_path, index=False)
+    elif extension == '.parquet':
+        df.to_parquet(file_path, index=False)
+    else:
+        raise ValueError(
+            "Unsupported file format. Please use Excel, CSV or Parquet files.")
+
+
+def write_excel(df, file_path, chunk_rows=EXCEL_CHUNK_ROWS):
+    """
+    Writes a DataFrame to an .xlsx file with the cell values of to_excel.
+    Rows are streamed to a write-only workbook, which keeps them in a
+    temporary file instead of a workbook in memory, and only chunk_rows
+    rows are converted to cell values at a time, so the memory used does
+    not grow with the size of the data.
+    """
+    with ChunkWriter(file_path, chunk_rows) as writer:
+        writer.write(df)
+
+
+def excel_rows(df, chunk_rows=EXCEL_CHUNK_ROWS):
+    """
+    Yields the rows of a DataFrame as to_excel writes them: Python
+    scalars, None for missing values and 'inf'/'-inf' for infinite floats.
+    """
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        values = chunk.astype(object).where(chunk.notna(), None)
+        for position, dtype in enumerate(chunk.dtypes):
+            if not pd.api.types.is_float_dtype(dtype):
+                continue
+            column = chunk.iloc[:, position].to_numpy()
+            infinite = np.isinf(column)
+            if infinite.any():
+                values.iloc[infinite, position] = np.where(
+                    column[infinite] > 0, 'inf', '-inf')
+        yield from values.itertuples(index=False, name=None)
+
+
+def iter_dataset_chunks(file_path, chunk_rows=10000):
+    """
+    Yields a dataset as DataFrames of at most chunk_rows rows.
+    Only one chunk is held in memory: Excel files are read row by row in
+    openpyxl's read-only mode, CSV in pandas chunks and Parquet by batches.
+    """
+    extension = Path(file_path).suffix.lower()
+    if extension == '.xlsx':
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(file_path, read_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = list(next(rows, []))
+            chunk = []
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) >= chunk_rows:
+                    yield pd.DataFrame(chunk, columns=header)
+                    chunk = []
+            if chunk:
+                yield pd.DataFrame(chunk, columns=header)
+        finally:
+            workbook.close()
+    elif extension == '.csv':
+        with pd.read_csv(file_path, chunksize=chunk_rows) as reader:
+            yield from reader
+    elif extension == '.parquet':
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(file_path).iter_batches(chunk_rows):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(
+            "Unsupported file format. Please use .xlsx, CSV or Parquet files.")
+
+
+class ChunkWriter:
+    """
+    Writes a dataset chunk by chunk, in the format given by the extension.
+    Excel files use openpyxl's write-only mode, so memory does not grow
+    with the number of rows. The rows go to a temporary file next to the
+    target, which replaces it only when the writer is closed without an
+    error, so a failed write leaves the previous file untouched.
+    """
+
+    def __init__(self, file_path, chunk_rows=EXCEL_CHUNK_ROWS):
+        self.file_path = Path(file_path)
+        self.chunk_rows = chunk_rows
+        self.extension = self.file_path.suffix.lower()
+        if self.extension not in ('.xlsx', '.csv', '.parquet'):
+            raise ValueError(
+                "Unsupported file format. Please use .xlsx, CSV or Parquet files.")
+        self._writer = None
+        self._header_written = False
+        fd, temp_path = tempfile.mkstemp(
+            dir=self.file_path.parent, prefix=f'.{self.file_path.name}.',
+            suffix=self.extension)
+        os.close(fd)
+        self.temp_path = Path(temp_path)
+
+    def write(self, df):
+        """Appends the rows of a chunk."""
+        if self.extension == '.xlsx':
+            if self._writer is None:
+                from openpyxl import Workbook
+
+                self._writer = Workbook(write_only=True)
+                self._sheet = self._writer.create_sheet()
+            if not self._header_written:
+                self._sheet.append(df.columns.tolist())
+            for row in excel_rows(df, self.chunk_rows):
+                self._sheet.append(row)
+        elif self.extension == '.csv':
+            df.to_csv(self.temp_path,
+                      mode='a' if self._header_written else 'w',
+                      header=not self._header_written, index=False)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.temp_path, table.schema)
+            self._writer.write_table(table.cast(self._writer.schema))
+        self._header_written = True
+
+    def close(self):
+        """Finishes the file and moves it to its path."""
+        try:
+            if self.extension == '.xlsx':
+                if self._writer is None:
+                    from openpyxl import Workbook
+
+                    self._writer = Workbook(write_only=True)
+                    self._writer.create_sheet()
+                self._writer.save(self.temp_path)
+            elif self._writer is not None:
+                self._writer.close()
+        except BaseException:
+            self.temp_path.unlink(missing_ok=True)
+            raise
+        os.replace(self.temp_path, self.file_path)
+
+    def abort(self):
+        """Drops the rows written so far and keeps the previous file."""
+        try:
+            if self.extension == '.xlsx' and self._writer is not None:
+                self._sheet.close()
+            elif self.extension == '.parquet' and self._writer is not None:
+                self._writer.close()
+        finally:
+            self.temp_path.unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
@@ -1,14 +1,15 @@
 import json
+import numpy as np
 import pandas as pd
 import itertools
 import argparse
 import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from sklearn.feature_extraction import FeatureHasher
-from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder
-from sklearn.model_selection import train_test_split
 # pylint: disable=E0401
 import columns_structure
+import dataset_io
+import stage_metrics
 
 
 def get_all_configurations():
@@ -28,13 +29,25 @@ def get_all_configurations():
     return [dict(zip(encodings.keys(), combo)) for combo in all_combinations]
 
 
+def hash_encode_sparse(series, n_features):
+    """
+    Hashes a column into a CSR matrix with n_features columns.
+    Each value is hashed as the '<column>=<value>' feature, like the dict
+    input of FeatureHasher, without building a dict per row.
+    """
+    from sklearn.feature_extraction import FeatureHasher
+
+    hasher = FeatureHasher(n_features=n_features, input_type='string')
+    matrix = hasher.transform(
+        [f'{series.name}={value}'] for value in series.astype(str))
+    return matrix.tocsr(), [f'{series.name}_hash_{i}'
+                            for i in range(n_features)]
+
+
 def hash_encode_column(df, column, n_features):
     """Uses Hash Encoder"""
-    hasher = FeatureHasher(n_features=n_features, input_type='dict')
-    hashed_data = hasher.transform(df[[column]].to_dict(orient='records'))
-    hashed_df = pd.DataFrame(hashed_data.toarray(),
-                             columns=[f'{column}_hash_{i}'
-                                      for i in range(n_features)])
+    matrix, names = hash_encode_sparse(df[column], n_features)
+    hashed_df = pd.DataFrame(matrix.toarray(), columns=names, index=df.index)
     df = df.drop(column, axis=1)
     df = pd.concat([hashed_df, df], axis=1)
     return df
@@ -42,6 +55,8 @@ def hash_encode_column(df, column, n_features):
 
 def ordinal_encode_column(df, column, artist_price_order=None):
     """Uses Ordinal Encoder"""
+    from sklearn.preprocessing import OrdinalEncoder
+
     if artist_price_order is not None and column == 'ARTIST':
         ordinal_encoder = OrdinalEncoder(
             categories=[artist_price_order],
@@ -54,14 +69,20 @@ def ordinal_encode_column(df, column, artist_price_order=None):
     return df
 
 
+def onehot_encode_sparse(series):
+    """One-hot encodes a column into a CSR matrix."""
+    from sklearn.preprocessing import OneHotEncoder
+
+    onehot_encoder = OneHotEncoder()
+    matrix = onehot_encoder.fit_transform(series.to_frame())
+    return matrix.tocsr(), [f"{series.name}_{cat}"
+                            for cat in onehot_encoder.categories_[0]]
+
+
 def onehot_encode_column(df, column):
     """Uses OneHot Encoder"""
-    onehot_encoder = OneHotEncoder()
-    onehot_encoded = onehot_encoder.fit_transform(df[[column]])
-    onehot_df = pd.DataFrame(onehot_encoded.toarray(),
-                             columns=[f"{column}_{cat}"
-                                      for cat in onehot_encoder.categories_
-                                      [0]])
+    matrix, names = onehot_encode_sparse(df[column])
+    onehot_df = pd.DataFrame(matrix.toarray(), columns=names, index=df.index)
     df = df.drop(column, axis=1)
     df = pd.concat([onehot_df, df], axis=1)
     return df
@@ -99,12 +120,10 @@ def save_artist_order_to_json(artist_price_order, file_path):
     print(f"JSON data has been saved to {file_path}")
 
 
-def encode_data(input_file, encoding_config):
-    """
-    Creates multiple encoded DateFrames. 
-    One per each combination in encoding_config
-    """
-    df = pd.read_excel(input_file)
+def encode_frame(df, encoding_config):
+    """Encodes the columns of the DataFrame with the given encoders."""
+    from sklearn.model_selection import train_test_split
+
     df = df[columns_structure.columns_to_select]
 
     for column, encoder_type in encoding_config.items():
@@ -136,6 +155,144 @@ def encode_data(input_file, encoding_config):
     return df
 
 
+def encode_sparse(df, encoding_config):
+    """
+    Encodes the data as a sparse design matrix for XGBoost.
+
+    Hash and OneHot columns stay CSR blocks and are stacked with the
+    ordinal and numeric feature columns, in the column order of the dense
+    encode_frame output, without ever being densified.
+
+    XGBoost treats an absent CSR entry as missing, not as 0. The ordinal
+    and numeric columns therefore store every value, zeros included, so
+    an ordinal code 0 is split on as 0. The zeros of the Hash and OneHot
+    columns stay absent: these features must be predicted with their
+    zeros as missing values (see model_registry.mask_sparse_zeros).
+
+    Returns:
+    tuple: The CSR design matrix, its feature names, PRICE, the ARTIST
+    column (for the per-artist baseline) and the names of the features
+    whose zeros are absent.
+    """
+    import scipy.sparse as sp
+
+    sparse_columns = [column for column, encoder_type
+                      in encoding_config.items()
+                      if encoder_type in ('Hash', 'OneHot')]
+    dense_config = {column: encoder_type for column, encoder_type
+                    in encoding_config.items()
+                    if column not in sparse_columns}
+    df = df[columns_structure.columns_to_select].reset_index(drop=True)
+    artists = df['ARTIST'].astype(str).to_numpy()
+
+    blocks, names = [], []
+    # encode_frame puts every new block in front of the previous columns
+    for column in reversed(sparse_columns):
+        if encoding_config[column] == 'Hash':
+            matrix, block_names = hash_encode_sparse(df[column], n_features=3)
+        else:
+            matrix, block_names = onehot_encode_sparse(df[column])
+        blocks.append(matrix)
+        names.extend(block_names)
+
+    dense_df = encode_frame(df, dense_config).drop(columns=sparse_columns)
+    y = pd.to_numeric(dense_df['PRICE'].replace(',', '', regex=True),
+                      errors='coerce').to_numpy()
+    numeric_df = dense_df.drop(
+        columns=['PRICE', 'AUCTION DATE', 'URL', 'ImageName'])
+    sparse_features = list(names)
+    blocks.append(stored_csr(numeric_df.to_numpy(dtype=np.float32)))
+    names.extend(numeric_df.columns)
+
+    return (sp.hstack(blocks, format='csr', dtype=np.float32), names, y,
+            artists, sparse_features)
+
+
+def stored_csr(values):
+    """Returns a dense array as a CSR matrix storing every entry."""
+    import scipy.sparse as sp
+
+    n_rows, n_columns = values.shape
+    return sp.csr_matrix(
+        (values.ravel(), np.tile(np.arange(n_columns), n_rows),
+         np.arange(0, n_rows * n_columns + 1, n_columns)),
+        shape=values.shape)
+
+
+def save_sparse_design(file_path, matrix, feature_names, y, artists,
+                       sparse_features):
+    """
+    Saves a sparse design matrix with its feature names, PRICE, ARTIST
+    and the features whose zeros are absent.
+    """
+    np.savez_compressed(
+        file_path, data=matrix.data, indices=matrix.indices,
+        indptr=matrix.indptr, shape=matrix.shape,
+        feature_names=np.array(feature_names, dtype=str), price=y,
+        artist=artists.astype(str),
+        sparse_features=np.array(sparse_features, dtype=str))
+
+
+def load_sparse_design(file_path):
+    """Loads a design saved by save_sparse_design."""
+    import scipy.sparse as sp
+
+    with np.load(file_path) as design:
+        matrix = sp.csr_matrix(
+            (design['data'], design['indices'], design['indptr']),
+            shape=tuple(design['shape']))
+        return (matrix, design['feature_names'].tolist(), design['price'],
+                design['artist'])
+
+
+def load_sparse_features(file_path):
+    """
+    Returns the features of a saved design whose zeros are absent.
+    Designs saved without them dropped the zeros of every feature.
+    """
+    with np.load(file_path) as design:
+        if 'sparse_features' in design.files:
+            return design['sparse_features'].tolist()
+        return design['feature_names'].tolist()
+
+
+def encode_data(input_file, encoding_config):
+    """
+    Creates multiple encoded DateFrames. 
+    One per each combination in encoding_config
+    """
+    return encode_frame(pd.read_excel(input_file), encoding_config)
+
+
+def encode_file(input_file, output_file, config, sparse=False):
+    """
+    Encodes the input file with one configuration and saves the result,
+    as an Excel file streamed in constant memory or, with sparse, as a
+    sparse design matrix (.npz).
+    """
+    output_file = Path(output_file)
+    stage_name = f"encode_data_{''.join(config.values())}"
+    if sparse:
+        with stage_metrics.track_stage(stage_name + '_sparse') as stage:
+            matrix, feature_names, y, artists, sparse_features = \
+                encode_sparse(pd.read_excel(input_file), config)
+            stage['rows_in'] = stage['rows_out'] = matrix.shape[0]
+            output_file.parent.mkdir(parents=True, exist_ok=True)
+            save_sparse_design(output_file.with_suffix('.npz'), matrix,
+                               feature_names, y, artists, sparse_features)
+        return
+
+    with stage_metrics.track_stage(stage_name) as stage:
+        encoded_df = encode_data(input_file, config)
+        stage['rows_in'] = stage['rows_out'] = len(encoded_df)
+
+        # Ensure output directory exists
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+
+        # Save to Excel
+        dataset_io.write_dataset(encoded_df, output_file)
+
+
 def main():
     """
     Function accepting arguments.
@@ -150,23 +307,33 @@ def main():
     parser.add_argument(
         '--output_folder', type=str, default='data/processed',
         help='Path to the output folder')
+    parser.add_argument(
+        '--sparse', action='store_true',
+        help='Save sparse design matrices (.npz) for training instead of '
+             'Excel files.')
+    parser.add_argument(
+        '--workers', type=int, default=1,
+        help='Encode and write this many files in parallel processes.')
     args = parser.parse_args()
 
     # Extract the base name of the input file
     input_file_name = os.path.splitext(os.path.basename(args.input_file))[0]
 
+    tasks = []
     for config in configurations:
         # Create a descriptive file name based on the configuration
         output_file = Path(
             args.output_folder) / f"{input_file_name}_{''.join(config.values())}.xlsx"
+        tasks.append((args.input_file, output_file, config, args.sparse))
 
-        encoded_df = encode_data(args.input_file, config)
-
-        # Ensure output directory exists
-        output_file.parent.mkdir(parents=True, exist_ok=True)
-
-        # Save to Excel
-        encoded_df.to_excel(output_file, index=False)
+    if args.workers > 1:
+        with ProcessPoolExecutor(args.workers) as executor:
+            for future in [executor.submit(encode_file, *task)
+                           for task in tasks]:
+                future.result()
+    else:
+        for task in tasks:
+            encode_file(*task)
 
 
 if __name__ == '__main__':
@@ -1,20 +1,52 @@
-from sklearn.preprocessing import OrdinalEncoder, MinMaxScaler
+import json
+import numpy as np
 import pandas as pd
 import argparse
+from pathlib import Path
+import column_types
 import columns_structure
+import dataset_io
+import stage_metrics
 
 
-def encode_data(input_file, output_file):
+def artists_file(encoded_file):
+    """Returns the path of the artist order saved next to an encoded file."""
+    encoded_file = Path(encoded_file)
+    return encoded_file.with_name(f'{encoded_file.stem}_artists.json')
+
+
+def save_artists(artists, encoded_file):
+    """Saves the artists in the order of their ordinal codes."""
+    with open(artists_file(encoded_file), 'w', encoding='utf8') as f:
+        json.dump(list(artists), f, indent=4)
+
+
+def load_artists(encoded_file):
+    """Loads the artist order of an encoded file, or None if not saved."""
+    if not artists_file(encoded_file).exists():
+        return None
+    with open(artists_file(encoded_file), 'r', encoding='utf8') as f:
+        return json.load(f)
+
+
+def encode_frame(df, artists=None):
     """
     Encode data based on the config
+    ARTIST codes are the positions in artists, the sorted artists of the
+    data by default. Artists missing from the list are encoded as NaN.
     """
-    df = pd.read_excel(input_file)
+    from sklearn.preprocessing import OrdinalEncoder
 
     df = df[columns_structure.columns_to_select]
 
     # Artist - OrdinalEncoder
-    ordinal_encoder = OrdinalEncoder()
-    df['ARTIST'] = ordinal_encoder.fit_transform(df[['ARTIST']])
+    if artists is None:
+        artists = column_types.artist_categories(df)
+    ordinal_encoder = OrdinalEncoder(
+        categories=[list(artists)], handle_unknown='use_encoded_value',
+        unknown_value=np.nan)
+    df['ARTIST'] = ordinal_encoder.fit_transform(
+        df[['ARTIST']].astype(str))
 
     # Technique - OrdinalEncoder - map first three to 0, and the rest to following numbers
     ordinal_encoder = OrdinalEncoder(
@@ -40,7 +72,21 @@ def encode_data(input_file, output_file):
     df[df.columns.difference(['AUCTION DATE', 'URL', 'ImageName'])] = df[df.columns.difference(
         ['AUCTION DATE', 'URL', 'ImageName'])].apply(pd.to_numeric, errors='coerce')
 
-    df.to_excel(output_file, index=False)
+    # Ordinals as small integers, YEAR as int16, other features as float32
+    return column_types.apply_dtype_policy(df)
+
+
+def encode_data(input_file, output_file):
+    """Encodes the data file and saves the result."""
+    with stage_metrics.track_stage('encode_data_const') as stage:
+        df = column_types.apply_dtype_policy(
+            dataset_io.read_dataset(input_file))
+        stage['rows_in'] = len(df)
+        artists = column_types.artist_categories(df)
+        df = encode_frame(df, artists)
+        stage['rows_out'] = len(df)
+        dataset_io.write_dataset(df, output_file)
+        save_artists(artists, output_file)
 
 
 def main():
@@ -48,9 +94,9 @@ def main():
     parser = argparse.ArgumentParser(
         description='Process and auction data.')
     parser.add_argument('input_file', type=str,
-                        help='Path to the input Excel file.')
+                        help='Path to the input Excel, CSV or Parquet file.')
     parser.add_argument('output_file', type=str,
-                        help='Path to the output Excel file.')
+                        help='Path to the output Excel, CSV or Parquet file.')
 
     args = parser.parse_args()
 
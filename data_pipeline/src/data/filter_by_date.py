@@ -1,6 +1,30 @@
 """Filter the dataset by date."""
 import pandas as pd
 import argparse
+# pylint: disable=E0401
+import column_types
+import dataset_io
+import polars_backend
+import stage_metrics
+
+
+def is_after(df, cutoff_date_str):
+    """Checks which rows were auctioned after the cutoff date."""
+    # Convert string date to timestamp
+    cutoff_date = pd.Timestamp(cutoff_date_str)
+    return df['AUCTION DATE'] > cutoff_date
+
+
+def is_after_polars(df, cutoff_date_str):
+    """is_after on Polars."""
+    pl = polars_backend.import_polars()
+    return pl.col('AUCTION DATE') > pd.Timestamp(cutoff_date_str) \
+        .to_pydatetime()
+
+
+def filter_frame_by_date(df, cutoff_date_str):
+    """Keeps the rows auctioned after the cutoff date."""
+    return df[is_after(df, cutoff_date_str)]
 
 
 def filter_by_date(input_file, output_file, cutoff_date_str):
@@ -8,13 +32,13 @@ def filter_by_date(input_file, output_file, cutoff_date_str):
     Filter data based on the given cutoff date.
     By this, ensure that the dataset does not contain data past the cutoff date."
     """
-    df = pd.read_excel(input_file)
-
-    # Convert string date to timestamp
-    cutoff_date = pd.Timestamp(cutoff_date_str)
-    df = df[df['AUCTION DATE'] > cutoff_date]
-
-    df.to_excel(output_file, index=False)
+    with stage_metrics.track_stage('filter_by_date') as stage:
+        df = column_types.apply_dtype_policy(
+            dataset_io.read_dataset(input_file))
+        stage['rows_in'] = len(df)
+        df = filter_frame_by_date(df, cutoff_date_str)
+        stage['rows_out'] = len(df)
+        dataset_io.write_dataset(df, output_file)
 
 
 def main():
@@ -22,9 +46,9 @@ def main():
     parser = argparse.ArgumentParser(
         description='Process auction data.')
     parser.add_argument('input_file', type=str,
-                        help='Path to the input Excel file.')
+                        help='Path to the input Excel, CSV or Parquet file.')
     parser.add_argument('output_file', type=str,
-                        help='Path to the output Excel file.')
+                        help='Path to the output Excel, CSV or Parquet file.')
     parser.add_argument('cutoff_date', type=str,
                         help='Cutoff date for filtering in YYYY-MM-DD format.')
 
@@ -1,30 +1,135 @@
 """Pandas module."""
-import pandas as pd
 import argparse
+# pylint: disable=E0401
+import column_types
+import dataset_io
+import filter_plan
+import polars_backend
+import schema
+import stage_metrics
 
 
-def filter_data(input_file, output_file):
+# Artists with fewer rows are removed
+MIN_ARTIST_ROWS = 10
+
+
+def policy_values(series, dtype=None):
     """
-    Filter data based on the constant values.
-    By this, ensure that the dataset does not contain outliers."
+    Returns numeric values as the dtype policy stores them, so a range
+    check gives the same result before and after the cleaned data is
+    parsed and cast (e.g. when it runs in the plan of clean_data).
     """
+    values, _ = schema.parse_column(series, 'numeric')
+    return column_types.compact_numeric(values, dtype)
+
+
+def has_usual_dimensions(df):
+    """Remove TOTAL DIMENSIONS outliers"""
+    dimensions = policy_values(df['TOTAL DIMENSIONS'])
+    return (dimensions >= 10.00) & (dimensions <= 10000.00)
+
+
+def has_usual_dimensions_polars(df):
+    """has_usual_dimensions on Polars."""
+    dimensions = polars_backend.policy_values(df, 'TOTAL DIMENSIONS')
+    return (dimensions >= 10.00) & (dimensions <= 10000.00)
+
+
+def has_usual_price(df):
+    """Remove PRICE outliers"""
+    return policy_values(df['PRICE']) <= 10000
+
+
+def has_usual_price_polars(df):
+    """has_usual_price on Polars."""
+    return polars_backend.policy_values(df, 'PRICE') <= 10000
+
+
+def is_recent(df):
+    """Remove artworks created earlier than 1900 YEAR"""
+    return policy_values(
+        df['YEAR'], column_types.FIXED_DTYPES.get('YEAR')) >= 1900
+
+
+def is_recent_polars(df):
+    """is_recent on Polars."""
+    return polars_backend.policy_values(
+        df, 'YEAR', column_types.FIXED_DTYPES.get('YEAR')) >= 1900
+
 
-    df = pd.read_excel(input_file)
+def frequent_artists(artist_counts):
+    """Returns the artists with at least MIN_ARTIST_ROWS rows."""
+    return artist_counts.index[artist_counts >= MIN_ARTIST_ROWS]
 
-    # Remove TOTAL DIMENSIONS outliers
-    df = df[(df['TOTAL DIMENSIONS'] >= 10.00) &
-            (df['TOTAL DIMENSIONS'] <= 10000.00)]
 
-    # Remove PRICE outliers
-    df = df[df['PRICE'] <= 10000]
+def is_frequent_artist(df):
+    """Remove artists that have less than 10 occurances in the df"""
+    return df['ARTIST'].isin(frequent_artists(df['ARTIST'].value_counts()))
 
-    # Remove artworks created earlier than 1900 YEAR
-    df = df[df['YEAR'] >= 1900]
 
-    # Remove artists that have less than 10 occurances in the df
-    df = df.loc[df['ARTIST'].map(df.loc[:, "ARTIST"].value_counts()) >= 10]
+def is_frequent_artist_polars(df):
+    """is_frequent_artist on Polars."""
+    pl = polars_backend.import_polars()
+    return pl.col('ARTIST').is_not_null() & \
+        (pl.len().over('ARTIST') >= MIN_ARTIST_ROWS)
 
-    df.to_excel(output_file, index=False)
+
+def value_outlier_plan():
+    """Plan of the row by row outlier filters."""
+    return filter_plan.FilterPlan() \
+        .filter('dimensions_range', has_usual_dimensions,
+                reads=['TOTAL DIMENSIONS'],
+                polars=has_usual_dimensions_polars) \
+        .filter('price_range', has_usual_price, reads=['PRICE'],
+                polars=has_usual_price_polars) \
+        .filter('year_range', is_recent, reads=['YEAR'],
+                polars=is_recent_polars)
+
+
+def outlier_plan():
+    """Plan of the outlier filters, the artist filter last."""
+    # The artist counts depend on all the rows, so no filter moves across it
+    return value_outlier_plan().filter(
+        'rare_artists', is_frequent_artist, reads=['ARTIST'],
+        row_local=False, polars=is_frequent_artist_polars)
+
+
+def filter_value_outliers(df, tracker=None, backend='pandas'):
+    """Removes the rows with outlying values, row by row."""
+    return value_outlier_plan().execute(df, tracker, backend)
+
+
+def filter_outliers(df, tracker=None, backend='pandas'):
+    """
+    Filter data based on the constant values.
+    By this, ensure that the dataset does not contain outliers."
+    The rows, time and memory of every step are recorded by tracker.
+    The filters run on the given backend of filter_plan.BACKENDS.
+    """
+    tracker = tracker or stage_metrics.FilterTracker(len(df))
+    df = outlier_plan().execute(df, tracker, backend)
+
+    # Keep only the remaining artists as categories
+    df = column_types.to_categorical(df)
+    tracker.step('categories', df)
+    return df
+
+
+def filter_data(input_file, output_file, trace_memory=False,
+                backend='pandas'):
+    """
+    Filters outliers from the data file and saves the result, with the
+    report of its filter steps next to it.
+    """
+    with stage_metrics.track_stage('filter_data') as stage:
+        df = column_types.apply_dtype_policy(
+            dataset_io.read_dataset(input_file))
+        stage['rows_in'] = len(df)
+        tracker = stage_metrics.FilterTracker(len(df), trace_memory)
+        df = filter_outliers(df, tracker, backend)
+        stage['rows_out'] = len(df)
+        dataset_io.write_dataset(df, output_file)
+        tracker.write_report(output_file, 'filter_data')
 
 
 def main():
@@ -32,13 +137,21 @@ def main():
     parser = argparse.ArgumentParser(
         description='Process and auction data.')
     parser.add_argument('input_file', type=str,
-                        help='Path to the input Excel file.')
+                        help='Path to the input Excel, CSV or Parquet file.')
     parser.add_argument('output_file', type=str,
-                        help='Path to the output Excel file.')
+                        help='Path to the output Excel, CSV or Parquet file.')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='Account the memory of the filter steps with '
+                             'tracemalloc instead of the resident memory.')
+    parser.add_argument('--backend', type=str, default='pandas',
+                        choices=filter_plan.BACKENDS,
+                        help='Run the filters on pandas or on Polars '
+                             '(needs polars).')
 
     args = parser.parse_args()
 
-    filter_data(args.input_file, args.output_file)
+    filter_data(args.input_file, args.output_file, args.trace_memory,
+                args.backend)
 
 
 if __name__ == '__main__':
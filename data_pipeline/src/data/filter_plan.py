@@ -0,0 +1,178 @@
+"""Lazy plans of row filters and column transforms, materialized once."""
+import numpy as np
+import pandas as pd
+# pylint: disable=E0401
+import polars_backend
+
+BACKENDS = ('pandas', 'polars')
+
+
+class FilterPlan:
+    """
+    Records the filters and column transforms of a cleaning stage and runs
+    them in an optimized order.
+
+    Every step declares the columns it reads and writes. Before running,
+    filters are moved ahead of the transforms they do not depend on and
+    cheap steps are preferred to expensive ones, so the expensive string
+    transforms only see the rows that survive the cheap predicates. Steps
+    that are not row-local (aggregates such as a mode or value counts)
+    keep their place and nothing moves across them. A transform never
+    moves ahead of a filter that preceded it, so it never sees rows it
+    did not see before.
+
+    Running the plan keeps the surviving rows as positions instead of
+    copying the frame after every filter. Each step gets a frame of only
+    the columns it reads, narrowed to the surviving rows when it runs,
+    and the result is materialized once at the end.
+
+    A step may also have a Polars implementation, taking a Polars frame
+    and returning a boolean expression for a filter, or a dict of column
+    expressions for a transform. With the polars backend those steps run
+    on Polars (see polars_backend.execute) and the others on pandas.
+
+    Example:
+    plan = FilterPlan()
+    plan.transform('artist_text', normalize_artist, reads=['ARTIST'],
+                   writes=['ARTIST'], cost=10)
+    plan.filter('price_range', lambda df: df['PRICE'] <= 10000,
+                reads=['PRICE'])
+    df = plan.execute(df)
+    """
+
+    def __init__(self):
+        self.steps = []
+
+    def filter(self, name, predicate, reads=None, cost=1, row_local=True,
+               polars=None):
+        """
+        Adds a filter keeping the rows for which predicate(df) is True.
+        reads=None reads all columns of the data at that point.
+        polars is the same predicate on a Polars frame, if any.
+        """
+        self.steps.append({'kind': 'filter', 'name': name, 'func': predicate,
+                           'reads': reads, 'writes': [], 'cost': cost,
+                           'row_local': row_local, 'polars': polars})
+        return self
+
+    def transform(self, name, func, reads=None, writes=None, cost=1,
+                  row_local=True, polars=None):
+        """
+        Adds a transform. func(df) returns a dict of the written columns
+        (a None value drops the column), or None for an aggregate that
+        only stores a value for later steps.
+        reads=None and writes=None stand for all columns.
+        polars is the same transform on a Polars frame, if any.
+        """
+        self.steps.append({'kind': 'transform', 'name': name, 'func': func,
+                           'reads': reads, 'writes': writes, 'cost': cost,
+                           'row_local': row_local, 'polars': polars})
+        return self
+
+    def drop(self, name, columns):
+        """Adds a step removing columns."""
+        def drop_columns(df):
+            return dict.fromkeys(columns)
+        return self.transform(name, drop_columns, reads=[],
+                              writes=list(columns), cost=0,
+                              polars=drop_columns)
+
+    def extend(self, plan):
+        """Appends the steps of another plan."""
+        self.steps.extend(plan.steps)
+        return self
+
+    def optimized(self):
+        """Returns the steps in the order they are run."""
+        after = [set() for _ in self.steps]
+        for j, later in enumerate(self.steps):
+            for i in range(j):
+                if must_precede(self.steps[i], later):
+                    after[j].add(i)
+
+        order, done = [], set()
+        while len(order) < len(self.steps):
+            ready = [j for j in range(len(self.steps))
+                     if j not in done and after[j] <= done]
+            # Filters first, the cheapest one (or the earliest) first
+            j = min(ready, key=lambda j: (
+                self.steps[j]['kind'] != 'filter', self.steps[j]['cost'], j))
+            order.append(j)
+            done.add(j)
+        return [self.steps[j] for j in order]
+
+    def execute(self, df, tracker=None, backend='pandas'):
+        """
+        Runs the plan on df and returns the surviving rows, materialized
+        once. With a tracker, every step is recorded as it runs.
+        backend is one of BACKENDS, both give the same rows and values.
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f'Unknown filter plan backend: {backend}')
+        if backend == 'polars':
+            return polars_backend.execute(self.optimized(), df, tracker)
+
+        # Positions of the surviving rows, and per column its values and
+        # the positions they were last narrowed or written at
+        alive, index = np.arange(len(df)), df.index
+        columns = {column: (alive, df[column]) for column in df.columns}
+        names = list(df.columns)
+
+        def read(column):
+            positions, values = columns[column]
+            if len(positions) != len(alive):
+                values = values.iloc[np.searchsorted(positions, alive)]
+            if values.index is not index:
+                # The same index object lets the frames skip the alignment
+                values = values.copy(deep=False)
+                values.index = index
+            columns[column] = (alive, values)
+            return values
+
+        for step in self.optimized():
+            reads = names if step['reads'] is None else step['reads']
+            frame = pd.DataFrame({column: read(column) for column in reads},
+                                 index=index)
+            result = step['func'](frame)
+            if step['kind'] == 'filter':
+                keep = np.asarray(result, dtype=bool)
+                alive, index = alive[keep], index[keep]
+            elif result is not None:
+                for column, values in result.items():
+                    if values is None:
+                        del columns[column]
+                        names.remove(column)
+                        continue
+                    if not isinstance(values, pd.Series):
+                        values = pd.Series(values, index=index, name=column)
+                    elif not values.index.equals(index):
+                        values = values.reindex(index)
+                    if column not in columns:
+                        names.append(column)
+                    columns[column] = (alive, values)
+            if tracker is not None:
+                tracker.step(step['name'], len(alive))
+
+        return pd.DataFrame({column: read(column) for column in names},
+                            index=index)
+
+
+def must_precede(earlier, later):
+    """Checks whether a step has to run before a step added after it."""
+    if not earlier['row_local'] or not later['row_local']:
+        return True
+    if later['kind'] == 'transform' and earlier['kind'] == 'filter':
+        # A transform never runs on rows removed by an earlier filter
+        return True
+    return overlaps(earlier['writes'], later['reads']) or \
+        overlaps(earlier['reads'], later['writes']) or \
+        overlaps(earlier['writes'], later['writes'])
+
+
+def overlaps(columns, other_columns):
+    """Checks whether two column lists share a column, None is all columns."""
+    if columns is None:
+        return other_columns is None or len(other_columns) > 0
+    if other_columns is None:
+        return len(columns) > 0
+    return not set(columns).isdisjoint(other_columns)
@@ -0,0 +1,219 @@
+"""Deterministic generator of synthetic raw auction data."""
+import argparse
+import numpy as np
+import pandas as pd
+# pylint: disable=E0401
+import columns_structure
+import dataset_io
+
+# Layout of the raw export. Removing columns_structure.columns_to_remove
+# leaves the columns used by process_data.
+RAW_COLUMNS = [
+    'ARTIST', 'OBJECT', 'LOT', 'PERIOD', 'TECHNIQUE', 'DESCRIPTION',
+    'ESTIMATE', 'SIGNATURE', 'CONDITION', 'TOTAL DIMENSIONS', 'CURRENCY',
+    'PRICE', 'BIDS', 'YEAR', 'AUCTION DATE', 'AUCTION HOUSE', 'URL',
+    'SELLER', 'SHIPPING', 'VIEWS', 'ImageName']
+
+FIRST_NAMES = [
+    'Joan', 'Pablo', 'Andy', 'Marc', 'Henri', 'Salvador', 'Keith', 'Roy',
+    'Wassily', 'Fernand', 'Sonia', 'Victor', 'Yayoi', 'Tamara', 'Alphonse',
+    'Zdzisław', 'Jerzy', 'Józef', 'Leonor', 'Frida']
+
+LAST_NAMES = [
+    'Miró', 'Picasso', 'Warhol', 'Chagall', 'Matisse', 'Dalí', 'Haring',
+    'Lichtenstein', 'Kandinsky', 'Léger', 'Delaunay', 'Vasarely', 'Kusama',
+    'Łempicka', 'Mucha', 'Beksiński', 'Nowosielski', 'Brandt', 'Fini',
+    'Kahlo']
+
+MIDDLE_NAMES = ['', 'A. ', 'B. ', 'C. ', 'D. ', 'E. ']
+
+# Noisy ways in which a single artist is written in the auction exports
+ARTIST_FORMATS = [
+    ('{first} {last}', 40), ('{last} {first}', 10),
+    ('{first} {last} ({born}-{died})', 15), ('{last}, {first}', 8),
+    ('  {first} {last} ', 5), ('{unaccented}', 8),
+    ('after {first} {last}', 4), ("d'apres {first} {last}", 2),
+    ('{first} {last} nach', 1), ('attr. {first} {last}', 2),
+    ('{first} {last} print', 1), ('', 2), (None, 2)]
+
+OBJECTS = [('Print', 85), ('Art Print', 5), (None, 5), ('Painting', 5)]
+
+TECHNIQUES = [
+    ('Lithograph', 20), ('Colour lithograph on Arches paper', 10),
+    ('Screenprint', 10), ('Serigraph in colours', 5),
+    ('Etching and aquatint', 8), ('Drypoint', 2), ('Offset print', 10),
+    ('Photogravure', 3), ('Woodcut', 4), ('Linocut', 3), ('Pochoir', 2),
+    ('Collotype', 2), ('Mixed media', 4), ('Oil on canvas', 5),
+    ('Giclée', 5), (None, 7)]
+
+SIGNATURES = [
+    ('Hand signed', 30), ('Hand signed in pencil', 15), ('Plate signed', 25),
+    ('Not signed', 20), (None, 10)]
+
+CONDITIONS = [
+    ('Excellent condition', 30), ('Good condition', 25), ('New', 5),
+    ('Fair condition', 10), ('Age-related toning', 5),
+    ('Needs restoration', 3), (None, 22)]
+
+DIMENSION_FORMATS = [
+    ('{w} x {h} cm', 35), ('{w}×{h} cm', 15), ('{w_mm} x {h_mm} mm', 10),
+    ('{w_in} x {h_in} in', 10), ('{w},5 x {h} cm', 5), ('{w}x{h}', 5),
+    (None, 20)]
+
+YEAR_FORMATS = [('{year}', 60), ('c. {year}', 10), ('{year}-{next}', 5),
+                (None, 20), ('unknown', 5)]
+
+DESCRIPTION_EXTRAS = [('', 90), ('Exhibition poster.', 6), ('Plakat.', 2),
+                      ('Framed.', 2)]
+
+
+def weighted_choice(rng, options, size):
+    """Draws values from a list of (value, weight) tuples."""
+    values = np.empty(len(options), dtype=object)
+    values[:] = [value for value, _ in options]
+    weights = np.array([weight for _, weight in options], dtype=float)
+    return values[rng.choice(len(options), size=size, p=weights / weights.sum())]
+
+
+def fill_template(templates, **fields):
+    """Formats a template per row, skipping rows whose template is None."""
+    return [template.format(**{key: value[i] for key, value in fields.items()})
+            if template is not None else None
+            for i, template in enumerate(templates)]
+
+
+def artist_pool(n_artists):
+    """Returns the names and life spans of n_artists distinct artists."""
+    names = [f'{first} {middle}{last}'
+             for middle in MIDDLE_NAMES
+             for last in LAST_NAMES
+             for first in FIRST_NAMES][:n_artists]
+    born = np.array([1860 + (i * 7) % 100 for i in range(len(names))])
+    return names, born
+
+
+def decade_period(years):
+    """Returns a PERIOD label matching columns_structure.periods_to_year."""
+    known = {period for period, _ in columns_structure.periods_to_year}
+    periods = []
+    for year in years:
+        decade = f'{year // 10 * 10}-{year // 10 * 10 + 9}'
+        periods.append(decade if decade in known else '20th')
+    return periods
+
+
+def generate_raw_data(n_rows, seed=42, n_artists=None):
+    """
+    Generates raw auction rows in the layout of the auction exports.
+
+    The values contain the same kinds of noise as the real data: accents,
+    swapped names, life spans and 'after' prefixes in ARTIST, posters in
+    DESCRIPTION, mixed units in the dimensions and missing values.
+
+    Parameters:
+    n_rows (int): Number of rows to generate.
+    seed (int): Seed of the random generator. Equal seeds give equal data.
+    n_artists (int): Number of distinct artists, scaled with n_rows by default.
+
+    Returns:
+    DataFrame: The raw rows with RAW_COLUMNS as columns.
+    """
+    rng = np.random.default_rng(seed)
+    if n_artists is None:
+        n_artists = int(np.clip(n_rows // 200, 20, 2400))
+    names, born = artist_pool(n_artists)
+
+    # Zipf-like popularity of the artists
+    popularity = 1.0 / np.arange(1, len(names) + 1) ** 0.8
+    artist_idx = rng.choice(len(names), size=n_rows,
+                            p=popularity / popularity.sum())
+    first = [names[i].split(' ')[0] for i in artist_idx]
+    last = [names[i].split(' ', 1)[1] for i in artist_idx]
+    artist_born = born[artist_idx]
+    artist_died = artist_born + rng.integers(40, 90, size=n_rows)
+    artists = fill_template(
+        weighted_choice(rng, ARTIST_FORMATS, n_rows),
+        first=first, last=last, born=artist_born, died=artist_died,
+        unaccented=[f'{f} {l}'.encode('ascii', 'ignore').decode()
+                    for f, l in zip(first, last)])
+
+    years = np.clip(artist_born + rng.integers(20, 70, size=n_rows),
+                    1890, 2023)
+    width = rng.integers(10, 120, size=n_rows)
+    height = rng.integers(10, 120, size=n_rows)
+    dimensions = fill_template(
+        weighted_choice(rng, DIMENSION_FORMATS, n_rows),
+        w=width, h=height, w_mm=width * 10, h_mm=height * 10,
+        w_in=np.round(width / 2.54, 1), h_in=np.round(height / 2.54, 1))
+
+    techniques = weighted_choice(rng, TECHNIQUES, n_rows)
+    descriptions = [
+        f'{technique or "Print"} by {artist or "unknown artist"}, '
+        f'{w} x {h} cm. {extra}'.strip()
+        for technique, artist, w, h, extra in zip(
+            techniques, artists, width, height,
+            weighted_choice(rng, DESCRIPTION_EXTRAS, n_rows))]
+
+    periods = np.array(decade_period(years), dtype=object)
+    period_noise = rng.random(n_rows)
+    periods[period_noise < 0.15] = periods[period_noise < 0.15] + ', Modern'
+    periods[period_noise > 0.95] = None
+
+    prices = np.round(rng.lognormal(mean=5.5, sigma=1.0, size=n_rows))
+    price_text = np.array([f'{price:,.0f}' for price in prices], dtype=object)
+    price_noise = rng.random(n_rows)
+    price_text[price_noise < 0.5] = prices[price_noise < 0.5]
+    price_text[price_noise > 0.99] = None
+
+    start = np.datetime64('2020-01-01')
+    dates = np.sort(start + rng.integers(0, 4 * 365, size=n_rows)).astype(str)
+    dates = dates.astype(object)
+    dates[rng.random(n_rows) < 0.005] = 'TBA'
+
+    lots = np.arange(1, n_rows + 1) + seed * 10 ** 8
+    data = {
+        'ARTIST': artists,
+        'OBJECT': weighted_choice(rng, OBJECTS, n_rows),
+        'LOT': lots,
+        'PERIOD': periods,
+        'TECHNIQUE': techniques,
+        'DESCRIPTION': descriptions,
+        'ESTIMATE': [f'€{int(p * 0.8)}-€{int(p * 1.2)}' for p in prices],
+        'SIGNATURE': weighted_choice(rng, SIGNATURES, n_rows),
+        'CONDITION': weighted_choice(rng, CONDITIONS, n_rows),
+        'TOTAL DIMENSIONS': dimensions,
+        'CURRENCY': 'EUR',
+        'PRICE': price_text,
+        'BIDS': rng.integers(0, 40, size=n_rows),
+        'YEAR': fill_template(weighted_choice(rng, YEAR_FORMATS, n_rows),
+                              year=years, next=years + 1),
+        'AUCTION DATE': dates,
+        'AUCTION HOUSE': 'Example Auctions',
+        'URL': [f'https://auctions.example.com/lot/{lot}' for lot in lots],
+        'SELLER': rng.integers(1, 500, size=n_rows),
+        'SHIPPING': 'EU',
+        'VIEWS': rng.integers(0, 5000, size=n_rows),
+        'ImageName': [f'{lot}.jpg' for lot in lots],
+    }
+    return pd.DataFrame(data, columns=RAW_COLUMNS)
+
+
+def main():
+    """Function accepting arguments"""
+    parser = argparse.ArgumentParser(
+        description='Generate synthetic raw auction data.')
+    parser.add_argument('output_file', type=str,
+                        help='Path to the output Excel, CSV or Parquet file.')
+    parser.add_argument('--rows', type=int, default=10000,
+                        help='Number of rows to generate.')
+    parser.add_argument('--seed', type=int, default=42,
+                        help='Seed of the random generator.')
+
+    args = parser.parse_args()
+
+    dataset_io.write_dataset(generate_raw_data(args.rows, args.seed),
+                             args.output_file)
+
+
+if __name__ == '__main__':
+    main()
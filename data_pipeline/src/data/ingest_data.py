@@ -0,0 +1,203 @@
+"""Sorted-merge ingestion of new auction batches into the raw store."""
+import argparse
+from pathlib import Path
+import numpy as np
+import pandas as pd
+# pylint: disable=E0401
+import dataset_io
+import record_index
+import schema
+
+DATE_COLUMN = 'AUCTION DATE'
+# Share of invalid rows above which a whole batch is refused
+MAX_REJECTED_FRACTION = 0.5
+
+
+def auction_dates(df):
+    """Returns the AUCTION DATE column parsed to datetime64 values."""
+    if DATE_COLUMN not in df.columns:
+        raise KeyError(f"Column '{DATE_COLUMN}' is missing from the data.")
+    return pd.to_datetime(df[DATE_COLUMN], errors='coerce').to_numpy()
+
+
+def is_date_ordered(dates):
+    """
+    Checks that the dates are ascending with unparsed dates (NaT) at the end.
+    This is the order produced by a stable sort and kept by merge_sorted.
+    """
+    missing = np.isnat(dates)
+    valid_count = len(dates) - missing.sum()
+    if missing[:valid_count].any():
+        return False
+    valid = dates[:valid_count]
+    return bool((valid[1:] >= valid[:-1]).all())
+
+
+def sort_by_auction_date(df):
+    """Full stable sort of the data by AUCTION DATE."""
+    order = np.argsort(auction_dates(df), kind='stable')
+    return df.iloc[order].reset_index(drop=True)
+
+
+def merge_sorted(existing_df, batch_df):
+    """
+    Merges a new batch into data already ordered by AUCTION DATE.
+
+    Only the batch is sorted. When the whole batch is newer than the
+    existing data it is appended, otherwise the rows are interleaved
+    with a single linear merge. Rows with equal dates keep the existing
+    rows first, so repeated ingestion is stable.
+
+    Parameters:
+    existing_df (DataFrame): Data ordered by AUCTION DATE.
+    batch_df (DataFrame): New rows in any order.
+
+    Returns:
+    DataFrame: The merged data ordered by AUCTION DATE.
+    """
+    batch_dates = auction_dates(batch_df)
+    order = np.argsort(batch_dates, kind='stable')
+    batch_df = batch_df.iloc[order]
+    batch_dates = batch_dates[order]
+
+    combined = pd.concat([existing_df, batch_df], ignore_index=True)
+    if existing_df.empty or batch_df.empty:
+        return combined
+
+    existing_dates = auction_dates(existing_df)
+    positions = np.searchsorted(existing_dates, batch_dates, side='right')
+    if positions[0] == len(existing_df):
+        # The batch is entirely newer - a plain append keeps the order
+        return combined
+
+    merged_order = np.insert(
+        np.arange(len(existing_df)), positions,
+        np.arange(len(existing_df), len(combined)))
+    return combined.iloc[merged_order].reset_index(drop=True)
+
+
+def check_rejected(valid_rows, rejected_rows, reason=''):
+    """
+    Raises SchemaError when the rejected rows exceed MAX_REJECTED_FRACTION
+    of a batch. reason is the broken rule of one of the rejected rows.
+    """
+    total_rows = valid_rows + rejected_rows
+    if rejected_rows > MAX_REJECTED_FRACTION * total_rows:
+        raise schema.SchemaError(
+            f"{rejected_rows} of {total_rows} rows are invalid, e.g. {reason}")
+
+
+def ingest_batch(batch_df, store_file, resort=False):
+    """
+    Adds a batch of new rows to the ordered raw store.
+
+    The batch is checked against the raw schema first. A batch with
+    missing columns or mostly invalid rows raises SchemaError before
+    anything is written, otherwise the invalid rows are quarantined.
+    The valid rows are merged with merge_batch.
+
+    Returns:
+    int: Number of rows stored.
+    """
+    batch_df, rejected = schema.validate(
+        batch_df, schema.RAW_SCHEMA, parse=False)
+    check_rejected(len(batch_df), len(rejected),
+                   rejected[schema.REASON_COLUMN].iloc[0]
+                   if not rejected.empty else '')
+    schema.quarantine(rejected, 'ingest_data')
+    return merge_batch(batch_df, store_file, resort)
+
+
+def merge_batch(batch_df, store_file, resort=False):
+    """
+    Merges validated rows into the ordered raw store in one rewrite
+    (see merge_batches).
+
+    Returns:
+    int: Number of rows stored.
+    """
+    return merge_batches([batch_df], store_file, resort)
+
+
+def merge_batches(batches, store_file, resort=False):
+    """
+    Merges batches of validated rows into the ordered raw store, one
+    batch after the other, in one rewrite of the store. batches may read
+    every batch from disk when it is reached, so only the store and one
+    batch are held in memory.
+    The store is fully re-sorted only when resort is requested
+    or when it is not yet ordered (e.g. a store created by hand).
+    Records already in the store, by the key index kept next to it,
+    and records repeated in the batches are dropped.
+
+    Returns:
+    int: Number of rows stored.
+    """
+    store_file = Path(store_file)
+    if store_file.exists():
+        stored_df = dataset_io.read_dataset(store_file)
+        # The batches have stripped column names (see schema.validate), a
+        # store exported with ' OBJECT' gets them as well
+        combined_df = schema.normalize_columns(stored_df)
+        if combined_df is stored_df:
+            index = record_index.RecordIndex.load(store_file, combined_df)
+        else:
+            # Keys of rows without URL and ImageName follow the column names
+            index = record_index.RecordIndex.build(store_file, combined_df)
+        resort = resort or not is_date_ordered(auction_dates(combined_df))
+    else:
+        combined_df = pd.DataFrame()
+        index = record_index.RecordIndex.build(store_file, combined_df)
+
+    # Keys of the rows merged so far, not in the index until written
+    merged_keys = pd.Index([], dtype=record_index.KEY_DTYPE)
+    duplicates = 0
+    for batch_df in batches:
+        keys = record_index.record_keys(batch_df)
+        is_new = index.new_rows(keys) & (merged_keys.get_indexer(keys) == -1)
+        if not is_new.all():
+            duplicates += (~is_new).sum()
+            batch_df, keys = batch_df[is_new], keys[is_new]
+        if batch_df.empty:
+            continue
+        merged_keys = merged_keys.append(pd.Index(keys))
+        if resort:
+            combined_df = pd.concat([combined_df, batch_df],
+                                    ignore_index=True)
+        else:
+            combined_df = merge_sorted(combined_df, batch_df)
+
+    if duplicates:
+        print(f"{duplicates} duplicate rows dropped")
+    if merged_keys.empty and store_file.exists() and not resort:
+        return 0
+    if resort:
+        combined_df = sort_by_auction_date(combined_df)
+
+    dataset_io.write_dataset(combined_df, store_file)
+    # Keys are added once the rows are stored, a crash in between leaves
+    # an index shorter than the store, which is rebuilt on the next batch
+    index.append(merged_keys.to_numpy())
+    return len(merged_keys)
+
+
+def main():
+    """Function accepting arguments"""
+    parser = argparse.ArgumentParser(
+        description='Merge new auction data into the ordered raw store.')
+    parser.add_argument('input_file', type=str,
+                        help='Path to the Excel, CSV or Parquet file with new rows.')
+    parser.add_argument('store_file', type=str,
+                        help='Path to the ordered raw store.')
+    parser.add_argument('--resort', action='store_true',
+                        help='Fully re-sort the store by AUCTION DATE.')
+
+    args = parser.parse_args()
+
+    rows = ingest_batch(dataset_io.read_dataset(args.input_file),
+                        args.store_file, args.resort)
+    print(f"{rows} rows merged into {args.store_file}")
+
+
+if __name__ == '__main__':
+    main()
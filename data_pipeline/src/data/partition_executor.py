@@ -0,0 +1,64 @@
+"""Executors running pipeline tasks over data partitions."""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+
+class Executor:
+    """
+    Runs a task function over partitions.
+
+    The tasks are module-level functions whose arguments and results can
+    be pickled. They exchange the partition data through files in a
+    shared work folder and return only small summaries, so a multi-node
+    backend has to implement map (and close) and share that folder.
+    """
+
+    def map(self, func, tasks):
+        """Runs func(*args) for every args tuple, returns the results in order."""
+        raise NotImplementedError
+
+    def close(self):
+        """Releases the workers."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class SerialExecutor(Executor):
+    """Runs the tasks one after another in the current process."""
+
+    def map(self, func, tasks):
+        return [func(*args) for args in tasks]
+
+
+class LocalProcessExecutor(Executor):
+    """Runs the tasks concurrently in a pool of local processes."""
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count()
+        self._pool = ProcessPoolExecutor(self.workers)
+
+    def map(self, func, tasks):
+        futures = [self._pool.submit(func, *args) for args in tasks]
+        return [future.result() for future in futures]
+
+    def close(self):
+        self._pool.shutdown()
+
+
+EXECUTORS = {
+    'serial': SerialExecutor,
+    'local': LocalProcessExecutor,
+}
+
+
+def get_executor(backend='local', workers=None):
+    """Returns an executor of the given backend."""
+    if backend not in EXECUTORS:
+        raise ValueError(f'Unknown executor backend: {backend}')
+    if backend == 'serial':
+        return SerialExecutor()
+    return EXECUTORS[backend](workers)
@@ -0,0 +1,337 @@
+"""Runs the data processing stages partition by partition on an executor."""
+import argparse
+import shutil
+import tempfile
+from pathlib import Path
+import numpy as np
+import pandas as pd
+# pylint: disable=E0401
+import artist_resolution
+import column_types
+import dataset_io
+import encode_data_const
+import filter_by_date
+import filter_data
+import partition_executor
+import process_data
+import run_pipeline
+import schema
+import stage_metrics
+
+DATE_COLUMN = 'AUCTION DATE'
+
+
+def read_partition(file_path):
+    """Reads a raw source file or a partition file of the work folder."""
+    if Path(file_path).suffix == '.pkl':
+        return pd.read_pickle(file_path)
+    return dataset_io.read_dataset(file_path)
+
+
+def split_by_date(df, partitions):
+    """
+    Splits raw data into partitions of consecutive auction dates.
+    The rows are stably sorted by AUCTION DATE first, rows without a
+    valid date go to the last partition.
+    """
+    dates, _ = schema.parse_column(df[DATE_COLUMN], 'datetime')
+    order = np.argsort(dates.to_numpy(), kind='stable')
+    return [df.iloc[rows] for rows in np.array_split(order, partitions)
+            if len(rows)]
+
+
+def prepare_partition(source_file, work_file, resolve_artists):
+    """
+    First task: the row-local cleaning up to the artist normalization.
+    Returns the counts needed for the PERIOD mode and the artist mapping.
+    """
+    df = read_partition(source_file)
+    rows_in = len(df)
+    df, rejected = process_data.select_rows(df)
+    df.to_pickle(work_file)
+    return {
+        'rows_in': rows_in,
+        'rejected': rejected,
+        'period_counts': df['PERIOD'].value_counts(),
+        'artist_keys': df['ARTIST'].map(artist_resolution.artist_key)
+        .value_counts() if resolve_artists else None,
+    }
+
+
+def clean_partition(work_file, interim_file, mode_value, artist_mapping,
+                    filter_date):
+    """
+    Second task: the rest of the cleaning with the global PERIOD mode.
+    Returns the artist counts needed for the artist filter and encoding.
+    """
+    df = pd.read_pickle(work_file)
+    if artist_mapping is None:
+        df.loc[:, 'ARTIST'] = df.loc[:, 'ARTIST'].apply(
+            process_data.normalize_and_sort_letters)
+    else:
+        df['ARTIST'] = df['ARTIST'].map(artist_resolution.artist_key) \
+            .map(artist_mapping)
+    df, rejected = process_data.finish_cleaning(df, mode_value)
+    df.to_pickle(interim_file)
+
+    kept = filter_data.filter_value_outliers(df)
+    if filter_date:
+        dated = filter_by_date.filter_frame_by_date(kept, filter_date)
+    else:
+        dated = kept
+    return {
+        'rows': len(df),
+        'rejected': rejected,
+        'dtypes': df.dtypes.to_dict(),
+        'dates': (df[DATE_COLUMN].min(), df[DATE_COLUMN].max()),
+        'artists': set(df['ARTIST'].astype(str)),
+        'artist_counts': kept['ARTIST'].astype(str).value_counts(),
+        'dated_artists': set(dated['ARTIST'].astype(str)),
+    }
+
+
+def filter_encode_partition(interim_file, filtered_file, encoded_file,
+                            kept_artists, encode_artists, filter_date):
+    """Third task: filtering with the global artist list, and encoding."""
+    df = pd.read_pickle(interim_file)
+    df = filter_data.filter_value_outliers(df)
+    df = column_types.to_categorical(
+        df[df['ARTIST'].isin(kept_artists)], kept_artists)
+    if filter_date:
+        df = filter_by_date.filter_frame_by_date(df, filter_date)
+    df.to_pickle(filtered_file)
+    encoded = encode_data_const.encode_frame(df, encode_artists) \
+        if len(df) else df.iloc[:, :0]
+    encoded.to_pickle(encoded_file)
+    return {'rows': len(df), 'dtypes': df.dtypes.to_dict(),
+            'encoded_dtypes': encoded.dtypes.to_dict()}
+
+
+def merge_counts(counts):
+    """Sums value counts of the partitions, the most frequent value first."""
+    counts = [partition_counts for partition_counts in counts
+              if partition_counts is not None and len(partition_counts)]
+    if not counts:
+        return pd.Series(dtype='int64')
+    return pd.concat(counts).groupby(level=0, sort=False).sum() \
+        .sort_values(ascending=False, kind='stable')
+
+
+def common_dtypes(partition_dtypes):
+    """
+    Returns the dtype of every non-category column that fits all
+    partitions, e.g. int16 when one partition fits int8 and another int16.
+    """
+    dtypes = {}
+    for column in partition_dtypes[0]:
+        column_dtypes = [partition[column] for partition in partition_dtypes
+                         if column in partition]
+        if any(isinstance(dtype, pd.CategoricalDtype)
+               for dtype in column_dtypes):
+            continue
+        if all(dtype == column_dtypes[0] for dtype in column_dtypes):
+            dtypes[column] = column_dtypes[0]
+        elif all(pd.api.types.is_numeric_dtype(dtype)
+                 for dtype in column_dtypes):
+            dtypes[column] = np.result_type(*column_dtypes)
+    return dtypes
+
+
+def write_partitions(partition_files, output_file, dtypes, artists, ordered):
+    """
+    Writes the partition files into one output file with the dtypes of
+    the whole data. Partitions in date order are streamed one at a time,
+    overlapping ones are combined and stably sorted by AUCTION DATE.
+    """
+    frames = (pd.read_pickle(file_path) for file_path in partition_files)
+    if not ordered:
+        frames = [pd.concat(list(frames), ignore_index=True)
+                  .sort_values(DATE_COLUMN, kind='stable')]
+    with dataset_io.ChunkWriter(output_file) as writer:
+        for df in frames:
+            if len(df):
+                df = column_types.apply_dtype_policy(df, artists)
+                writer.write(df.astype({column: dtype for column, dtype
+                                        in dtypes.items()
+                                        if column in df.columns}))
+
+
+def run_partitioned_pipeline(input_filenames, filter_date=None,
+                             data_folder=run_pipeline.DATA_FOLDER,
+                             file_format='xlsx', resolve_artists=False,
+                             partitions=None, executor=None, work_folder=None):
+    """
+    Processes, filters and encodes raw data files like run_pipeline,
+    running the row-local work of the stages on partitions concurrently.
+
+    Every source file is a partition, a single source file is split into
+    date ranges. The executor runs three tasks per partition, and only
+    the global steps run centrally between them: the PERIOD mode (and
+    the artist mapping with resolve_artists) after the first, the artist
+    filter and the artist order of the encoding after the second. The
+    output files are named after the first file, as by run_pipeline.
+
+    Parameters:
+    input_filenames (list): Names of the files in data/raw.
+    partitions (int): Date ranges of a single source file, one per
+    worker by default.
+    executor (Executor): Backend running the tasks, local processes by
+    default.
+    work_folder (str): Folder of the partition files, shared by the
+    workers of the executor.
+
+    Returns:
+    Path: The encoded file.
+    """
+    if isinstance(input_filenames, str):
+        input_filenames = [input_filenames]
+    files = run_pipeline.pipeline_files(
+        input_filenames[0], data_folder, file_format)
+    own_executor = executor is None
+    if own_executor:
+        executor = partition_executor.get_executor('local')
+    partitions = partitions or getattr(executor, 'workers', 1)
+    work = Path(tempfile.mkdtemp(
+        prefix='.partitions-', dir=work_folder or files['interim'].parent))
+
+    try:
+        print("Processing data...")
+        with stage_metrics.track_stage('process_data') as stage:
+            sources = [Path(data_folder) / 'raw' / name
+                       for name in input_filenames]
+            if len(sources) == 1 and partitions > 1:
+                raw_parts = split_by_date(
+                    dataset_io.read_dataset(sources[0]), partitions)
+                sources = [work / f'raw_{index}.pkl'
+                           for index in range(len(raw_parts))]
+                for part, source in zip(raw_parts, sources):
+                    part.to_pickle(source)
+                del raw_parts
+            names = range(len(sources))
+
+            prepared = executor.map(prepare_partition, [
+                (str(source), str(work / f'prepared_{index}.pkl'),
+                 resolve_artists) for index, source in zip(names, sources)])
+            stage['rows_in'] = sum(result['rows_in'] for result in prepared)
+
+            mode_value = process_data.period_mode(
+                merge_counts(result['period_counts'] for result in prepared))
+            artist_mapping = None
+            if resolve_artists:
+                resolver = artist_resolution.ArtistResolver.load()
+                artist_keys = merge_counts(
+                    result['artist_keys'] for result in prepared)
+                resolver.resolve_counts(artist_keys)
+                resolver.save()
+                artist_mapping = {key: resolver.mapping[key]
+                                  for key in artist_keys.index}
+
+            cleaned = executor.map(clean_partition, [
+                (str(work / f'prepared_{index}.pkl'),
+                 str(work / f'interim_{index}.pkl'), mode_value,
+                 artist_mapping, filter_date) for index in names])
+            schema.quarantine(pd.concat(
+                [result['rejected'] for result in prepared + cleaned],
+                ignore_index=True), 'process_data', replace=True)
+
+            # Partitions in date order can be written one after another
+            order = sorted(names, key=lambda index: (
+                cleaned[index]['dates'][0] if cleaned[index]['rows']
+                else pd.Timestamp.max))
+            bounds = [cleaned[index]['dates'] for index in order
+                      if cleaned[index]['rows']]
+            ordered = all(previous[1] <= following[0] for previous, following
+                          in zip(bounds, bounds[1:]))
+            if not ordered:
+                order = list(names)
+
+            write_partitions(
+                [work / f'interim_{index}.pkl' for index in order],
+                files['interim'],
+                common_dtypes([result['dtypes'] for result in cleaned
+                               if result['rows']]),
+                sorted(set().union(*(result['artists'] for result in cleaned))),
+                ordered)
+            stage['rows_out'] = sum(result['rows'] for result in cleaned)
+
+        print("Filtering and encoding data...")
+        with stage_metrics.track_stage('filter_data') as stage:
+            stage['rows_in'] = sum(result['rows'] for result in cleaned)
+            artist_counts = merge_counts(
+                result['artist_counts'] for result in cleaned)
+            kept_artists = sorted(filter_data.frequent_artists(artist_counts))
+            dated_artists = set().union(
+                *(result['dated_artists'] for result in cleaned))
+            encode_artists = [artist for artist in kept_artists
+                              if artist in dated_artists]
+
+            encoded = executor.map(filter_encode_partition, [
+                (str(work / f'interim_{index}.pkl'),
+                 str(work / f'filtered_{index}.pkl'),
+                 str(work / f'encoded_{index}.pkl'),
+                 kept_artists, encode_artists, filter_date)
+                for index in names])
+            write_partitions(
+                [work / f'filtered_{index}.pkl' for index in order],
+                files['filtered'],
+                common_dtypes([result['dtypes'] for result in encoded
+                               if result['rows']]),
+                kept_artists, ordered)
+            stage['rows_out'] = sum(result['rows'] for result in encoded)
+
+        with stage_metrics.track_stage('encode_data_const') as stage:
+            stage['rows_in'] = stage['rows_out'] = sum(
+                result['rows'] for result in encoded)
+            write_partitions(
+                [work / f'encoded_{index}.pkl' for index in order],
+                files['encoded'],
+                common_dtypes([result['encoded_dtypes']
+                               for result in encoded if result['rows']]),
+                encode_artists, ordered)
+            encode_data_const.save_artists(encode_artists, files['encoded'])
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+        if own_executor:
+            executor.close()
+
+    print("Data processing completed successfully.")
+    return files['encoded']
+
+
+def main():
+    """Function accepting arguments"""
+    parser = argparse.ArgumentParser(
+        description='Process, filter and encode auction data in parallel '
+                    'partitions.')
+    parser.add_argument('input_filenames', type=str, nargs='+',
+                        help='Names of the Excel, CSV or Parquet files in '
+                             'data/raw, each one a partition.')
+    parser.add_argument('--filter-date', type=str, default=None,
+                        help='Optional cutoff date in YYYY-MM-DD format.')
+    parser.add_argument('--format', type=str, default='xlsx',
+                        choices=['xlsx', 'csv', 'parquet'],
+                        help='Format of the output files.')
+    parser.add_argument('--resolve-artists', action='store_true',
+                        help='Map artists to canonical artists with the '
+                             'persisted artist mapping.')
+    parser.add_argument('--partitions', type=int, default=None,
+                        help='Date ranges a single file is split into, one '
+                             'per worker by default.')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes, all cores by default.')
+    parser.add_argument('--backend', type=str, default='local',
+                        choices=sorted(partition_executor.EXECUTORS),
+                        help='Executor running the partitions.')
+
+    args = parser.parse_args()
+
+    with partition_executor.get_executor(args.backend, args.workers) \
+            as executor:
+        run_partitioned_pipeline(
+            args.input_filenames, args.filter_date, file_format=args.format,
+            resolve_artists=args.resolve_artists,
+            partitions=args.partitions, executor=executor)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""Runs filter plans on Polars, the optional columnar backend of the cleaning."""
+import numpy as np
+import pandas as pd
+
+# Row positions of the surviving rows in the input data
+POSITION_COLUMN = '__position__'
+
+
+def import_polars():
+    """
+    Returns the polars module, imported when a Polars step first runs so
+    the pandas backend never loads it. Raises ImportError when Polars is
+    not installed.
+    """
+    try:
+        import polars as pl
+    except ImportError as error:
+        raise ImportError(
+            'The polars backend needs Polars, install it with '
+            '"pip install polars".') from error
+    return pl
+
+
+def to_polars(series):
+    """
+    Converts a pandas column through Arrow. Text columns become strings,
+    other values of them are converted with str() as the pandas steps do
+    with astype(str), and missing values become null.
+    """
+    pl = import_polars()
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype(object)
+    if series.dtype == object:
+        text = series.astype(str).where(series.notna(), None)
+        return pl.from_pandas(text).cast(pl.String).alias(str(series.name))
+    return pl.from_pandas(series).alias(str(series.name))
+
+
+def map_unique(series, func, dtype):
+    """
+    Applies a Python function to the distinct values of a Polars series
+    only, nulls stay null.
+    """
+    pl = import_polars()
+    values = series.drop_nulls().unique()
+    mapped = pl.Series([func(value) for value in values.to_list()],
+                       dtype=dtype, strict=False)
+    return series.replace_strict(values, mapped, return_dtype=dtype)
+
+
+def text(df, column):
+    """
+    Returns a column as strings, non-text values converted with str()
+    like astype(str) converts them, nulls stay null.
+    """
+    pl = import_polars()
+    if df.schema[column] == pl.String:
+        return df[column]
+    return map_unique(df[column], str, pl.String)
+
+
+def missing(expr):
+    """Null values, and NaN values of float columns."""
+    pl = import_polars()
+    return expr.is_null() | expr.cast(pl.Float64, strict=False).is_nan() \
+        .fill_null(False)
+
+
+def policy_values(df, column, dtype=None):
+    """
+    Returns a numeric column as filter_data.policy_values does: parsed
+    from text, as float32 when values are missing or for floats, and cast
+    to dtype (wrapping like numpy) otherwise. Missing values are null.
+    """
+    pl = import_polars()
+    values = pl.col(column)
+    if df.schema[column] == pl.String:
+        values = values.str.strip_chars().str.replace_all(
+            ',', '', literal=True).cast(pl.Float64, strict=False)
+    values = pl.when(missing(values)).then(None).otherwise(values)
+    column_values = df.select(values).to_series()
+    if column_values.null_count():
+        return values.cast(pl.Float32)
+    if dtype is not None:
+        return values.cast(pl.Int64, strict=False).cast(
+            getattr(pl, dtype.capitalize()), wrap_numerical=True)
+    if column_values.dtype.is_float():
+        return values.cast(pl.Float32)
+    return values
+
+
+def execute(steps, df, tracker=None):
+    """
+    Runs the steps of a filter plan on Polars and returns the surviving
+    rows as a pandas frame, like FilterPlan.execute.
+
+    A column is converted to Polars only when a step with a Polars
+    implementation first reads it, narrowed to the rows left at that
+    point. Steps without one (aggregates with Python state, the schema
+    checks) get a pandas frame of the columns they read. Columns no step
+    writes are taken from the input data at the end, so they keep their
+    pandas values and dtypes.
+    """
+    pl = import_polars()
+    frame = pl.DataFrame({POSITION_COLUMN: np.arange(len(df))})
+    names, written = list(df.columns), set()
+
+    def load(columns):
+        nonlocal frame
+        positions = frame[POSITION_COLUMN].to_numpy()
+        new = [to_polars(df[column].iloc[positions]) for column in columns
+               if column not in frame.columns]
+        if new:
+            frame = frame.with_columns(new)
+
+    def to_pandas(columns):
+        positions = frame[POSITION_COLUMN].to_numpy()
+        index = df.index[positions]
+        return pd.DataFrame({
+            column: (frame[column].to_pandas() if column in written
+                     else df[column].iloc[positions]).set_axis(index)
+            for column in columns}, index=index)
+
+    for step in steps:
+        reads = names if step['reads'] is None else step['reads']
+        native = step.get('polars')
+        if native is not None:
+            load(reads)
+            result = native(frame)
+        else:
+            pandas_frame = to_pandas(reads)
+            result = step['func'](pandas_frame)
+        if step['kind'] == 'filter':
+            frame = frame.filter(result if native is not None else pl.Series(
+                np.asarray(result, dtype=bool)))
+        elif result is not None:
+            columns = {}
+            for column, values in result.items():
+                if values is None:
+                    frame = frame.drop(column, strict=False)
+                    names.remove(column)
+                    written.discard(column)
+                    continue
+                if native is None:
+                    if not isinstance(values, pd.Series):
+                        values = pd.Series(values, index=pandas_frame.index)
+                    elif not values.index.equals(pandas_frame.index):
+                        values = values.reindex(pandas_frame.index)
+                    values = to_polars(values.rename(column))
+                columns[column] = values
+                written.add(column)
+                if column not in names:
+                    names.append(column)
+            frame = frame.with_columns(**columns)
+        if tracker is not None:
+            tracker.step(step['name'], frame.height)
+
+    return to_pandas(names)
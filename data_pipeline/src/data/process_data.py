@@ -3,14 +3,46 @@ import re
 import argparse
 import numpy as np
 import pandas as pd
-from unidecode import unidecode
 # pylint: disable=E0401
+import column_types
 import columns_structure
+import dataset_io
+import filter_plan
 import metrics
+import polars_backend
+import schema
+import stage_metrics
+
+# Regex replacements unifying the artist names, applied in order
+ARTIST_REPLACEMENTS = [
+    # Removes parentheses
+    (r'[\(\)]', ''),
+
+    # Matches various formats of year ranges and individual years, replaces with empty string
+    (
+        r'\d{4}-\d{4}|\d{4} - \d{4}|\d{4} -\d{4}|\d{4}- \d{4}|'
+        r'\d{4}-|\d{4}–\d{4}|\d{4} – \d{4}|\d{4} –\d{4}|'
+        r'\d{4}– \d{4}|\d{4}–|\d{4}|\d{4}/\d{2}-\d{4}/\d{2}|'
+        r'\b[MDCLXVI]+\b-\b[MDCLXVI]+\b|\b[MDCLXVI]+\b|'
+        r'\b[MDCLXVI]e+\b| - | – |Fl\.|fl\.|fl |,|c\.|\.|\*|'
+        r'/-|/|\?|&amp|;|:', ''
+    ),
+
+    # Matches various forms of 'after', in different languages, replaces with 'after'
+    (
+        r'd\'apres|d\'apre|\'apres|after|afte|After|nach|naar|dopo',
+        'after'
+    ),
+]
+
+# Characters str.strip removes from ASCII text
+ASCII_WHITESPACE = ' \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f'
 
 
 def remove_accents(text):
     """Changes letters with accents to their corresponding base letters."""
+    from unidecode import unidecode
+
     return unidecode(text)
 
 
@@ -29,27 +61,7 @@ def apply_replacements(text):
     Ensures consistency in artists names by replacing noisy chars.
     Takes care of "after" prefix location.
     """
-    replacements = [
-        # Removes parentheses
-        (r'[\(\)]', ''),
-
-        # Matches various formats of year ranges and individual years, replaces with empty string
-        (
-            r'\d{4}-\d{4}|\d{4} - \d{4}|\d{4} -\d{4}|\d{4}- \d{4}|'
-            r'\d{4}-|\d{4}–\d{4}|\d{4} – \d{4}|\d{4} –\d{4}|'
-            r'\d{4}– \d{4}|\d{4}–|\d{4}|\d{4}/\d{2}-\d{4}/\d{2}|'
-            r'\b[MDCLXVI]+\b-\b[MDCLXVI]+\b|\b[MDCLXVI]+\b|'
-            r'\b[MDCLXVI]e+\b| - | – |Fl\.|fl\.|fl |,|c\.|\.|\*|'
-            r'/-|/|\?|&amp|;|:', ''
-        ),
-
-        # Matches various forms of 'after', in different languages, replaces with 'after'
-        (
-            r'd\'apres|d\'apre|\'apres|after|afte|After|nach|naar|dopo',
-            'after'
-        ),
-    ]
-    for pattern, replacement in replacements:
+    for pattern, replacement in ARTIST_REPLACEMENTS:
         # Use the text variable to apply the replacements
         text = text.str.replace(pattern, replacement, regex=True)
 
@@ -120,72 +132,208 @@ def remove_columns(df, columns_to_remove):
     return df
 
 
-def process_data(input_file, output_file):
-    """Function sorting data by AUCTION DATE."""
+def fill_object(df):
+    """Treats empty OBJECT values as prints."""
+    return {'OBJECT': df['OBJECT'].replace("", np.nan).fillna("Print")}
 
-    df = pd.read_excel(input_file)
-    df = remove_columns(df, columns_structure.columns_to_remove)
 
-    df['AUCTION DATE'] = pd.to_datetime(df['AUCTION DATE'], errors='coerce')
+def fill_object_polars(df):
+    """fill_object on Polars."""
+    pl = polars_backend.import_polars()
+    objects = pl.col('OBJECT')
+    return {'OBJECT': pl.when(objects.is_null() | (objects == ''))
+            .then(pl.lit('Print')).otherwise(objects)}
 
-    df = df.dropna(subset=['AUCTION DATE'])
-    print(df['AUCTION DATE'].dtype)
-    assert df['AUCTION DATE'].dtype == 'datetime64[ns]', "AUCTION DATE column is not all datetime objects"
 
-    df = df.sort_values(by='AUCTION DATE')
+def is_print(df):
+    """Keeps the prints."""
+    return df['OBJECT'].str.contains("Print", na=False)
 
-    try:
-        df['OBJECT'].replace("", np.nan, inplace=True)
-        df['OBJECT'].fillna("Print", inplace=True)
-        df = df[df['OBJECT'].str.contains("Print", na=False)]
-    except KeyError:
-        df[' OBJECT'].replace("", np.nan, inplace=True)
-        df[' OBJECT'].fillna("Print", inplace=True)
-        df = df[df[' OBJECT'].str.contains("Print", na=False)]
-
-    df = df[~df['ARTIST'].str.strip().eq("")]
-    df = df.dropna(subset=['ARTIST'])
-
-    # Deacreasing the number of Artists - Unification of text
-    df.loc[:, "ARTIST"] = df.loc[:, "ARTIST"].apply(remove_accents)
-    df['ARTIST'] = apply_replacements(df['ARTIST'])
-
-    # Remove rows containing 'attr' or 'Attr'
-    df = df[~df['ARTIST'].str.contains('attr|Attr')]
-    df = df[~df['ARTIST'].str.contains('print|Print')]
-
-    # Standardize and normalize Artists names (make the order of name and surname insignificant)
-    df.loc[:, "ARTIST"] = df.loc[:, "ARTIST"].apply(normalize_and_sort_letters)
-
-    # Third Column Preprocessing (Period)
-    mode_value = df['PERIOD'].mode()[0]
-    df['PERIOD'] = df['PERIOD'].replace('', mode_value)
-    df['PERIOD'] = df['PERIOD'].str.split(',').str[0]
-
-    # Fourth Column Preprocessing (Technique)
-    df['TECHNIQUE'].fillna("", inplace=True)
-    df['TECHNIQUE'] = df['TECHNIQUE'].apply(
-        extract_first_desired_text,
-        args=(columns_structure.techniques, "Unknown"))
-    df = df[df['TECHNIQUE'].isin(columns_structure.techniques_to_keep)]
-    # Remove posters
+
+def is_print_polars(df):
+    """is_print on Polars."""
+    pl = polars_backend.import_polars()
+    return pl.col('OBJECT').str.contains('Print', literal=True)
+
+
+def unify_artist_text(df):
+    """Deacreasing the number of Artists - Unification of text"""
+    return {'ARTIST': apply_replacements(df['ARTIST'].apply(remove_accents))}
+
+
+def unify_artist_text_polars(df):
+    """unify_artist_text on Polars, accents are removed per distinct name."""
+    pl = polars_backend.import_polars()
+    artist = polars_backend.map_unique(df['ARTIST'], remove_accents,
+                                       pl.String)
+    for pattern, replacement in ARTIST_REPLACEMENTS:
+        artist = artist.str.replace_all(pattern, replacement)
+    # Names are ASCII once the accents are removed
+    artist = artist.str.strip_chars(ASCII_WHITESPACE) \
+        .str.replace_all('  ', ' ', literal=True)
+    moved = artist.str.strip_chars_start('after ') + ' after'
+    return {'ARTIST': artist.zip_with(~artist.str.starts_with('after '),
+                                      moved)}
+
+
+def is_not_attributed(df):
+    """Remove rows containing 'attr' or 'Attr'"""
+    return ~df['ARTIST'].str.contains('attr|Attr')
+
+
+def is_not_attributed_polars(df):
+    """is_not_attributed on Polars."""
+    pl = polars_backend.import_polars()
+    return ~pl.col('ARTIST').str.contains('attr|Attr')
+
+
+def is_not_print_artist(df):
+    """Remove rows of artists named 'print' or 'Print'"""
+    return ~df['ARTIST'].str.contains('print|Print')
+
+
+def is_not_print_artist_polars(df):
+    """is_not_print_artist on Polars."""
+    pl = polars_backend.import_polars()
+    return ~pl.col('ARTIST').str.contains('print|Print')
+
+
+def fold_artists(df):
+    """
+    Standardize and normalize Artists names
+    (make the order of name and surname insignificant)
+    """
+    return {'ARTIST': df['ARTIST'].apply(normalize_and_sort_letters)}
+
+
+def fold_artists_polars(df):
+    """fold_artists on Polars."""
+    pl = polars_backend.import_polars()
+    return {'ARTIST': pl.col('ARTIST').str.to_lowercase()
+            .str.replace_all(r'\W+', '').str.split('').list.sort()
+            .list.join('')}
+
+
+def selection_plan():
+    """Plan of the OBJECT and ARTIST row filters."""
+    return filter_plan.FilterPlan() \
+        .transform('object_text', fill_object,
+                   reads=['OBJECT'], writes=['OBJECT'],
+                   polars=fill_object_polars) \
+        .filter('object', is_print, reads=['OBJECT'], cost=2,
+                polars=is_print_polars) \
+        .transform('artist_text', unify_artist_text,
+                   reads=['ARTIST'], writes=['ARTIST'], cost=20,
+                   polars=unify_artist_text_polars) \
+        .filter('attributed_artists', is_not_attributed,
+                reads=['ARTIST'], cost=2, polars=is_not_attributed_polars) \
+        .filter('print_artists', is_not_print_artist,
+                reads=['ARTIST'], cost=2, polars=is_not_print_artist_polars)
+
+
+def artist_plan(artist_resolver=None):
+    """
+    Plan mapping the artists to canonical artists with an artist_resolver,
+    or folding them by their sorted letters.
+    """
+    plan = filter_plan.FilterPlan()
+    if artist_resolver is None:
+        return plan.transform('artist_folding', fold_artists,
+                              reads=['ARTIST'], writes=['ARTIST'], cost=5,
+                              polars=fold_artists_polars)
+    # The mapping depends on all the names, so no filter moves across it
+    return plan.transform(
+        'artist_resolution',
+        lambda df: {'ARTIST': artist_resolver.resolve_series(df['ARTIST'])},
+        reads=['ARTIST'], writes=['ARTIST'], cost=20, row_local=False)
+
+
+def period_mode(period_counts):
+    """
+    Returns the most frequent PERIOD from its value counts, the first in
+    sorted order on ties like Series.mode, or None without values.
+    """
+    if period_counts.empty:
+        return None
+    return min(period_counts.index[period_counts == period_counts.max()])
+
+
+def period_mode_plan(context):
+    """Plan storing the PERIOD mode of the rows left in context."""
+    def store_mode(df):
+        context['period_mode'] = period_mode(df['PERIOD'].value_counts())
+
+    return filter_plan.FilterPlan().transform(
+        'period_mode', store_mode, reads=['PERIOD'], writes=[],
+        row_local=False)
+
+
+def fill_period(df, mode_value):
+    """Third Column Preprocessing (Period)"""
+    period = df['PERIOD']
+    if mode_value is not None:
+        period = period.replace('', mode_value)
+    return {'PERIOD': period.str.split(',').str[0]}
+
+
+def fill_period_polars(df, mode_value):
+    """fill_period on Polars."""
+    pl = polars_backend.import_polars()
+    period = pl.col('PERIOD')
+    if mode_value is not None:
+        period = pl.when(period == '').then(pl.lit(str(mode_value))) \
+            .otherwise(period)
+    return {'PERIOD': period.str.split(',').list.first()}
+
+
+def extract_column(df, column, data, default_return):
+    """Maps a text column to the first desired value found in it."""
+    return {column: df[column].fillna("").apply(
+        extract_first_desired_text, args=(data, default_return))}
+
+
+def extract_column_polars(df, column, data, default_return):
+    """extract_column on Polars, the first matching substring wins."""
+    pl = polars_backend.import_polars()
+    text = pl.col(column).fill_null('').str.to_lowercase()
+    # pl.when starts the chain, every next match extends it
+    values = pl
+    for substring, result in data:
+        values = values.when(text.str.contains(substring.lower(),
+                                               literal=True)) \
+            .then(pl.lit(result.capitalize()))
+    return {column: values.otherwise(pl.lit(default_return))}
+
+
+def is_kept_technique(df):
+    """Keeps the techniques of columns_structure.techniques_to_keep."""
+    return df['TECHNIQUE'].isin(columns_structure.techniques_to_keep)
+
+
+def is_kept_technique_polars(df):
+    """is_kept_technique on Polars."""
+    pl = polars_backend.import_polars()
+    return pl.col('TECHNIQUE').is_in(columns_structure.techniques_to_keep)
+
+
+def is_not_poster(df):
+    """Remove posters"""
     regex = r'poster|plakat'
-    df = df[~df['DESCRIPTION'].str.contains(regex, case=False, na=False)]
+    return ~df['DESCRIPTION'].str.contains(regex, case=False, na=False)
 
-    # Fifth Column Preprocessing (Signature)
-    df['SIGNATURE'].fillna("", inplace=True)
-    df['SIGNATURE'] = df['SIGNATURE'].apply(
-        extract_first_desired_text,
-        args=(columns_structure.signatures, "Not signed"))
 
-    # Seventh Column Preprocessing (Condition)
-    df['CONDITION'].fillna("", inplace=True)
-    df['CONDITION'] = df['CONDITION'].apply(extract_first_desired_text, args=(
-        columns_structure.conditions, "Good condition"))
+def is_not_poster_polars(df):
+    """is_not_poster on Polars."""
+    pl = polars_backend.import_polars()
+    return ~pl.col('DESCRIPTION').str.contains('(?i)poster|plakat') \
+        .fill_null(False)
 
-    # Eighth Column Preprocessing (Total Dimensions)
-    # Extract missing values from the Description Column
 
+def compute_dimensions(df):
+    """
+    Eighth Column Preprocessing (Total Dimensions)
+    Extract missing values from the Description Column
+    """
     mask = (df['TOTAL DIMENSIONS'] == '') | df['TOTAL DIMENSIONS'].isna()
     extracted_data = df.loc[mask, 'DESCRIPTION'].str.extract(
         metrics.REGEX_DIMENSIONS)
@@ -195,19 +343,49 @@ def process_data(input_file, output_file):
         ensure_dimensions_structure, axis=1)
 
     # Convert all units to centimeters and calculate the area
-    df['TOTAL DIMENSIONS'] = df['TOTAL DIMENSIONS'].apply(
-        metrics.multiply_largest_dimensions)
+    return {'TOTAL DIMENSIONS': df['TOTAL DIMENSIONS'].apply(
+        metrics.multiply_largest_dimensions)}
 
-    # Remove rows where exception occured and where dimensions provided where equal 0
-    df = df[pd.notna(df['TOTAL DIMENSIONS']) & (df['TOTAL DIMENSIONS'] != '')]
 
-    # Ninth Column Preprocessing (Price)
-    df = df[df['PRICE'] != '']
-    df['PRICE'] = pd.to_numeric(df['PRICE'].replace(
-        ',', '', regex=True), errors='coerce')
-    df.dropna(subset=['PRICE'], inplace=True)
+def compute_dimensions_polars(df):
+    """
+    compute_dimensions on Polars, the areas are computed per distinct
+    dimensions text.
+    """
+    pl = polars_backend.import_polars()
+    groups = pl.col('DESCRIPTION').str.extract_groups(
+        metrics.REGEX_DIMENSIONS)
+    extracted = pl.concat_str(
+        [groups.struct.field(field) for field in ('1', '2', '3')],
+        separator='×', ignore_nulls=True)
+    unit = groups.struct.field('4')
+    extracted = pl.when(unit.is_not_null() & (unit != '')) \
+        .then(extracted + ' ' + unit).otherwise(extracted)
+
+    dimensions = pl.lit(polars_backend.text(df, 'TOTAL DIMENSIONS'))
+    dimensions = df.select(
+        pl.when(dimensions.is_null() | (dimensions == ''))
+        .then(extracted).otherwise(dimensions)).to_series()
+    return {'TOTAL DIMENSIONS': polars_backend.map_unique(
+        dimensions, metrics.multiply_largest_dimensions, pl.Float64)}
+
+
+def has_dimensions(df):
+    """
+    Remove rows where exception occured and where dimensions provided
+    where equal 0
+    """
+    return pd.notna(df['TOTAL DIMENSIONS']) & (df['TOTAL DIMENSIONS'] != '')
+
+
+def has_dimensions_polars(df):
+    """has_dimensions on Polars."""
+    pl = polars_backend.import_polars()
+    return ~polars_backend.missing(pl.col('TOTAL DIMENSIONS'))
 
-    # Tenth Column Preprocessing (Year)
+
+def extract_year(df):
+    """Tenth Column Preprocessing (Year)"""
     # Handle missing values in the YEAR column
     mask = (df['YEAR'] == "") | df['YEAR'].isna()
     extracted_data = df.loc[mask, 'PERIOD']
@@ -222,21 +400,257 @@ def process_data(input_file, output_file):
     # Extract the valid years using the regex pattern
     df.loc[matches, 'YEAR'] = df.loc[matches, 'YEAR'].str.extract(
         metrics.REGEX_YEAR, expand=False)
+    return {'YEAR': df['YEAR']}
+
+
+def extract_year_polars(df):
+    """extract_year on Polars."""
+    pl = polars_backend.import_polars()
+    period_years = {}
+    for period, year in columns_structure.periods_to_year:
+        period_years.setdefault(period, str(year))
+    retrieved = pl.col('PERIOD').replace_strict(
+        list(period_years), list(period_years.values()),
+        default=pl.lit('None'), return_dtype=pl.String)
+
+    year = pl.lit(polars_backend.text(df, 'YEAR'))
+    year = pl.when(year.is_null() | (year == '')).then(retrieved) \
+        .otherwise(year)
+    return {'YEAR': pl.coalesce(year.str.extract(metrics.REGEX_YEAR, 1),
+                                year)}
+
+
+def has_year(df):
+    """Remove rows where the year could not be resolved (NaN or empty)"""
+    return pd.notna(df['YEAR']) & (df['YEAR'] != '')
+
+
+def has_year_polars(df):
+    """has_year on Polars."""
+    pl = polars_backend.import_polars()
+    return pl.col('YEAR').is_not_null() & (pl.col('YEAR') != '')
 
-    # Remove rows where the year could not be resolved (NaN or empty)
-    df = df[pd.notna(df['YEAR']) & (df['YEAR'] != '')]
 
-    # Convert the 'YEAR' column back to integers (or NaN for invalid values)
-    df['YEAR'] = df['YEAR'].apply(convert_to_int_or_nan)
+def year_number(df):
+    """Convert the 'YEAR' column back to integers (NaN for invalid values)"""
+    return {'YEAR': df['YEAR'].apply(convert_to_int_or_nan)}
 
-    # Drop any remaining rows where the year is missing or invalid
-    df.dropna(subset=['YEAR'], inplace=True)
 
-    # Drop columns used for retrievel of missing information
-    df.drop('PERIOD', axis=1, inplace=True)
-    df.drop('DESCRIPTION', axis=1, inplace=True)
+def year_number_polars(df):
+    """year_number on Polars, floats like pandas when a year is invalid."""
+    pl = polars_backend.import_polars()
+    years = polars_backend.map_unique(df['YEAR'], convert_to_int_or_nan,
+                                      pl.Int64)
+    return {'YEAR': years.cast(pl.Float64) if years.null_count() else years}
 
-    df.to_excel(output_file, index=False)
+
+def has_year_number(df):
+    """Drop any remaining rows where the year is missing or invalid"""
+    return df['YEAR'].notna()
+
+
+def has_year_number_polars(df):
+    """has_year_number on Polars."""
+    pl = polars_backend.import_polars()
+    return ~polars_backend.missing(pl.col('YEAR'))
+
+
+def clean_schema_check(clean_schema, context):
+    """
+    Returns a filter removing the rows that break the clean schema
+    (out of range years and dimensions), stored in context['rejected'].
+    The parsed columns of the valid rows are kept in context['parsed'].
+    """
+    def is_valid(df):
+        reasons, parsed = schema.check_rows(df, clean_schema)
+        valid = (reasons == '').to_numpy()
+        context['rejected'] = schema.rejected_rows(df, reasons)
+        context['parsed'] = {column: values[valid]
+                             for column, values in parsed.items()}
+        return valid
+    return is_valid
+
+
+def finishing_plan(context, scoring=False):
+    """
+    Plan of the last, row-local part of the cleaning. The PERIOD mode is
+    read from context['period_mode'] and the rows rejected by the clean
+    schema are stored in context['rejected'].
+    """
+    def fill_mode(df):
+        return fill_period(df, context['period_mode'])
+
+    def fill_mode_polars(df):
+        return fill_period_polars(df, context['period_mode'])
+
+    def text_column(column, data, default_return, cost=10):
+        return {'reads': [column], 'writes': [column], 'cost': cost,
+                'func': lambda df: extract_column(
+                    df, column, data, default_return),
+                'polars': lambda df: extract_column_polars(
+                    df, column, data, default_return)}
+
+    return filter_plan.FilterPlan() \
+        .transform('period', fill_mode, reads=['PERIOD'], writes=['PERIOD'],
+                   polars=fill_mode_polars) \
+        .transform('technique_text', **text_column(
+            'TECHNIQUE', columns_structure.techniques, "Unknown")) \
+        .filter('technique', is_kept_technique, reads=['TECHNIQUE'],
+                polars=is_kept_technique_polars) \
+        .filter('posters', is_not_poster, reads=['DESCRIPTION'], cost=3,
+                polars=is_not_poster_polars) \
+        .transform('signature_text', **text_column(
+            'SIGNATURE', columns_structure.signatures, "Not signed")) \
+        .transform('condition_text', **text_column(
+            'CONDITION', columns_structure.conditions, "Good condition")) \
+        .transform('dimensions_text', compute_dimensions,
+                   reads=['TOTAL DIMENSIONS', 'DESCRIPTION'],
+                   writes=['TOTAL DIMENSIONS'], cost=20,
+                   polars=compute_dimensions_polars) \
+        .filter('dimensions', has_dimensions, reads=['TOTAL DIMENSIONS'],
+                polars=has_dimensions_polars) \
+        .transform('year_text', extract_year, reads=['YEAR', 'PERIOD'],
+                   writes=['YEAR'], cost=5, polars=extract_year_polars) \
+        .filter('year', has_year, reads=['YEAR'], polars=has_year_polars) \
+        .transform('year_number', year_number, reads=['YEAR'],
+                   writes=['YEAR'], cost=3, polars=year_number_polars) \
+        .filter('year_value', has_year_number, reads=['YEAR'],
+                polars=has_year_number_polars) \
+        .drop('retrieval_columns', ['PERIOD', 'DESCRIPTION']) \
+        .filter('clean_schema', clean_schema_check(
+            schema.SCORING_CLEAN_SCHEMA if scoring else schema.CLEAN_SCHEMA,
+            context), cost=5)
+
+
+def raw_rows(df, sort=False, scoring=False):
+    """
+    Validates the raw data and orders it by AUCTION DATE.
+    Returns the valid rows and the rows rejected by the raw schema.
+    """
+    df = remove_columns(df, columns_structure.columns_to_remove)
+
+    # Rows without an artist, a price or an auction date can not be used,
+    # the valid rows come back with PRICE and AUCTION DATE parsed
+    df, rejected = schema.validate(
+        df, schema.SCORING_RAW_SCHEMA if scoring else schema.RAW_SCHEMA)
+
+    if sort or not df['AUCTION DATE'].is_monotonic_increasing:
+        df = df.sort_values(by='AUCTION DATE', kind='stable')
+    return df, rejected
+
+
+def finish_dtypes(df, context, scoring=False):
+    """
+    Returns the cleaned rows with the numeric and datetime columns parsed,
+    the categorical columns as category dtypes and the numeric columns as
+    compact dtypes, as they are carried from here on.
+    The columns parsed by the clean schema check are reused when no later
+    filter removed rows.
+    """
+    parsed = context['parsed']
+    if any(len(values) != len(df) for values in parsed.values()):
+        parsed = schema.parse_columns(
+            df, schema.SCORING_CLEAN_SCHEMA if scoring
+            else schema.CLEAN_SCHEMA)
+    return column_types.apply_dtype_policy(df.assign(**{
+        column: values.set_axis(df.index)
+        for column, values in parsed.items()}))
+
+
+def select_rows(df, sort=False, scoring=False, tracker=None,
+                backend='pandas'):
+    """
+    First, row-local part of the cleaning: validation against the raw
+    schema, ordering and the OBJECT and ARTIST row filters.
+    Returns the kept rows and the rows rejected by the schema.
+    """
+    tracker = tracker or stage_metrics.FilterTracker(len(df))
+    df, rejected = raw_rows(df, sort, scoring)
+    tracker.step('raw_schema', df)
+    return selection_plan().execute(df, tracker, backend), rejected
+
+
+def finish_cleaning(df, mode_value, scoring=False, tracker=None,
+                    backend='pandas'):
+    """
+    Last, row-local part of the cleaning, once ARTIST is normalized and
+    the PERIOD mode of the whole data is known.
+    Returns the cleaned rows and the rows rejected by the clean schema.
+    """
+    tracker = tracker or stage_metrics.FilterTracker(len(df))
+    context = {'period_mode': mode_value}
+    df = finishing_plan(context, scoring).execute(df, tracker, backend)
+    df = finish_dtypes(df, context, scoring)
+    tracker.step('dtypes', df)
+    return df, context['rejected']
+
+
+def clean_data(df, sort=False, quarantine_stage=None, artist_resolver=None,
+               scoring=False, tracker=None, filters=None, backend='pandas'):
+    """
+    Cleans the raw auction data.
+    The raw store is kept ordered by AUCTION DATE on ingestion, so the data
+    is fully re-sorted only when requested or when the order is broken.
+    Rows breaking the raw or the clean schema are dropped, and replace the
+    rows of the quarantine file of quarantine_stage when it is given.
+    With an artist_resolver, artists are mapped to canonical artists
+    instead of being folded by their sorted letters.
+    In the scoring mode rows without a PRICE are kept, to be priced.
+    The rows, time and memory of every step are recorded by tracker.
+
+    All filters and transforms after the raw schema check run as one
+    filter plan, materialized once. The steps of a filters plan, e.g.
+    filter_data.outlier_plan(), join the same plan; its cheap predicates
+    then run ahead of the string transforms, so rows they remove are not
+    checked against the clean schema nor quarantined.
+    The plan runs on the given backend of filter_plan.BACKENDS, with the
+    same result.
+    """
+    tracker = tracker or stage_metrics.FilterTracker(len(df))
+    df, raw_rejected = raw_rows(df, sort, scoring)
+    tracker.step('raw_schema', df)
+
+    context = {}
+    plan = selection_plan().extend(artist_plan(artist_resolver)) \
+        .extend(period_mode_plan(context)) \
+        .extend(finishing_plan(context, scoring))
+    if filters is not None:
+        plan.extend(filters)
+    df = finish_dtypes(plan.execute(df, tracker, backend), context, scoring)
+    tracker.step('dtypes', df)
+
+    if quarantine_stage is not None:
+        schema.quarantine(pd.concat([raw_rejected, context['rejected']],
+                                    ignore_index=True), quarantine_stage,
+                          replace=True)
+    return df
+
+
+def process_data(input_file, output_file, sort=False, resolve_artists=False,
+                 trace_memory=False, backend='pandas'):
+    """
+    Cleans the raw data file and saves the result, with the report of
+    its filter steps next to it.
+    With resolve_artists the persisted canonical artist mapping is used
+    and updated with the new names. backend runs the filter plan on
+    pandas or Polars.
+    """
+    import artist_resolution
+
+    resolver = artist_resolution.ArtistResolver.load() \
+        if resolve_artists else None
+    with stage_metrics.track_stage('process_data') as stage:
+        df = dataset_io.read_dataset(input_file)
+        stage['rows_in'] = len(df)
+        tracker = stage_metrics.FilterTracker(len(df), trace_memory)
+        df = clean_data(df, sort, quarantine_stage='process_data',
+                        artist_resolver=resolver, tracker=tracker,
+                        backend=backend)
+        stage['rows_out'] = len(df)
+        dataset_io.write_dataset(df, output_file)
+        tracker.write_report(output_file, 'process_data')
+    if resolver is not None:
+        resolver.save()
 
 
 def main():
@@ -244,13 +658,26 @@ def main():
     parser = argparse.ArgumentParser(
         description='Process and auction data.')
     parser.add_argument('input_file', type=str,
-                        help='Path to the input Excel file.')
+                        help='Path to the input Excel, CSV or Parquet file.')
     parser.add_argument('output_file', type=str,
-                        help='Path to the output Excel file.')
+                        help='Path to the output Excel, CSV or Parquet file.')
+    parser.add_argument('--sort', action='store_true',
+                        help='Fully re-sort the data by AUCTION DATE.')
+    parser.add_argument('--resolve-artists', action='store_true',
+                        help='Map artists to canonical artists with the '
+                             'persisted artist mapping.')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='Account the memory of the filter steps with '
+                             'tracemalloc instead of the resident memory.')
+    parser.add_argument('--backend', type=str, default='pandas',
+                        choices=filter_plan.BACKENDS,
+                        help='Run the filters and transforms on pandas or '
+                             'on Polars (needs polars).')
 
     args = parser.parse_args()
 
-    process_data(args.input_file, args.output_file)
+    process_data(args.input_file, args.output_file, args.sort,
+                 args.resolve_artists, args.trace_memory, args.backend)
 
 
 if __name__ == '__main__':
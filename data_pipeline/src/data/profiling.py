@@ -0,0 +1,338 @@
+"""Single-pass, streaming profiles of the auction datasets."""
+import argparse
+import hashlib
+import json
+import numbers
+import os
+from pathlib import Path
+import numpy as np
+import pandas as pd
+# pylint: disable=E0401
+import dataset_io
+
+PROFILE_FOLDER = Path(os.getenv(
+    'PIPELINE_PROFILE_FOLDER',
+    Path(__file__).resolve().parents[2] / 'data' / 'profiles'))
+
+CHUNK_ROWS = 100000
+TOP_K = 50
+HISTOGRAM_BINS = 50
+# Values kept per numeric column to build its histogram
+HISTOGRAM_SAMPLE = 100000
+# Distinct values counted exactly before switching to HyperLogLog
+EXACT_DISTINCT_LIMIT = 100000
+# 2^14 registers, about 0.8% standard error
+HLL_PRECISION = 14
+
+
+def is_number(value):
+    """Checks whether a value is a number, booleans excluded."""
+    return isinstance(value, (numbers.Number, np.number)) and \
+        not isinstance(value, (bool, np.bool_))
+
+
+def value_hashes(series):
+    """
+    Returns 64-bit hashes of the non-null values. Numbers are hashed as
+    float64, so a column read as int in one chunk and float in another
+    hashes the same. Other values of object columns are hashed with
+    their type, as hash_pandas_object would hash 500 and '500' alike
+    while nunique counts them apart.
+    """
+    values = series.dropna()
+    if pd.api.types.is_numeric_dtype(values) and \
+            not pd.api.types.is_bool_dtype(values):
+        values = values.astype('float64')
+    elif values.dtype == object:
+        numeric = values.map(is_number).to_numpy(dtype=bool)
+        hashes = np.empty(len(values), dtype=np.uint64)
+        hashes[numeric] = pd.util.hash_pandas_object(
+            values[numeric].astype('float64'), index=False).to_numpy()
+        hashes[~numeric] = pd.util.hash_pandas_object(
+            values[~numeric].map(
+                lambda value: f'{type(value).__name__}:{value}'),
+            index=False).to_numpy()
+        return hashes
+    return pd.util.hash_pandas_object(values, index=False).to_numpy()
+
+
+def leading_zeros(values):
+    """Returns the leading zero bits of non-zero uint64 values."""
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    # 32-bit halves are exact in float64, so log2 gives the exact bit length
+    with np.errstate(divide='ignore'):
+        return np.where(high > 0, 31 - np.floor(np.log2(high)),
+                        63 - np.floor(np.log2(low))).astype(np.uint8)
+
+
+class HyperLogLog:
+    """Approximate distinct count of hashed values in fixed memory."""
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add(self, hashes):
+        """Adds an array of uint64 hashes."""
+        if not len(hashes):
+            return
+        shift = np.uint64(64 - self.precision)
+        index = (hashes >> shift).astype(np.intp)
+        # A guard bit bounds the rank when the remaining bits are zero
+        remaining = (hashes << np.uint64(self.precision)) | \
+            np.uint64(1 << (self.precision - 1))
+        np.maximum.at(self.registers, index, leading_zeros(remaining) + 1)
+
+    def count(self):
+        """Returns the estimated number of distinct values."""
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(
+            np.ldexp(1.0, -self.registers.astype(np.int64)))
+        empty = np.count_nonzero(self.registers == 0)
+        if estimate <= 2.5 * m and empty:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * np.log(m / empty)
+        return int(round(estimate))
+
+
+def json_value(value):
+    """Returns a value that can be stored in JSON."""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return str(pd.Timestamp(value))
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+class ColumnProfile:
+    """Running statistics of one column, updated chunk by chunk."""
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self.dtype = None
+        self.nulls = 0
+        self.count = 0
+        self.hll = HyperLogLog()
+        self.distinct_hashes = np.empty(0, dtype=np.uint64)
+        self.distinct_exact = True
+        self.top = {}
+        self.numeric = None
+        self.sample = np.empty(0)
+        self.sample_keys = np.empty(0)
+
+    def update(self, series):
+        """Adds the values of a chunk."""
+        self.dtype = str(series.dtype)
+        nulls = int(series.isna().sum())
+        self.nulls += nulls
+        self.count += len(series) - nulls
+
+        hashes = value_hashes(series)
+        self.hll.add(hashes)
+        if self.distinct_exact:
+            self.distinct_hashes = np.union1d(self.distinct_hashes, hashes)
+            if not self.profiler.exact_distinct and \
+                    len(self.distinct_hashes) > EXACT_DISTINCT_LIMIT:
+                self.distinct_exact = False
+                self.distinct_hashes = None
+
+        # Only the most frequent values are tracked, like Space-Saving
+        capacity = self.profiler.top_capacity
+        for value, count in series.value_counts().head(capacity).items():
+            value = json_value(value)
+            self.top[value] = self.top.get(value, 0) + int(count)
+        if len(self.top) > 2 * capacity:
+            self.top = dict(sorted(self.top.items(), key=lambda item: -item[1])
+                            [:capacity])
+
+        if pd.api.types.is_numeric_dtype(series) and \
+                not pd.api.types.is_bool_dtype(series):
+            self.update_numeric(series.dropna().to_numpy(dtype=np.float64))
+
+    def update_numeric(self, values):
+        """Updates the moments and the histogram sample of a numeric chunk."""
+        if self.numeric is None:
+            self.numeric = {'min': np.inf, 'max': -np.inf, 'sum': 0.0,
+                            'sum_squares': 0.0}
+        if not len(values):
+            return
+        self.numeric['min'] = min(self.numeric['min'], values.min())
+        self.numeric['max'] = max(self.numeric['max'], values.max())
+        self.numeric['sum'] += values.sum()
+        self.numeric['sum_squares'] += np.square(values).sum()
+        # Bottom-k sample: the values with the smallest random keys are a
+        # uniform sample of everything seen so far
+        keys = self.profiler.rng.random(len(values))
+        self.sample = np.concatenate([self.sample, values])
+        self.sample_keys = np.concatenate([self.sample_keys, keys])
+        if len(self.sample) > HISTOGRAM_SAMPLE:
+            keep = np.argpartition(self.sample_keys, HISTOGRAM_SAMPLE)[
+                :HISTOGRAM_SAMPLE]
+            self.sample, self.sample_keys = self.sample[keep], \
+                self.sample_keys[keep]
+
+    def result(self, scale):
+        """Returns the statistics, counts scaled by scale for sampled data."""
+        distinct = len(self.distinct_hashes) if self.distinct_exact \
+            else self.hll.count()
+        top = sorted(self.top.items(), key=lambda item: -item[1])[
+            :self.profiler.top_k]
+        profile = {
+            'dtype': self.dtype,
+            'nulls': int(round(self.nulls * scale)),
+            'count': int(round(self.count * scale)),
+            'distinct': distinct,
+            'distinct_exact': self.distinct_exact and scale == 1,
+            'top': [[value, int(round(count * scale))]
+                    for value, count in top],
+        }
+        if self.numeric is not None and self.count:
+            mean = self.numeric['sum'] / self.count
+            variance = self.numeric['sum_squares'] / self.count - mean ** 2
+            counts, edges = np.histogram(
+                self.sample, bins=self.profiler.bins,
+                range=(self.numeric['min'], self.numeric['max']))
+            profile.update({
+                'min': float(self.numeric['min']),
+                'max': float(self.numeric['max']),
+                'mean': float(mean),
+                'std': float(np.sqrt(max(variance, 0.0))),
+                'histogram': {
+                    'edges': edges.tolist(),
+                    # The sample counts scaled to all values
+                    'counts': (counts * (self.count * scale /
+                                         len(self.sample))).round().tolist(),
+                },
+            })
+        return profile
+
+
+class DatasetProfiler:
+    """
+    Profiles a dataset in a single pass over its chunks.
+
+    Every column gets its null count, distinct count, most frequent values
+    and, for numeric columns, min, max, mean, standard deviation and a
+    histogram. Distinct values are counted exactly up to
+    EXACT_DISTINCT_LIMIT and with HyperLogLog above it, unless
+    exact_distinct is set. With sample_fraction below 1 only a random
+    share of each chunk is profiled and the counts are scaled up.
+    """
+
+    def __init__(self, sample_fraction=1.0, exact_distinct=False,
+                 top_k=TOP_K, bins=HISTOGRAM_BINS, seed=0):
+        self.sample_fraction = sample_fraction
+        self.exact_distinct = exact_distinct
+        self.top_k = top_k
+        self.top_capacity = max(10 * top_k, 1000)
+        self.bins = bins
+        self.rng = np.random.default_rng(seed)
+        self.rows = 0
+        self.columns = {}
+
+    def update(self, chunk):
+        """Adds the rows of a chunk."""
+        self.rows += len(chunk)
+        if self.sample_fraction < 1:
+            chunk = chunk.sample(frac=self.sample_fraction,
+                                 random_state=self.rng)
+        for column in chunk.columns:
+            if column not in self.columns:
+                self.columns[column] = ColumnProfile(self)
+            self.columns[column].update(chunk[column])
+
+    def result(self):
+        """Returns the profile as a JSON-serializable dict."""
+        scale = 1 / self.sample_fraction if self.sample_fraction < 1 else 1
+        return {
+            'rows': self.rows,
+            'sample_fraction': self.sample_fraction,
+            'columns': {str(column): profile.result(scale)
+                        for column, profile in self.columns.items()},
+        }
+
+
+def profile_chunks(chunks, **options):
+    """Profiles an iterable of DataFrames, see DatasetProfiler for options."""
+    profiler = DatasetProfiler(**options)
+    for chunk in chunks:
+        profiler.update(chunk)
+    return profiler.result()
+
+
+def profile_frame(df, **options):
+    """Profiles a DataFrame, see DatasetProfiler for options."""
+    return profile_chunks([df], **options)
+
+
+def profile_cache_file(file_path, options, folder=PROFILE_FOLDER):
+    """
+    Returns the cache file of a dataset, keyed by its content and options.
+    """
+    digest = hashlib.sha256(json.dumps(options, sort_keys=True).encode())
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return Path(folder) / \
+        f'{Path(file_path).stem}_{digest.hexdigest()[:16]}.json'
+
+
+def profile_file(file_path, chunk_rows=CHUNK_ROWS, use_cache=True,
+                 folder=PROFILE_FOLDER, **options):
+    """
+    Profiles a dataset file, streamed chunk by chunk.
+    The profile is cached, so it is computed again only when the file
+    or the options change.
+    """
+    cache_file = profile_cache_file(file_path, options, folder)
+    if use_cache and cache_file.exists():
+        with open(cache_file, 'r', encoding='utf8') as f:
+            return json.load(f)
+
+    if Path(file_path).suffix.lower() == '.xls':
+        chunks = [dataset_io.read_dataset(file_path)]
+    else:
+        chunks = dataset_io.iter_dataset_chunks(file_path, chunk_rows)
+    profile = profile_chunks(chunks, **options)
+
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(cache_file, 'w', encoding='utf8') as f:
+        json.dump(profile, f, indent=4)
+    return profile
+
+
+def main():
+    """Function accepting arguments"""
+    import data_exploration
+
+    parser = argparse.ArgumentParser(
+        description='Profile an Excel, CSV or Parquet dataset.')
+    parser.add_argument('input_file', type=str,
+                        help='Path to the dataset file.')
+    parser.add_argument('--sample', type=float, default=1.0,
+                        help='Share of the rows to profile.')
+    parser.add_argument('--exact', action='store_true',
+                        help='Count distinct values exactly.')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS,
+                        help='Rows read at once.')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Profile again even if a cached profile exists.')
+
+    args = parser.parse_args()
+
+    profile = profile_file(args.input_file, args.chunk_rows,
+                           use_cache=not args.no_cache,
+                           sample_fraction=args.sample,
+                           exact_distinct=args.exact)
+    with pd.option_context('display.max_columns', None, 'display.width', 200):
+        print(f"{profile['rows']} rows")
+        print(data_exploration.missing_data(profile))
+        print(data_exploration.value_counts(profile))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""Persistent key index of the raw store rows, used to drop duplicate records."""
+import argparse
+import os
+import tempfile
+from pathlib import Path
+import numpy as np
+import pandas as pd
+# pylint: disable=E0401
+import dataset_io
+
+# Columns identifying an auction record, the first non-empty one is the key
+KEY_COLUMNS = ('URL', 'ImageName')
+INDEX_SUFFIX = '.keys'
+KEY_DTYPE = np.dtype('<u8')
+
+
+def index_file(store_file):
+    """Returns the path of the key index kept next to a store."""
+    store_file = Path(store_file)
+    return store_file.with_name(store_file.name + INDEX_SUFFIX)
+
+
+def record_keys(df):
+    """
+    Returns the 64-bit key of every row: the hash of its URL, of its
+    ImageName when the URL is empty, or of all its values when both are.
+    """
+    labels = pd.Series(pd.NA, index=df.index, dtype='string')
+    for column in KEY_COLUMNS:
+        if column in df.columns:
+            values = df[column].astype('string').str.strip()
+            labels = labels.fillna(column + ':' + values.where(values != ''))
+    missing = labels.isna()
+    if missing.any():
+        rows = df.loc[missing, sorted(df.columns)].astype('string')
+        labels[missing] = 'row:' + pd.util.hash_pandas_object(
+            rows, index=False).astype('string')
+    return pd.util.hash_pandas_object(
+        labels, index=False).to_numpy(dtype=KEY_DTYPE)
+
+
+class RecordIndex:
+    """
+    Keys of the rows of a raw store.
+
+    The keys are kept in a binary file next to the store, one per store
+    row, and new keys are appended to it after the store is written. The
+    distinct keys are held in a hash-based index, so every incoming row
+    is checked in constant time. An index whose length does not match the
+    store (e.g. a store edited by hand) is rebuilt from the store.
+    """
+
+    def __init__(self, store_file, keys):
+        self.file_path = index_file(store_file)
+        self._count = len(keys)
+        self._keys = pd.Index(keys).unique()
+
+    def __len__(self):
+        return self._count
+
+    @classmethod
+    def build(cls, store_file, store_df):
+        """Rebuilds the index of a store from its rows."""
+        keys = record_keys(store_df)
+        index = cls(store_file, keys)
+        index.save(keys)
+        return index
+
+    @classmethod
+    def load(cls, store_file, store_df):
+        """Loads the index of a store, rebuilding it when it is out of date."""
+        file_path = index_file(store_file)
+        if file_path.exists():
+            keys = np.fromfile(file_path, dtype=KEY_DTYPE)
+            if len(keys) == len(store_df):
+                return cls(store_file, keys)
+        return cls.build(store_file, store_df)
+
+    def save(self, keys):
+        """Replaces the index file, written to a temporary file first."""
+        self.file_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.file_path.parent,
+                                        prefix='.keys-')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(np.asarray(keys, dtype=KEY_DTYPE).tobytes())
+        os.replace(tmp_path, self.file_path)
+
+    def new_rows(self, keys):
+        """
+        Returns the mask of the keys neither in the index nor seen earlier
+        in the same batch.
+        """
+        unseen = self._keys.get_indexer(keys) == -1
+        return unseen & ~pd.Series(keys).duplicated().to_numpy()
+
+    def append(self, keys):
+        """Adds the keys of rows written to the store."""
+        keys = np.asarray(keys, dtype=KEY_DTYPE)
+        if not len(keys):
+            return
+        with open(self.file_path, 'ab') as f:
+            f.write(keys.tobytes())
+        self._count += len(keys)
+        self._keys = self._keys.append(pd.Index(keys)).unique()
+
+
+def dedupe_store(store_file):
+    """
+    Removes the duplicate records of an existing store, keeping the first
+    row of every key, and rebuilds its index.
+
+    Returns:
+    int: Number of rows removed.
+    """
+    store_df = dataset_io.read_dataset(store_file)
+    duplicated = pd.Series(record_keys(store_df)).duplicated().to_numpy()
+    if duplicated.any():
+        store_df = store_df[~duplicated].reset_index(drop=True)
+        dataset_io.write_dataset(store_df, store_file)
+    RecordIndex.build(store_file, store_df)
+    print(f"{duplicated.sum()} duplicate rows removed, "
+          f"{len(store_df)} rows left in {store_file}")
+    return int(duplicated.sum())
+
+
+def main():
+    """Function accepting arguments"""
+    parser = argparse.ArgumentParser(
+        description='Remove duplicate records from a raw store and index it.')
+    parser.add_argument('store_files', type=str, nargs='+',
+                        help='Paths to the raw stores.')
+
+    args = parser.parse_args()
+
+    for store_file in args.store_files:
+        dedupe_store(store_file)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""Runs all data processing stages in a single process."""
+import argparse
+from pathlib import Path
+# pylint: disable=E0401
+import artist_resolution
+import column_types
+import dataset_io
+import encode_data_const
+import filter_by_date
+import filter_data
+import filter_plan
+import process_data
+import stage_metrics
+
+DATA_FOLDER = Path(__file__).resolve().parents[2] / 'data'
+
+
+def pipeline_files(input_filename, data_folder=DATA_FOLDER, file_format='xlsx'):
+    """
+    Returns the raw, interim, filtered and encoded paths of a data file.
+    The outputs are Excel files by default; 'parquet' keeps the dtypes.
+    """
+    data_folder = Path(data_folder)
+    base_name = Path(input_filename).stem
+    return {
+        'raw': data_folder / 'raw' / input_filename,
+        'interim': data_folder / 'interim' / f'{base_name}.{file_format}',
+        'filtered':
+            data_folder / 'interim' / f'filtered_{base_name}.{file_format}',
+        'encoded':
+            data_folder / 'processed' / f'encoded_{base_name}.{file_format}',
+    }
+
+
+def process_and_filter(df, filter_date=None, resolver=None, tracker=None,
+                       backend='pandas'):
+    """
+    Cleans and filters raw data in a single filter plan: the outlier
+    filters and the date filter join the cleaning plan, so the cheap
+    range checks run ahead of the string transforms and the frame is
+    materialized once. The result is equal to processing and filtering
+    one after the other, but rows removed as outliers are not checked
+    against the clean schema nor quarantined, and no interim data is
+    produced.
+    """
+    filters = filter_data.outlier_plan()
+    if filter_date:
+        filters.filter(
+            'auction_date',
+            lambda frame: filter_by_date.is_after(frame, filter_date),
+            reads=['AUCTION DATE'], polars=lambda frame:
+            filter_by_date.is_after_polars(frame, filter_date))
+    tracker = tracker or stage_metrics.FilterTracker(len(df))
+    df = column_types.to_categorical(process_data.clean_data(
+        df, quarantine_stage='process_data', artist_resolver=resolver,
+        tracker=tracker, filters=filters, backend=backend))
+    tracker.step('categories', df)
+    return df.reset_index(drop=True)
+
+
+def run_pipeline(input_filename, filter_date=None, data_folder=DATA_FOLDER,
+                 file_format='xlsx', resolve_artists=False, trace_memory=False,
+                 fused=False, backend='pandas'):
+    """
+    Processes, filters and encodes a raw data file like data_processing.sh.
+
+    The stages share one interpreter, so pandas and sklearn are imported
+    once, and each stage gets the previous frame in memory instead of
+    reading back the intermediate file. The intermediate files are still
+    written with the same names. With resolve_artists, artists are mapped
+    with the persisted canonical artist mapping, which is then updated.
+    The rows, time and memory of every filter step of the processing and
+    filtering are reported next to their outputs (*.filters.json).
+    With fused, processing and filtering run as one plan (see
+    process_and_filter) and the interim file is not written.
+    backend runs the filters and transforms on pandas or Polars.
+    """
+    files = pipeline_files(input_filename, data_folder, file_format)
+    resolver = artist_resolution.ArtistResolver.load() \
+        if resolve_artists else None
+
+    if fused:
+        print("Processing and filtering data...")
+        with stage_metrics.track_stage('process_filter_data') as stage:
+            df = dataset_io.read_dataset(files['raw'])
+            stage['rows_in'] = len(df)
+            tracker = stage_metrics.FilterTracker(len(df), trace_memory)
+            df = process_and_filter(df, filter_date, resolver, tracker,
+                                    backend)
+            stage['rows_out'] = len(df)
+            dataset_io.write_dataset(df, files['filtered'])
+            tracker.write_report(files['filtered'], 'process_filter_data')
+        if resolver is not None:
+            resolver.save()
+    else:
+        print("Processing data...")
+        with stage_metrics.track_stage('process_data') as stage:
+            df = dataset_io.read_dataset(files['raw'])
+            stage['rows_in'] = len(df)
+            tracker = stage_metrics.FilterTracker(len(df), trace_memory)
+            df = process_data.clean_data(
+                df, quarantine_stage='process_data',
+                artist_resolver=resolver, tracker=tracker,
+                backend=backend).reset_index(drop=True)
+            stage['rows_out'] = len(df)
+            dataset_io.write_dataset(df, files['interim'])
+            tracker.write_report(files['interim'], 'process_data')
+        if resolver is not None:
+            resolver.save()
+
+        print("Filtering data...")
+        with stage_metrics.track_stage('filter_data') as stage:
+            stage['rows_in'] = len(df)
+            tracker = stage_metrics.FilterTracker(len(df), trace_memory)
+            df = filter_data.filter_outliers(df, tracker, backend)
+            if filter_date:
+                print(f"Filtering data by date: {filter_date}...")
+                df = filter_by_date.filter_frame_by_date(df, filter_date)
+                tracker.step('auction_date', df)
+            df = df.reset_index(drop=True)
+            stage['rows_out'] = len(df)
+            dataset_io.write_dataset(df, files['filtered'])
+            tracker.write_report(files['filtered'], 'filter_data')
+
+    print("Encoding data...")
+    with stage_metrics.track_stage('encode_data_const') as stage:
+        stage['rows_in'] = len(df)
+        artists = column_types.artist_categories(df)
+        df = encode_data_const.encode_frame(df, artists)
+        stage['rows_out'] = len(df)
+        dataset_io.write_dataset(df, files['encoded'])
+        encode_data_const.save_artists(artists, files['encoded'])
+
+    print("Data processing completed successfully.")
+    return files['encoded']
+
+
+def main():
+    """Function accepting arguments"""
+    parser = argparse.ArgumentParser(
+        description='Process, filter and encode auction data.')
+    parser.add_argument('input_filename', type=str,
+                        help='Name of the Excel file in data/raw.')
+    parser.add_argument('filter_date', type=str, nargs='?', default=None,
+                        help='Optional cutoff date in YYYY-MM-DD format.')
+    parser.add_argument('--format', type=str, default='xlsx',
+                        choices=['xlsx', 'csv', 'parquet'],
+                        help='Format of the output files.')
+    parser.add_argument('--resolve-artists', action='store_true',
+                        help='Map artists to canonical artists with the '
+                             'persisted artist mapping.')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='Account the memory of the filter steps with '
+                             'tracemalloc instead of the resident memory.')
+    parser.add_argument('--fused', action='store_true',
+                        help='Process and filter in one plan, without '
+                             'writing the interim file.')
+    parser.add_argument('--backend', type=str, default='pandas',
+                        choices=filter_plan.BACKENDS,
+                        help='Run the filters and transforms on pandas or '
+                             'on Polars (needs polars).')
+
+    args = parser.parse_args()
+
+    run_pipeline(args.input_filename, args.filter_date,
+                 file_format=args.format,
+                 resolve_artists=args.resolve_artists,
+                 trace_memory=args.trace_memory, fused=args.fused,
+                 backend=args.backend)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+"""Declarative schemas of the raw and cleaned auction data."""
+import os
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+# pylint: disable=E0401
+import columns_structure
+
+QUARANTINE_FOLDER = Path(os.getenv(
+    'PIPELINE_QUARANTINE_FOLDER',
+    Path(__file__).resolve().parents[2] / 'data' / 'quarantine'))
+
+REASON_COLUMN = 'REJECT REASON'
+
+# Column -> rules. 'kind' is text, numeric or datetime; 'required' rows
+# must have a value; 'min'/'max' bound numeric values; 'allowed' lists the
+# accepted values. Values are parsed the way the cleaning stage parses them.
+RAW_SCHEMA = {
+    'ARTIST': {'kind': 'text', 'required': True},
+    'OBJECT': {'kind': 'text'},
+    'PERIOD': {'kind': 'text'},
+    'TECHNIQUE': {'kind': 'text'},
+    'DESCRIPTION': {'kind': 'text'},
+    'SIGNATURE': {'kind': 'text'},
+    'CONDITION': {'kind': 'text'},
+    'TOTAL DIMENSIONS': {'kind': 'text'},
+    'PRICE': {'kind': 'numeric', 'required': True, 'min': 0},
+    'YEAR': {'kind': 'text'},
+    'AUCTION DATE': {'kind': 'datetime', 'required': True},
+    'URL': {'kind': 'text'},
+    'ImageName': {'kind': 'text'},
+}
+
+CLEAN_SCHEMA = {
+    'ARTIST': {'kind': 'text', 'required': True},
+    'TECHNIQUE': {'kind': 'text', 'required': True,
+                  'allowed': columns_structure.techniques_order},
+    'SIGNATURE': {'kind': 'text', 'required': True,
+                  'allowed': columns_structure.signature_order},
+    'CONDITION': {'kind': 'text', 'required': True,
+                  'allowed': columns_structure.condition_order},
+    'TOTAL DIMENSIONS': {'kind': 'numeric', 'required': True, 'min': 0},
+    'PRICE': {'kind': 'numeric', 'required': True, 'min': 0},
+    'YEAR': {'kind': 'numeric', 'required': True, 'min': 1400, 'max': 2100},
+    'AUCTION DATE': {'kind': 'datetime', 'required': True},
+}
+
+
+def without_target(schema):
+    """
+    Returns a schema for data to be scored. The PRICE column keeps its
+    place in the raw layout, but its values may be empty.
+    """
+    return {column: {**rules, 'required': False} if column == 'PRICE'
+            else rules for column, rules in schema.items()}
+
+
+SCORING_RAW_SCHEMA = without_target(RAW_SCHEMA)
+SCORING_CLEAN_SCHEMA = without_target(CLEAN_SCHEMA)
+
+
+class SchemaError(ValueError):
+    """The data does not have the columns of the schema."""
+
+
+def normalize_columns(df):
+    """
+    Strips the column names, some exports name OBJECT ' OBJECT'.
+    Columns whose names are the same once stripped (e.g. a store with
+    both ' OBJECT' and 'OBJECT') are merged into one column when no row
+    has a value in more than one of them, otherwise SchemaError is raised.
+    """
+    columns = df.columns.astype(str).str.strip()
+    if (columns == df.columns).all():
+        return df
+    if not columns.has_duplicates:
+        return df.set_axis(columns, axis=1)
+    merged = {}
+    for column in columns.unique():
+        positions = np.flatnonzero(columns == column)
+        values = df.iloc[:, positions[0]]
+        for position in positions[1:]:
+            other = df.iloc[:, position]
+            if (values.notna() & other.notna()).any():
+                raise SchemaError(
+                    f"Columns {df.columns[positions].tolist()} are all "
+                    f"named '{column}' and have values in the same rows.")
+            values = values.where(values.notna(), other)
+        merged[column] = values
+    return pd.DataFrame(merged, index=df.index)
+
+
+def parse_column(series, kind):
+    """
+    Parses a column with one vectorized conversion.
+    Returns the parsed values (missing for empty cells) and a mask of the
+    values that are present but could not be parsed.
+    """
+    if pd.api.types.is_numeric_dtype(series) or \
+            pd.api.types.is_datetime64_any_dtype(series):
+        present, text = series.notna(), None
+    else:
+        text = series.astype(str).str.strip()
+        present = series.notna() & ~text.isin(['', 'nan', 'None', 'NaT'])
+
+    if kind == 'numeric':
+        values = series if text is None else pd.to_numeric(
+            text.str.replace(',', '', regex=False).where(present),
+            errors='coerce')
+    elif kind == 'datetime':
+        values = pd.to_datetime(series.where(present), errors='coerce')
+    else:
+        values = series.where(present) if text is None else text.where(present)
+    return values, present & values.isna()
+
+
+def check_rows(df, schema):
+    """
+    Checks the data against a schema in one vectorized pass per column.
+    Raises SchemaError when a column of the schema is missing.
+
+    Returns:
+    tuple: The broken rules of every row ('' for valid rows) and the
+    parsed numeric and datetime columns.
+    """
+    missing = [column for column in schema if column not in df.columns]
+    if missing:
+        raise SchemaError(f"Missing columns: {', '.join(missing)}")
+
+    reasons = pd.Series('', index=df.index, dtype=object)
+    parsed = {}
+    for column, rules in schema.items():
+        if rules.get('kind', 'text') == 'text' and set(rules) <= {'kind'}:
+            # Any value is accepted, only the column has to be present
+            continue
+        series = df[column]
+        values, unparsed = parse_column(series, rules.get('kind', 'text'))
+        if rules.get('kind', 'text') != 'text' and values is not series:
+            parsed[column] = values
+        checks = [(unparsed, f"{column}: not {rules.get('kind', 'text')}")]
+        if rules.get('required'):
+            checks.append((values.isna() & ~unparsed, f'{column}: missing'))
+        if 'min' in rules:
+            checks.append((values < rules['min'],
+                           f"{column}: below {rules['min']}"))
+        if 'max' in rules:
+            checks.append((values > rules['max'],
+                           f"{column}: above {rules['max']}"))
+        if 'allowed' in rules:
+            checks.append((values.notna() & ~values.isin(rules['allowed']),
+                           f'{column}: not an allowed value'))
+        for mask, reason in checks:
+            mask = np.asarray(mask, dtype=bool)
+            if mask.any():
+                reasons[mask] = reasons[mask] + reason + '; '
+    return reasons, parsed
+
+
+def rejected_rows(df, reasons):
+    """Returns the rows with broken rules, with the rules in REASON_COLUMN."""
+    rejected = (reasons != '').to_numpy()
+    if not rejected.any():
+        return df.iloc[:0].assign(**{REASON_COLUMN: ''})
+    return df[rejected].assign(
+        **{REASON_COLUMN: reasons[rejected].str.rstrip('; ')})
+
+
+def parse_columns(df, schema):
+    """Returns the numeric and datetime columns of the schema, parsed."""
+    parsed = {}
+    for column, rules in schema.items():
+        if rules.get('kind', 'text') != 'text' and column in df.columns:
+            series = df[column]
+            values, _ = parse_column(series, rules['kind'])
+            if values is not series:
+                parsed[column] = values
+    return parsed
+
+
+def validate(df, schema, parse=True):
+    """
+    Checks the data against a schema in one vectorized pass per column.
+
+    Raises SchemaError when a column of the schema is missing. Rows that
+    break a rule are split off with the broken rules in REASON_COLUMN.
+    Numeric and datetime columns of the valid rows are returned parsed,
+    unless parse is False.
+
+    Parameters:
+    df (DataFrame): Data to check.
+    schema (dict): RAW_SCHEMA, CLEAN_SCHEMA or a schema of the same form.
+
+    Returns:
+    tuple: The valid rows and the rejected rows.
+    """
+    df = normalize_columns(df)
+    reasons, parsed = check_rows(df, schema)
+    rejected = (reasons != '').to_numpy()
+    valid_df = df.assign(**parsed) if parse and parsed else df
+    return valid_df[~rejected] if rejected.any() else valid_df, \
+        rejected_rows(df, reasons)
+
+
+def quarantine(rejected, stage, folder=QUARANTINE_FOLDER, replace=False):
+    """
+    Appends rejected rows to the quarantine file of a stage. With replace
+    they become its only rows: a full rebuild rejects the rows of the
+    whole store again, so its file keeps the rejects of the last run.
+    Returns the path of the file, or None when no rows were rejected.
+    """
+    folder = Path(folder)
+    quarantine_file = folder / f'{stage}.csv'
+    if rejected.empty:
+        if replace:
+            quarantine_file.unlink(missing_ok=True)
+        return None
+    folder.mkdir(parents=True, exist_ok=True)
+    rejected.assign(**{'REJECTED AT': time.strftime('%Y-%m-%d %H:%M:%S')}) \
+        .to_csv(quarantine_file, mode='w' if replace else 'a', index=False,
+                header=replace or not quarantine_file.exists())
+    print(f"{len(rejected)} rows quarantined in {quarantine_file}")
+    return quarantine_file
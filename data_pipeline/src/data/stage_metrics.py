@@ -0,0 +1,303 @@
+"""Wall time, row-count, throughput and memory metrics of the pipeline stages."""
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+METRICS_FILE = Path(os.getenv(
+    'PIPELINE_METRICS_FILE',
+    Path(__file__).resolve().parents[2] / 'data' / 'metrics' /
+    'stage_metrics.jsonl'))
+
+# Values of the last run of each stage exposed as Prometheus gauges
+GAUGES = [
+    ('seconds', 'pipeline_stage_last_duration_seconds',
+     'Wall time of the last run of the stage.'),
+    ('rows_in', 'pipeline_stage_last_rows_in',
+     'Rows read by the last run of the stage.'),
+    ('rows_out', 'pipeline_stage_last_rows_out',
+     'Rows written by the last run of the stage.'),
+    ('rows_per_second', 'pipeline_stage_last_rows_per_second',
+     'Input rows processed per second by the last run of the stage.'),
+    ('rss_delta_bytes', 'pipeline_stage_last_rss_delta_bytes',
+     'Change of the resident memory of the process over the last stage run.'),
+    # ru_maxrss never goes down, a long-lived worker reports the peak of
+    # all the jobs it ran so far
+    ('peak_rss_bytes', 'pipeline_stage_last_process_peak_rss_bytes',
+     'Peak resident memory of the process running the last stage run, '
+     'over the whole life of the process.'),
+]
+
+
+def peak_rss_bytes():
+    """Returns the peak resident set size of the current process in bytes."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def current_rss_bytes():
+    """Returns the resident memory of the current process in bytes, or None."""
+    try:
+        with open('/proc/self/statm', 'r', encoding='utf8') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class FilterTracker:
+    """
+    Accounts the rows, wall time and memory of the named steps of a stage.
+
+    The stage calls step(name, df) after each filter or transform, and
+    the step is charged with everything since the previous call: the rows
+    removed, the elapsed time and the change of the resident memory, or
+    with trace_memory the change and peak of the memory allocated by
+    Python and NumPy (tracemalloc, slower but not blurred by the
+    allocator keeping freed pages).
+
+    Example:
+    tracker = FilterTracker(len(df))
+    df = df[df['PRICE'] <= 10000]
+    tracker.step('price_range', df)
+    tracker.write_report(output_file, 'filter_data')
+    """
+
+    def __init__(self, rows=None, trace_memory=False):
+        self.steps = []
+        self.trace_memory = trace_memory
+        self._started_tracing = trace_memory and not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start()
+        self.begin(rows)
+
+    def _memory(self):
+        if self.trace_memory:
+            return tracemalloc.get_traced_memory()[0]
+        return current_rss_bytes()
+
+    def begin(self, rows):
+        """Starts the accounting of the next steps from rows input rows."""
+        self._rows = rows
+        self._memory_before = self._memory()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        self._start = time.perf_counter()
+
+    def step(self, name, df):
+        """Records the step that just produced df, or its row count."""
+        seconds = time.perf_counter() - self._start
+        memory = self._memory()
+        rows = df if isinstance(df, int) else len(df)
+        record = {
+            'step': name, 'rows_in': self._rows, 'rows_out': rows,
+            'rows_removed': (self._rows - rows
+                             if self._rows is not None else None),
+            'seconds': round(seconds, 6),
+            'memory_delta_bytes': (memory - self._memory_before
+                                   if memory is not None
+                                   and self._memory_before is not None
+                                   else None),
+        }
+        if self.trace_memory:
+            record['memory_peak_bytes'] = (
+                tracemalloc.get_traced_memory()[1] - self._memory_before)
+        self.steps.append(record)
+        self.begin(rows)
+
+    def report(self, stage):
+        """Returns the report of the stage with its steps and totals."""
+        rows_in = self.steps[0]['rows_in'] if self.steps else None
+        rows_out = self.steps[-1]['rows_out'] if self.steps else None
+        return {
+            'stage': stage,
+            'memory': 'tracemalloc' if self.trace_memory else 'rss',
+            'rows_in': rows_in,
+            'rows_out': rows_out,
+            'seconds': round(sum(step['seconds'] for step in self.steps), 6),
+            'steps': self.steps,
+        }
+
+    def write_report(self, output_file, stage):
+        """
+        Writes the report next to the output file of the stage, as
+        <output name>.filters.json, and returns its path. Memory tracing
+        started by the tracker ends here.
+        """
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        output_file = Path(output_file)
+        report_file = output_file.with_name(
+            f'{output_file.stem}.filters.json')
+        report_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(report_file, 'w', encoding='utf8') as f:
+            json.dump(self.report(stage), f, indent=1)
+        print(f"Filter report of {stage} saved to {report_file}")
+        return report_file
+
+
+def record_stage(record, metrics_file=METRICS_FILE):
+    """Appends a single stage record to the metrics file."""
+    metrics_file = Path(metrics_file)
+    metrics_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(metrics_file, 'a', encoding='utf8') as f:
+        f.write(json.dumps(record) + '\n')
+
+
+@contextmanager
+def track_stage(stage, rows_in=None):
+    """
+    Measures a pipeline stage or training phase.
+
+    Yields a dict in which the stage sets 'rows_in' and 'rows_out'
+    once they are known. Wall time, rows per second, the change of the
+    resident memory over the stage and the peak RSS of the process so far
+    are added and the record is stored when the stage finishes, also when
+    it fails.
+
+    Example:
+    with track_stage('filter_data') as stage:
+        df = pd.read_excel(input_file)
+        stage['rows_in'] = len(df)
+        ...
+        stage['rows_out'] = len(df)
+    """
+    record = {'stage': stage, 'rows_in': rows_in, 'rows_out': None,
+              'status': 'error'}
+    rss_before = current_rss_bytes()
+    start = time.perf_counter()
+    try:
+        yield record
+        record['status'] = 'ok'
+    finally:
+        seconds = time.perf_counter() - start
+        record['seconds'] = seconds
+        record['rows_per_second'] = (
+            record['rows_in'] / seconds
+            if record['rows_in'] is not None and seconds > 0 else None)
+        rss_after = current_rss_bytes()
+        record['rss_delta_bytes'] = (
+            rss_after - rss_before
+            if rss_after is not None and rss_before is not None else None)
+        record['peak_rss_bytes'] = peak_rss_bytes()
+        record['timestamp'] = time.time()
+        try:
+            record_stage(record)
+        except OSError as e:
+            print(f'Failed to record metrics of {stage}: {e}')
+
+
+def load_stage_metrics(metrics_file=METRICS_FILE):
+    """Loads all stored stage records, skipping lines that are not valid."""
+    metrics_file = Path(metrics_file)
+    if not metrics_file.exists():
+        return []
+    records = []
+    with open(metrics_file, 'r', encoding='utf8') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+
+class StageMetricsAggregate:
+    """
+    Running aggregates of the stage records of a metrics file: the runs
+    and the total wall time of every stage, and its last record.
+
+    update() parses only the lines appended since the previous call, so
+    the cost of a scrape follows the new records, not the history. A
+    file that was replaced or truncated (e.g. rotated) is read again from
+    its start, which resets the counters as Prometheus expects.
+    """
+
+    def __init__(self, metrics_file=METRICS_FILE):
+        self.metrics_file = Path(metrics_file)
+        self.reset()
+
+    def reset(self, file_id=None):
+        """Drops the aggregates, the next update reads from file_id's start."""
+        self._file_id = file_id
+        self._offset = 0
+        self.runs, self.seconds_total, self.last = {}, {}, {}
+
+    def add(self, record):
+        """Adds a stage record to the aggregates."""
+        key = (record['stage'], record.get('status', 'ok'))
+        self.runs[key] = self.runs.get(key, 0) + 1
+        self.seconds_total[record['stage']] = (
+            self.seconds_total.get(record['stage'], 0.0) + record['seconds'])
+        self.last[record['stage']] = record
+
+    def update(self):
+        """Adds the records appended to the metrics file, returns self."""
+        try:
+            stat = self.metrics_file.stat()
+        except FileNotFoundError:
+            self.reset()
+            return self
+        file_id = (stat.st_dev, stat.st_ino)
+        if file_id != self._file_id or stat.st_size < self._offset:
+            self.reset(file_id)
+        with open(self.metrics_file, 'rb') as f:
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # A record still being written, read on the next update
+                    break
+                self._offset += len(line)
+                try:
+                    self.add(json.loads(line))
+                except (ValueError, KeyError, TypeError):
+                    continue
+        return self
+
+
+def escape_label(value):
+    """Escapes a Prometheus label value."""
+    return str(value).replace('\\', r'\\').replace(
+        '"', r'\"').replace('\n', r'\n')
+
+
+def to_prometheus(aggregate):
+    """
+    Renders the aggregates of the stage records (StageMetricsAggregate)
+    in the Prometheus text format.
+    """
+    runs, seconds_total, last = \
+        aggregate.runs, aggregate.seconds_total, aggregate.last
+
+    lines = ['# HELP pipeline_stage_runs_total Finished runs of the stage.',
+             '# TYPE pipeline_stage_runs_total counter']
+    for (stage, status), count in sorted(runs.items()):
+        lines.append(f'pipeline_stage_runs_total{{stage="{escape_label(stage)}",'
+                     f'status="{escape_label(status)}"}} {count}')
+
+    lines += ['# HELP pipeline_stage_duration_seconds_total '
+              'Wall time spent in the stage over all runs.',
+              '# TYPE pipeline_stage_duration_seconds_total counter']
+    for stage, total in sorted(seconds_total.items()):
+        lines.append(f'pipeline_stage_duration_seconds_total'
+                     f'{{stage="{escape_label(stage)}"}} {total}')
+
+    for field, name, description in GAUGES:
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} gauge']
+        for stage, record in sorted(last.items()):
+            if record.get(field) is not None:
+                lines.append(
+                    f'{name}{{stage="{escape_label(stage)}"}} {record[field]}')
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,147 @@
+"""Chunked ingestion of NDJSON, CSV and Arrow IPC streams into the raw store."""
+import argparse
+import json
+import tempfile
+from pathlib import Path
+import pandas as pd
+# pylint: disable=E0401
+import ingest_data
+import schema
+
+# Rows parsed into one DataFrame
+CHUNK_ROWS = 10000
+
+
+def iter_ndjson_chunks(stream, chunk_rows=CHUNK_ROWS):
+    """Yields DataFrames of chunk_rows JSON objects, one object per line."""
+    records = []
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        records.append(json.loads(line))
+        if len(records) >= chunk_rows:
+            yield pd.DataFrame.from_records(records)
+            records = []
+    if records:
+        yield pd.DataFrame.from_records(records)
+
+
+def iter_csv_chunks(stream, chunk_rows=CHUNK_ROWS):
+    """Yields DataFrames of chunk_rows CSV rows, the first line is the header."""
+    with pd.read_csv(stream, chunksize=chunk_rows) as reader:
+        yield from reader
+
+
+def iter_arrow_chunks(stream, chunk_rows=CHUNK_ROWS):
+    """Yields DataFrames of the record batches of an Arrow IPC stream."""
+    import pyarrow as pa
+
+    batches, rows = [], 0
+    with pa.ipc.open_stream(stream) as reader:
+        for batch in reader:
+            batches.append(batch)
+            rows += batch.num_rows
+            if rows >= chunk_rows:
+                yield pa.Table.from_batches(batches).to_pandas()
+                batches, rows = [], 0
+    if batches:
+        yield pa.Table.from_batches(batches).to_pandas()
+
+
+# Content type -> chunk reader
+STREAM_READERS = {
+    'application/x-ndjson': iter_ndjson_chunks,
+    'application/jsonl': iter_ndjson_chunks,
+    'text/csv': iter_csv_chunks,
+    'application/vnd.apache.arrow.stream': iter_arrow_chunks,
+}
+
+# File extension -> content type, for the command line
+EXTENSION_TYPES = {
+    '.ndjson': 'application/x-ndjson',
+    '.jsonl': 'application/x-ndjson',
+    '.csv': 'text/csv',
+    '.arrows': 'application/vnd.apache.arrow.stream',
+    '.arrow': 'application/vnd.apache.arrow.stream',
+}
+
+
+def ingest_stream(stream, content_type, store_file, chunk_rows=CHUNK_ROWS):
+    """
+    Parses a bulk upload chunk by chunk and merges it into the raw store.
+
+    The stream is read incrementally, so the raw payload is never held in
+    memory as a whole. Every chunk is checked against the raw schema as
+    it is parsed, and its valid and rejected rows are staged in a
+    temporary folder. Only once the whole stream is parsed and checked
+    are the rejected rows quarantined and the valid rows merged into the
+    store, read back one chunk at a time, in a single rewrite of the
+    store. A stream with missing columns
+    or mostly invalid rows raises SchemaError and leaves the store as it
+    was.
+
+    Parameters:
+    stream: Binary file-like object, e.g. the body of a request.
+    content_type (str): One of the STREAM_READERS content types.
+    store_file (str): Path to the raw store ordered by AUCTION DATE.
+
+    Returns:
+    int: Number of rows stored, without invalid and duplicate rows.
+    """
+    if content_type not in STREAM_READERS:
+        raise ValueError(f'Unsupported content type: {content_type}')
+
+    with tempfile.TemporaryDirectory() as staging_dir:
+        staged = {'valid': [], 'rejected': []}
+        valid_rows, rejected_rows, reason = 0, 0, ''
+        chunks = STREAM_READERS[content_type](stream, chunk_rows)
+        for number, chunk in enumerate(chunks):
+            valid_df, rejected = schema.validate(
+                chunk, schema.RAW_SCHEMA, parse=False)
+            valid_rows += len(valid_df)
+            rejected_rows += len(rejected)
+            if not rejected.empty and not reason:
+                reason = rejected[schema.REASON_COLUMN].iloc[0]
+            for kind, df in (('valid', valid_df), ('rejected', rejected)):
+                if not df.empty:
+                    # Pickles keep the parsed values and dtypes of a chunk
+                    staged_file = Path(staging_dir) / f'{kind}_{number}.pkl'
+                    df.to_pickle(staged_file)
+                    staged[kind].append(staged_file)
+
+        ingest_data.check_rejected(valid_rows, rejected_rows, reason)
+        for staged_file in staged['rejected']:
+            schema.quarantine(pd.read_pickle(staged_file), 'ingest_data')
+        if not staged['valid']:
+            return 0
+        return ingest_data.merge_batches(
+            (pd.read_pickle(staged_file) for staged_file in staged['valid']),
+            store_file)
+
+
+def main():
+    """Function accepting arguments"""
+    parser = argparse.ArgumentParser(
+        description='Merge an NDJSON, CSV or Arrow IPC file into the raw store.')
+    parser.add_argument('input_file', type=str,
+                        help='Path to the .ndjson, .csv or .arrows file.')
+    parser.add_argument('store_file', type=str,
+                        help='Path to the ordered raw store.')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS,
+                        help='Rows parsed at once.')
+
+    args = parser.parse_args()
+
+    extension = '.' + args.input_file.rsplit('.', 1)[-1].lower()
+    if extension not in EXTENSION_TYPES:
+        raise ValueError(
+            "Unsupported file format. Please use NDJSON, CSV or Arrow files.")
+    with open(args.input_file, 'rb') as stream:
+        rows = ingest_stream(stream, EXTENSION_TYPES[extension],
+                             args.store_file, args.chunk_rows)
+    print(f"{rows} rows merged into {args.store_file}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+"""Colour and texture descriptors of the auction images, cached by content."""
+import argparse
+import hashlib
+import io
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'data'))
+# pylint: disable=E0401,C0413
+import dataset_io
+import stage_metrics
+
+CACHE_FOLDER = Path(os.getenv(
+    'PIPELINE_IMAGE_CACHE_FOLDER',
+    Path(__file__).resolve().parents[2] / 'data' / 'image_features'))
+
+# Bump when the descriptor changes, cached vectors of other versions are ignored
+DESCRIPTOR_VERSION = 1
+# Images are reduced to this size before the descriptors are computed
+THUMBNAIL_SIZE = (128, 128)
+# Hue, saturation and value bins of the colour histogram
+HSV_BINS = (8, 3, 3)
+ORIENTATION_BINS = 8
+MAGNITUDE_BINS = 8
+# Images sent to a worker at once
+BATCH_SIZE = 64
+
+# Hashes of the cached images, set in every worker by its initializer
+_cached_hashes = frozenset()
+
+
+def image_descriptor(image):
+    """
+    Returns the fixed-length descriptor of a PIL image: a joint HSV colour
+    histogram, gradient orientation and magnitude histograms, the mean
+    and standard deviation of the RGB channels and the aspect ratio.
+    """
+    aspect_ratio = image.width / max(image.height, 1)
+    rgb = image.convert('RGB')
+    rgb.thumbnail(THUMBNAIL_SIZE)
+
+    hsv = np.asarray(rgb.convert('HSV'), dtype=np.float32) / 256
+    bins = np.array(HSV_BINS)
+    cells = np.minimum((hsv * bins).astype(np.int64), bins - 1)
+    colour = np.bincount(
+        np.ravel_multi_index(cells.reshape(-1, 3).T, HSV_BINS),
+        minlength=np.prod(HSV_BINS)).astype(np.float32)
+    colour /= max(colour.sum(), 1)
+
+    pixels = np.asarray(rgb, dtype=np.float32) / 255
+    gray = pixels @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    gy, gx = np.gradient(gray)
+    magnitude = np.hypot(gx, gy)
+    orientation, _ = np.histogram(
+        np.arctan2(gy, gx) % np.pi, bins=ORIENTATION_BINS, range=(0, np.pi),
+        weights=magnitude)
+    orientation = orientation / max(orientation.sum(), 1e-12)
+    strength, _ = np.histogram(magnitude, bins=MAGNITUDE_BINS,
+                               range=(0, 1))
+    strength = strength / max(strength.sum(), 1)
+
+    return np.concatenate([
+        colour, orientation, strength,
+        pixels.reshape(-1, 3).mean(axis=0), pixels.reshape(-1, 3).std(axis=0),
+        [aspect_ratio]]).astype(np.float32)
+
+
+def descriptor_length():
+    """Returns the number of values of a descriptor."""
+    return int(np.prod(HSV_BINS)) + ORIENTATION_BINS + MAGNITUDE_BINS + 7
+
+
+def init_worker(cached_hashes):
+    """Receives the hashes of the cached images once per worker."""
+    global _cached_hashes  # pylint: disable=W0603
+    _cached_hashes = cached_hashes
+
+
+def describe_batch(image_paths):
+    """
+    Reads a batch of images and returns (content hash, descriptor) per
+    image. Images already cached get no descriptor, missing or unreadable
+    ones no hash.
+    """
+    from PIL import Image
+
+    results = []
+    for image_path in image_paths:
+        try:
+            with open(image_path, 'rb') as f:
+                content = f.read()
+        except OSError:
+            results.append((None, None))
+            continue
+        content_hash = hashlib.sha256(content).hexdigest()
+        if content_hash in _cached_hashes:
+            results.append((content_hash, None))
+            continue
+        try:
+            with Image.open(io.BytesIO(content)) as image:
+                # JPEG images are decoded at a reduced scale directly
+                image.draft('RGB', (THUMBNAIL_SIZE[0] * 2,
+                                    THUMBNAIL_SIZE[1] * 2))
+                results.append((content_hash, image_descriptor(image)))
+        except (OSError, ValueError):
+            results.append((None, None))
+    return results
+
+
+def cache_folder(folder=CACHE_FOLDER):
+    """Returns the cache folder of the current descriptor version."""
+    return Path(folder) / f'v{DESCRIPTOR_VERSION}'
+
+
+def load_cache(folder=CACHE_FOLDER):
+    """Returns the cached descriptors by content hash, from all cache shards."""
+    cache = {}
+    for shard in sorted(cache_folder(folder).glob('*.npz')):
+        with np.load(shard) as saved:
+            cache.update(zip(saved['hashes'].tolist(), saved['vectors']))
+    return cache
+
+
+def save_cache_shard(new_vectors, folder=CACHE_FOLDER):
+    """
+    Appends the new descriptors to the cache as a new shard, written to a
+    temporary file first, so an interrupted run never leaves a partial shard.
+    """
+    if not new_vectors:
+        return None
+    folder = cache_folder(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    shard = folder / f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}.npz"
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix='.shard-')
+    with os.fdopen(fd, 'wb') as f:
+        np.savez(f, hashes=np.array(list(new_vectors)),
+                 vectors=np.stack(list(new_vectors.values())))
+    os.replace(tmp_path, shard)
+    return shard
+
+
+def image_names(dataset_files):
+    """Returns the distinct ImageName values of the datasets, in order."""
+    names = pd.concat([dataset_io.read_dataset(file_path)['ImageName']
+                       for file_path in dataset_files])
+    return names.dropna().astype(str).drop_duplicates().tolist()
+
+
+def extract_image_features(image_folder, dataset_files, output_file,
+                           workers=None, batch_size=BATCH_SIZE,
+                           folder=CACHE_FOLDER):
+    """
+    Writes the descriptors of the images referenced by the datasets.
+
+    Images are read and described in batches on a pool of processes.
+    Every descriptor is cached by the hash of the image content, so a
+    re-run decodes only new or changed images. The output is a CSV file
+    without header, the ImageName followed by the descriptor values, as
+    read by create_feature_price_datasets.py.
+
+    Returns:
+    DataFrame: The written features.
+    """
+    names = image_names(dataset_files)
+    cache = load_cache(folder)
+    paths = [str(Path(image_folder) / name) for name in names]
+    batches = [paths[start:start + batch_size]
+               for start in range(0, len(paths), batch_size)]
+
+    with stage_metrics.track_stage('extract_image_features') as stage:
+        stage['rows_in'] = len(names)
+        hashes, new_vectors = [], {}
+        with ProcessPoolExecutor(workers, initializer=init_worker,
+                                 initargs=(frozenset(cache),)) as executor:
+            for results in executor.map(describe_batch, batches):
+                for content_hash, vector in results:
+                    hashes.append(content_hash)
+                    if vector is not None:
+                        new_vectors[content_hash] = vector
+        save_cache_shard(new_vectors, folder)
+        cache.update(new_vectors)
+
+        found = [(name, content_hash) for name, content_hash
+                 in zip(names, hashes) if content_hash is not None]
+        features = pd.DataFrame(
+            np.stack([cache[content_hash] for _, content_hash in found])
+            if found else np.empty((0, descriptor_length()), np.float32))
+        features.insert(0, 'ImageName', [name for name, _ in found])
+        features.to_csv(output_file, header=False, index=False)
+        stage['rows_out'] = len(features)
+
+    print(f"{len(found)} of {len(names)} images described, "
+          f"{len(new_vectors)} new. Features saved to {output_file}")
+    return features
+
+
+def main():
+    """Function accepting arguments"""
+    parser = argparse.ArgumentParser(
+        description='Compute the image features file keyed by ImageName.')
+    parser.add_argument('image_folder', type=str,
+                        help='Folder of the images named by ImageName.')
+    parser.add_argument('output_file', type=str,
+                        help='Path to the features CSV file.')
+    parser.add_argument('dataset_files', type=str, nargs='+',
+                        help='Excel, CSV or Parquet files with ImageName.')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes, all cores by default.')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help='Images sent to a worker at once.')
+
+    args = parser.parse_args()
+
+    extract_image_features(args.image_folder, args.dataset_files,
+                           args.output_file, args.workers, args.batch_size)
+
+
+if __name__ == '__main__':
+    main()
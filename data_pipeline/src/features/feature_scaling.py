@@ -1,20 +1,72 @@
 import argparse
+import hashlib
+import sys
 from pathlib import Path
 import pandas as pd
-from sklearn.preprocessing import StandardScaler
-from joblib import dump, load
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'data'))
+# pylint: disable=E0401,C0413
+import dataset_io
 
 
 def save_scaler(scaler, scaler_file_name):
     """Saves the scaler object in the 'references' folder."""
+    from joblib import dump
+
     scaler_path = Path('references') / scaler_file_name
     # Create the directory if it doesn't exist
     scaler_path.parent.mkdir(exist_ok=True)
     dump(scaler, scaler_path)
 
 
-def load_or_fit_scaler(train_df, columns, scaler_file_name):
-    """Loads the scaler if exists in 'references', otherwise fits a new scaler."""
+def chunks_fingerprint(chunks, columns):
+    """
+    Returns a hash of the scaled columns of the training data, given as
+    DataFrames in row order, and of the column names. The values are
+    hashed as float64 row by row, so the fingerprint depends neither on
+    how the data was read and split into chunks nor on the file bytes.
+    """
+    digest = hashlib.sha256('\x1f'.join(columns).encode())
+    for chunk in chunks:
+        values = chunk[columns].astype('float64')
+        digest.update(pd.util.hash_pandas_object(
+            values, index=False).to_numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+
+def data_fingerprint(df, columns):
+    """Returns the fingerprint of the scaled columns of the training data."""
+    return chunks_fingerprint([df], columns)
+
+
+def file_fingerprint(file_path, columns, chunk_rows=10000):
+    """
+    Returns the fingerprint of a training file, the same as data_fingerprint
+    of its data. The file is read in chunks, so it does not have to fit in
+    memory.
+    """
+    return chunks_fingerprint(
+        dataset_io.iter_dataset_chunks(file_path, chunk_rows), columns)
+
+
+def fingerprinted_name(scaler_file_name, fingerprint):
+    """Adds the fingerprint to the scaler file name."""
+    path = Path(scaler_file_name)
+    return f'{path.stem}_{fingerprint}{path.suffix}'
+
+
+def load_or_fit_scaler(train_df, columns, scaler_file_name, fingerprint=None):
+    """
+    Loads the scaler fitted on the same data from 'references', otherwise
+    fits a new scaler. The cached scalers are keyed on a fingerprint of the
+    training data and the columns, so changed data gets a new scaler.
+    """
+    from joblib import load
+    from sklearn.preprocessing import StandardScaler
+
+    if fingerprint is None:
+        fingerprint = data_fingerprint(train_df, columns)
+    scaler_file_name = fingerprinted_name(scaler_file_name, fingerprint)
     scaler_path = Path('references') / scaler_file_name
     if scaler_path.exists():
         print(f'Loading existing scaler from {scaler_path}')
@@ -27,32 +79,77 @@ def load_or_fit_scaler(train_df, columns, scaler_file_name):
     return scaler
 
 
-def scale_and_save_datasets(base_file_name, output_folder, columns):
-    """Loads train and test datasets, scales them, and saves the scaled datasets."""
-    # Constructing file paths
-    train_file_path = Path(output_folder) / (base_file_name + '_train.xlsx')
-    test_file_path = Path(output_folder) / (base_file_name + '_test.xlsx')
+def load_or_fit_scaler_chunked(train_file, columns, scaler_file_name,
+                               chunk_rows=10000):
+    """
+    Like load_or_fit_scaler, but fits with StandardScaler.partial_fit on
+    the training file streamed in chunks of chunk_rows rows.
+    """
+    from joblib import load
+    from sklearn.preprocessing import StandardScaler
 
-    # Loading datasets
-    train_df = pd.read_excel(train_file_path)
-    test_df = pd.read_excel(test_file_path)
+    scaler_file_name = fingerprinted_name(
+        scaler_file_name, file_fingerprint(train_file, columns, chunk_rows))
+    scaler_path = Path('references') / scaler_file_name
+    if scaler_path.exists():
+        print(f'Loading existing scaler from {scaler_path}')
+        return load(scaler_path)
+
+    print(f'Fitting a new scaler on chunks of {chunk_rows} rows')
+    scaler = StandardScaler()
+    for chunk in dataset_io.iter_dataset_chunks(train_file, chunk_rows):
+        scaler.partial_fit(chunk[columns])
+    save_scaler(scaler, scaler_file_name)
+    return scaler
 
-    # Loading or fitting StandardScaler
-    scaler_file_name = base_file_name + '_scaler.joblib'
-    scaler = load_or_fit_scaler(train_df, columns, scaler_file_name)
 
-    # Applying the scaler to the datasets
-    train_df[columns] = scaler.transform(train_df[columns])
-    test_df[columns] = scaler.transform(test_df[columns])
+def scale_file_chunked(input_file, output_file, scaler, columns,
+                       chunk_rows=10000):
+    """Scales a dataset chunk by chunk while writing the scaled file."""
+    with dataset_io.ChunkWriter(output_file) as writer:
+        for chunk in dataset_io.iter_dataset_chunks(input_file, chunk_rows):
+            chunk[columns] = scaler.transform(chunk[columns])
+            writer.write(chunk)
 
-    # Saving the scaled datasets
+
+def scale_and_save_datasets(base_file_name, output_folder, columns,
+                            chunk_rows=None):
+    """
+    Loads train and test datasets, scales them, and saves the scaled datasets.
+    With chunk_rows the datasets are streamed in chunks instead of loaded,
+    so large train and test sets are scaled in bounded memory.
+    """
+    # Constructing file paths
+    train_file_path = Path(output_folder) / (base_file_name + '_train.xlsx')
+    test_file_path = Path(output_folder) / (base_file_name + '_test.xlsx')
     scaled_train_file_path = Path(
         output_folder) / (base_file_name + '_train_scaled.xlsx')
     scaled_test_file_path = Path(
         output_folder) / (base_file_name + '_test_scaled.xlsx')
+    scaler_file_name = base_file_name + '_scaler.joblib'
 
-    train_df.to_excel(scaled_train_file_path, index=False)
-    test_df.to_excel(scaled_test_file_path, index=False)
+    if chunk_rows:
+        scaler = load_or_fit_scaler_chunked(
+            train_file_path, columns, scaler_file_name, chunk_rows)
+        scale_file_chunked(train_file_path, scaled_train_file_path, scaler,
+                           columns, chunk_rows)
+        scale_file_chunked(test_file_path, scaled_test_file_path, scaler,
+                           columns, chunk_rows)
+    else:
+        # Loading datasets
+        train_df = pd.read_excel(train_file_path)
+        test_df = pd.read_excel(test_file_path)
+
+        # Loading or fitting StandardScaler
+        scaler = load_or_fit_scaler(train_df, columns, scaler_file_name)
+
+        # Applying the scaler to the datasets
+        train_df[columns] = scaler.transform(train_df[columns])
+        test_df[columns] = scaler.transform(test_df[columns])
+
+        # Saving the scaled datasets, streamed in constant memory
+        dataset_io.write_dataset(train_df, scaled_train_file_path)
+        dataset_io.write_dataset(test_df, scaled_test_file_path)
 
     print(f'Scaled training data saved to {scaled_train_file_path}')
     print(f'Scaled test data saved to {scaled_test_file_path}')
@@ -70,11 +167,15 @@ def main():
         help='Path to the folder where the scaled Excel files should be saved.')
     parser.add_argument('--columns', nargs='+',
                         help='List of columns to scale.')
+    parser.add_argument(
+        '--chunk_rows', type=int, default=None,
+        help='Fit and scale in chunks of this many rows instead of loading '
+             'the whole datasets.')
 
     args = parser.parse_args()
 
     scale_and_save_datasets(args.base_file_name,
-                            args.output_folder, args.columns)
+                            args.output_folder, args.columns, args.chunk_rows)
 
 
 if __name__ == '__main__':
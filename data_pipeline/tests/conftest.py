@@ -0,0 +1,5 @@
+"""Puts the pipeline modules on the import path."""
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'src' / 'data'))
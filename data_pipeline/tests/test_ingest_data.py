@@ -0,0 +1,64 @@
+"""merge_sorted gives the order of a full stable sort by AUCTION DATE."""
+import numpy as np
+import pandas as pd
+import pytest
+# pylint: disable=E0401
+import ingest_data
+
+
+def auction_frame(dates, source):
+    """Returns rows with the given dates, labelled by source and position."""
+    return pd.DataFrame({
+        'AUCTION DATE': dates,
+        'ROW': [f'{source}{i}' for i in range(len(dates))],
+    })
+
+
+def random_dates(rng, n_rows, missing=0.0):
+    """Returns dates of a few days, so that many are equal."""
+    dates = pd.Timestamp('2024-01-01') + pd.to_timedelta(
+        rng.integers(0, 10, n_rows), unit='D')
+    return pd.Series(dates).mask(rng.random(n_rows) < missing) \
+        .dt.strftime('%Y-%m-%d').tolist()
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_merge_equals_stable_sort(seed):
+    rng = np.random.default_rng(seed)
+    existing = ingest_data.sort_by_auction_date(
+        auction_frame(random_dates(rng, 50, missing=0.1), 'e'))
+    batch = auction_frame(random_dates(rng, 20, missing=0.1), 'b')
+
+    merged = ingest_data.merge_sorted(existing, batch)
+
+    expected = ingest_data.sort_by_auction_date(
+        pd.concat([existing, batch], ignore_index=True))
+    pd.testing.assert_frame_equal(merged, expected)
+    assert ingest_data.is_date_ordered(ingest_data.auction_dates(merged))
+
+
+def test_equal_dates_keep_existing_rows_first():
+    existing = auction_frame(['2024-01-01', '2024-01-02'], 'e')
+    batch = auction_frame(['2024-01-02', '2024-01-01'], 'b')
+
+    merged = ingest_data.merge_sorted(existing, batch)
+
+    assert merged['ROW'].tolist() == ['e0', 'b1', 'e1', 'b0']
+
+
+def test_newer_batch_is_appended_sorted():
+    existing = auction_frame(['2024-01-01', '2024-01-02'], 'e')
+    batch = auction_frame(['2024-01-04', '2024-01-03'], 'b')
+
+    merged = ingest_data.merge_sorted(existing, batch)
+
+    assert merged['ROW'].tolist() == ['e0', 'e1', 'b1', 'b0']
+
+
+def test_empty_store_takes_the_sorted_batch():
+    existing = auction_frame([], 'e')
+    batch = auction_frame(['2024-01-02', '2024-01-01'], 'b')
+
+    merged = ingest_data.merge_sorted(existing, batch)
+
+    assert merged['ROW'].tolist() == ['b1', 'b0']
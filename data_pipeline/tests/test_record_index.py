@@ -0,0 +1,42 @@
+"""RecordIndex.new_rows keeps only keys not stored and not repeated."""
+import numpy as np
+import pandas as pd
+# pylint: disable=E0401
+import record_index
+
+
+def test_new_rows_skips_stored_and_repeated_keys(tmp_path):
+    index = record_index.RecordIndex(tmp_path / 'store.pkl',
+                                     np.array([1, 2, 2], dtype='<u8'))
+
+    mask = index.new_rows(np.array([2, 3, 3, 1, 4], dtype='<u8'))
+
+    assert mask.tolist() == [False, True, False, False, True]
+
+
+def test_appended_keys_are_no_longer_new(tmp_path):
+    index = record_index.RecordIndex(tmp_path / 'store.pkl',
+                                     np.array([], dtype='<u8'))
+    keys = np.array([5, 6], dtype='<u8')
+
+    assert index.new_rows(keys).all()
+    index.append(keys)
+
+    assert not index.new_rows(keys).any()
+    assert len(index) == 2
+    assert np.fromfile(record_index.index_file(tmp_path / 'store.pkl'),
+                       dtype=record_index.KEY_DTYPE).tolist() == [5, 6]
+
+
+def test_record_keys_fall_back_to_image_name(tmp_path):
+    df = pd.DataFrame({'URL': ['https://a', ' ', None, 'https://a'],
+                       'ImageName': ['x.jpg', 'y.jpg', 'y.jpg', 'z.jpg']})
+    keys = record_index.record_keys(df)
+
+    # Rows 0 and 3 share the URL, rows 1 and 2 the image name
+    assert keys[0] == keys[3]
+    assert keys[1] == keys[2]
+    assert keys[0] != keys[1]
+
+    index = record_index.RecordIndex(tmp_path / 'store.pkl', keys[:1])
+    assert index.new_rows(keys).tolist() == [False, True, False, False]
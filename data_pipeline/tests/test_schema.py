@@ -0,0 +1,62 @@
+"""schema.validate splits off the rows that break the schema."""
+import pandas as pd
+import pytest
+# pylint: disable=E0401
+import schema
+
+
+def raw_frame(**overrides):
+    """Returns three valid raw rows, with columns replaced by overrides."""
+    columns = {column: ['a', 'b', 'c'] for column in schema.RAW_SCHEMA}
+    columns.update({'PRICE': ['100', '1,200', '50'],
+                    'AUCTION DATE': ['2024-05-11'] * 3}, **overrides)
+    return pd.DataFrame(columns)
+
+
+def test_valid_rows_are_parsed():
+    valid, rejected = schema.validate(raw_frame(), schema.RAW_SCHEMA)
+
+    assert rejected.empty
+    assert valid['PRICE'].tolist() == [100, 1200, 50]
+    assert pd.api.types.is_datetime64_any_dtype(valid['AUCTION DATE'])
+
+
+def test_broken_rules_are_reported_per_row():
+    df = raw_frame(PRICE=['100', '-5', 'cheap'],
+                   ARTIST=['a', None, 'c'])
+
+    valid, rejected = schema.validate(df, schema.RAW_SCHEMA)
+
+    assert valid.index.tolist() == [0]
+    assert rejected.index.tolist() == [1, 2]
+    assert rejected[schema.REASON_COLUMN].tolist() == [
+        'ARTIST: missing; PRICE: below 0', 'PRICE: not numeric']
+
+
+def test_parse_false_keeps_the_values():
+    valid, _ = schema.validate(raw_frame(), schema.RAW_SCHEMA, parse=False)
+
+    assert valid['PRICE'].tolist() == ['100', '1,200', '50']
+
+
+def test_scoring_schema_accepts_missing_price():
+    df = raw_frame(PRICE=[None, '10', ''])
+
+    valid, rejected = schema.validate(df, schema.SCORING_RAW_SCHEMA)
+
+    assert rejected.empty
+    assert valid['PRICE'].isna().tolist() == [True, False, True]
+
+
+def test_stripped_column_names_are_accepted():
+    df = raw_frame().rename(columns={'OBJECT': ' OBJECT'})
+
+    valid, _ = schema.validate(df, schema.RAW_SCHEMA)
+
+    assert 'OBJECT' in valid.columns
+
+
+def test_missing_column_raises():
+    with pytest.raises(schema.SchemaError, match='AUCTION DATE'):
+        schema.validate(raw_frame().drop(columns='AUCTION DATE'),
+                        schema.RAW_SCHEMA)
@@ -1,114 +1,134 @@
 import json
-import pandas as pd
-import subprocess
-from flask import Flask, request, jsonify
+import sys
+import threading
+import time
+from flask import Flask, Response, g, request, jsonify
 from pathlib import Path
+import model_server
+import request_metrics
+import worker_pool
+
+sys.path.append(
+    str(Path(__file__).resolve().parent.parent / 'data_pipeline' / 'src' / 'data'))
+# pylint: disable=E0401,C0413
+import stage_metrics
+# model_server puts model_training on the path
+import alert_outbox
+import model_registry
 
 app = Flask(__name__)
+# Stage metrics are aggregated as records are appended, not per scrape
+stage_aggregate = stage_metrics.StageMetricsAggregate()
+stage_aggregate_lock = threading.Lock()
 
 
-def load_previous_mape(filepath='model_training/models/previous_mape.txt'):
-    """Load the previous MAPE from a file if it exists."""
-    if Path(filepath).exists():
-        with open(filepath, 'r') as f:
-            return float(f.read().strip())
-    return None
+@app.before_request
+def start_request_timer():
+    """Stores the start time of the request."""
+    g.request_start = time.perf_counter()
 
 
-def save_mape(mape, filepath='model_training/models/previous_mape.txt'):
-    """Save the current MAPE to a file."""
-    model_output_path = Path(filepath).parent
-    # Create the directory if it doesn't exist
-    model_output_path.mkdir(parents=True, exist_ok=True)
+@app.after_request
+def record_request_latency(response):
+    """Adds the request duration to the latency histogram of its route."""
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    request_metrics.observe(
+        route, request.method, response.status_code,
+        time.perf_counter() - g.request_start)
+    return response
 
-    # Save the MAPE to the file
-    with open(filepath, 'w') as f:
-        f.write(str(mape))
 
-
-app = Flask(__name__)
-
-
-app = Flask(__name__)
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Exposes request latencies and pipeline stage metrics for Prometheus."""
+    with stage_aggregate_lock:
+        body = request_metrics.to_prometheus() + \
+            stage_metrics.to_prometheus(stage_aggregate.update())
+    return Response(
+        body, content_type='text/plain; version=0.0.4; charset=utf-8')
 
 
 @app.route('/webhook', methods=['POST'])
 def webhook():
+    """
+    Appends new rows to the raw store and processes it.
+    Accepts a JSON body with 'data' as a list of records (or a JSON string
+    of them), or a bulk NDJSON, CSV or Arrow IPC stream with the filename
+    in the query string.
+    """
+    # pandas is only needed to ingest new data, not to serve other routes
+    import pandas as pd
+    import ingest_data
+    import schema
+    import stream_ingest
+
     try:
-        # Retrieve data and filename from the request
-        request_data = request.json
-        filename = request_data.get('filename', 'results_2024_05_11.xlsx')
-        new_data_json = request_data.get('data')
-
-        # Convert the new data from JSON string to a list of dictionaries
-        new_data_list = json.loads(new_data_json)
-        print(new_data_list)
-        # Convert the list of dictionaries to a DataFrame
-        new_data_df = pd.DataFrame(new_data_list)
-
-        # Define the file path (assuming the file is stored in 'data_pipeline/data/processed/')
-        file_path = Path(f'data_pipeline/data/raw/{filename}')
-
-        # Check if the file exists and append the data
-        if file_path.exists():
-            # Load existing data
-            existing_data_df = pd.read_excel(file_path)
-
-            # Append new data to the existing data
-            combined_data_df = pd.concat(
-                [existing_data_df, new_data_df],
-                ignore_index=True)
+        if request.mimetype in stream_ingest.STREAM_READERS:
+            # Bulk upload - parsed in chunks straight from the request body
+            filename = request.args.get('filename', 'results_2024_05_11.xlsx')
+            file_path = Path(f'data_pipeline/data/raw/{filename}')
+            rows = stream_ingest.ingest_stream(
+                request.stream, request.mimetype, file_path)
         else:
-            # If the file doesn't exist, just use the new data
-            combined_data_df = new_data_df
-
-        # Save the combined data back to the file
-        combined_data_df.to_excel(file_path, index=False)
-
-        # Optionally, run a data processing shell script or other operations
-        # For example, running the script to preprocess the data
-        command = ['./data_pipeline/data_processing.sh', filename]
-        subprocess.run(command, check=True)
-
-        return jsonify({'message': 'Data appended, processed, and saved successfully'}), 200
-
-    except subprocess.CalledProcessError as e:
+            # Retrieve data and filename from the request
+            request_data = request.json
+            filename = request_data.get('filename', 'results_2024_05_11.xlsx')
+            new_data = request_data.get('data')
+
+            # Older clients send the records as a JSON string
+            if isinstance(new_data, str):
+                new_data = json.loads(new_data)
+            new_data_df = pd.DataFrame(new_data)
+
+            # Define the file path (assuming the file is stored in 'data_pipeline/data/raw/')
+            file_path = Path(f'data_pipeline/data/raw/{filename}')
+
+            # Merge the new rows into the store, keeping it ordered by AUCTION DATE
+            rows = ingest_data.ingest_batch(new_data_df, file_path)
+        print(f"{rows} rows appended to {file_path}")
+
+        # Process the data and retrain the model in pre-warmed workers
+        # instead of new interpreters
+        pool = worker_pool.get_worker_pool()
+        encoded_file, _ = pool.run(
+            'pipeline', timeout=worker_pool.JOB_TIMEOUT_SECONDS,
+            input_filename=filename)
+        results, _ = pool.run(
+            'train', timeout=worker_pool.JOB_TIMEOUT_SECONDS,
+            input_file=Path(encoded_file).name)
+
+        return jsonify({'message': 'Data appended, processed, and saved successfully',
+                        'rows': rows,
+                        'version': results['version'] if results else None}), 200
+
+    except schema.SchemaError as e:
+        # Malformed batches are refused before any cleaning runs
+        return jsonify({'error': f'Invalid data: {str(e)}'}), 400
+    except worker_pool.JobTimeoutError as e:
+        return jsonify({'error': f'Processing timed out: {str(e)}'}), 504
+    except worker_pool.WorkerJobError as e:
         return jsonify(
             {'error': f'Error occurred during processing: {str(e)}'}), 500
     except Exception as e:
         return jsonify({'error': f'Unexpected error: {str(e)}'}), 500
 
 
-if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000)
-
-
 @app.route('/train_model', methods=['POST'])
 def train_model():
     data = request.json
     filename = data.get('filename', 'results_2024_05_11.xlsx')
+    categorical = bool(data.get('categorical', False))
 
     try:
-        # Load the previous MAPE from the correct location
-        previous_mape = load_previous_mape(
-            filepath='model_training/models/previous_mape.txt')
-
-        # Run the model training script and pass the filename as an argument
-        command = ['python3', 'model_training/train_model.py', filename]
+        # MAPE of the model served before this training
+        previous_mape = model_registry.current_metrics().get('mape')
 
-        # Call the model training script and wait for it to complete
-        result = subprocess.run(command, check=True,
-                                capture_output=True, text=True)
+        # Train the model in a pre-warmed worker and wait for it to complete
+        results, output = worker_pool.get_worker_pool().run(
+            'train', timeout=worker_pool.JOB_TIMEOUT_SECONDS,
+            input_file=filename, categorical=categorical)
 
-        # Log output from the model training script
-        output = result.stdout
-
-        # Extract the current MAPE from the output (assuming MAPE is printed in the stdout)
-        current_mape = None
-        for line in output.splitlines():
-            if "MAPE:" in line:
-                current_mape = float(line.split("MAPE:")[
-                                     1].strip().replace('%', ''))
+        current_mape = results['mape'] if results is not None else None
 
         # Prepare the response message
         if current_mape is not None:
@@ -118,11 +138,7 @@ def train_model():
                 message = f"Model training completed successfully. Previous MAPE: {previous_mape}%. Current MAPE: {current_mape}%. Difference: {mape_diff:.2f}%."
             else:
                 message = f"Model training completed successfully. Current MAPE: {current_mape}%. No previous MAPE available."
-
-            # Save the current MAPE for future comparison in the correct location
-            save_mape(
-                current_mape,
-                filepath='model_training/models/previous_mape.txt')
+            message += f" Model version: {results['version']}."
 
         else:
             message = "Model training completed, but no MAPE was calculated."
@@ -131,11 +147,58 @@ def train_model():
             {'message': message,
              'output': output}), 200
 
-    except subprocess.CalledProcessError as e:
+    except worker_pool.WorkerJobError as e:
         return jsonify(
             {'error': f'Error occurred during model training: {str(e)}',
              'output': e.output}), 500
+    except worker_pool.JobTimeoutError as e:
+        return jsonify({'error': f'Model training timed out: {str(e)}'}), 504
+
+
+@app.route('/predict', methods=['POST'])
+def predict():
+    """Predicts prices with the promoted model version."""
+    data = request.json
+    records = data.get('data', [])
+    if isinstance(records, str):
+        records = json.loads(records)
+
+    try:
+        version, predictions = model_server.get_model_server().predict(records)
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 503
+    except (KeyError, ValueError, TypeError) as e:
+        return jsonify({'error': f'Invalid input data: {str(e)}'}), 400
+
+    return jsonify({'version': version, 'predictions': predictions}), 200
+
+
+@app.route('/model', methods=['GET'])
+def model_info():
+    """Returns the served version and all registered versions."""
+    version, _, metadata = model_server.get_model_server().get()
+    return jsonify({'version': version, 'metadata': metadata,
+                    'versions': model_registry.list_versions()}), 200
+
+
+@app.route('/model/promote', methods=['POST'])
+def promote_model():
+    """Promotes a version, or rolls back to the previous one."""
+    data = request.json or {}
+    try:
+        if data.get('version'):
+            version = data['version']
+            model_registry.promote(version)
+        else:
+            version = model_registry.rollback()
+    except KeyError as e:
+        return jsonify({'error': str(e.args[0])}), 404
+    return jsonify({'message': f'Model version {version} promoted.'}), 200
 
 
 if __name__ == '__main__':
+    # Start the workers now, so they are warm before the first job arrives
+    worker_pool.get_worker_pool()
+    # Sends the alerts the training jobs queue in the outbox
+    alert_outbox.get_alert_sender()
     app.run(host='0.0.0.0', port=5000)
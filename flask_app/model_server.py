@@ -0,0 +1,89 @@
+"""In-memory copy of the promoted model, reloaded when a version is promoted."""
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'model_training'))
+# pylint: disable=E0401,C0413
+import model_registry
+
+
+class ModelServer:
+    """
+    Serves the promoted model of the registry.
+
+    The CURRENT file of the registry is checked at most every
+    reload_seconds. When it names a new version, the model is loaded
+    while the old one keeps serving, and the (version, model, metadata)
+    tuple is then replaced in one assignment. Requests that already hold
+    the old tuple finish with the old model, so none are dropped.
+    Versions with exported trees are served by the NumPy evaluator,
+    without importing xgboost.
+    """
+
+    def __init__(self, registry_dir=model_registry.REGISTRY_DIR,
+                 reload_seconds=5.0):
+        self.registry_dir = registry_dir
+        self.reload_seconds = reload_seconds
+        self._loaded = (None, None, None)
+        self._checked_at = float('-inf')
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_seconds:
+            return
+        # Only one request loads a new version, the others keep serving
+        if not self._lock.acquire(blocking=self._loaded[1] is None):
+            return
+        try:
+            self._checked_at = now
+            version = model_registry.current_version(self.registry_dir)
+            if version is not None and version != self._loaded[0]:
+                model, metadata = model_registry.load_serving_model(
+                    version, self.registry_dir)
+                self._loaded = (version, model, metadata)
+                print(f"Serving model version {version}")
+        finally:
+            self._lock.release()
+
+    def get(self):
+        """Returns the version, model and metadata currently served."""
+        self._refresh()
+        return self._loaded
+
+    def predict(self, records):
+        """
+        Predicts prices of encoded records, or of filtered records for a
+        categorical model. Returns the version used and the predictions.
+        """
+        import pandas as pd
+
+        version, model, metadata = self.get()
+        if model is None:
+            raise LookupError('No model version has been promoted yet.')
+        X = pd.DataFrame.from_records(records, columns=metadata['features'])
+        if metadata.get('categories'):
+            X = X.astype({column: pd.CategoricalDtype(categories)
+                          for column, categories
+                          in metadata['categories'].items()})
+        else:
+            X = model_registry.mask_sparse_zeros(
+                X.apply(pd.to_numeric, errors='coerce'), metadata)
+        return version, model.predict(X).tolist()
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def get_model_server():
+    """Returns the model server of the serving process."""
+    global _server  # pylint: disable=W0603
+    with _server_lock:
+        if _server is None:
+            _server = ModelServer(reload_seconds=float(
+                os.getenv('MODEL_RELOAD_SECONDS', '5')))
+        return _server
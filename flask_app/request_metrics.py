@@ -0,0 +1,41 @@
+"""Request latency histograms of the Flask routes."""
+import threading
+
+# Upper bounds of the latency buckets in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+           30.0, 60.0, 120.0, 300.0, 600.0)
+
+_lock = threading.Lock()
+# (route, method, status) -> [bucket counts, sum of seconds, count]
+_histograms = {}
+
+
+def observe(route, method, status, seconds):
+    """Adds a single request duration to the histogram of its route."""
+    key = (route, method, str(status))
+    with _lock:
+        histogram = _histograms.setdefault(key, [[0] * len(BUCKETS), 0.0, 0])
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram[0][i] += 1
+        histogram[1] += seconds
+        histogram[2] += 1
+
+
+def to_prometheus():
+    """Renders the request histograms in the Prometheus text format."""
+    name = 'flask_request_duration_seconds'
+    lines = [f'# HELP {name} Latency of the Flask routes.',
+             f'# TYPE {name} histogram']
+    with _lock:
+        items = sorted((key, ([*value[0]], value[1], value[2]))
+                       for key, value in _histograms.items())
+    for (route, method, status), (buckets, total, count) in items:
+        labels = f'route="{route}",method="{method}",status="{status}"'
+        for bound, bucket_count in zip(BUCKETS, buckets):
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} '
+                         f'{bucket_count}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {count}')
+        lines.append(f'{name}_sum{{{labels}}} {total}')
+        lines.append(f'{name}_count{{{labels}}} {count}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,314 @@
+"""Pool of pre-warmed worker processes for pipeline and training jobs."""
+import collections
+import io
+import itertools
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import traceback
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from contextlib import redirect_stdout
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+JOB_PATHS = [PROJECT_ROOT / 'data_pipeline' / 'src' / 'data',
+             PROJECT_ROOT / 'model_training']
+
+# Libraries imported once by every worker before it accepts jobs
+WARM_UP_MODULES = ['numpy', 'pandas', 'sklearn.preprocessing',
+                   'sklearn.metrics', 'xgboost', 'unidecode', 'openpyxl',
+                   'run_pipeline', 'train_model']
+
+
+# Seconds a route waits for a job before answering 504
+JOB_TIMEOUT_SECONDS = float(os.getenv('JOB_TIMEOUT_SECONDS', '3600'))
+
+
+class WorkerJobError(Exception):
+    """A job failed in a worker process."""
+
+    def __init__(self, message, output=''):
+        super().__init__(message)
+        self.output = output
+
+
+class JobTimeoutError(Exception):
+    """A job did not finish in the time its caller waits for it."""
+
+
+def run_pipeline_job(input_filename, filter_date=None):
+    """Processes, filters and encodes a raw data file."""
+    import run_pipeline
+
+    return str(run_pipeline.run_pipeline(input_filename, filter_date))
+
+
+def train_model_job(input_file, categorical=False):
+    """Trains the model on a processed data file."""
+    import train_model
+
+    return train_model.train(input_file, categorical)
+
+
+JOB_HANDLERS = {
+    'pipeline': run_pipeline_job,
+    'train': train_model_job,
+}
+
+
+def current_rss_bytes():
+    """Returns the resident memory of the current process in bytes."""
+    try:
+        with open('/proc/self/statm', 'r', encoding='utf8') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        import stage_metrics
+
+        return stage_metrics.peak_rss_bytes() or 0
+
+
+def worker_main(job_queue, result_queue, max_jobs, max_rss_bytes):
+    """
+    Main loop of a worker process.
+    Runs the jobs the pool sends on its own job_queue, one at a time.
+    Every result says whether the worker retires after it: it exits after
+    max_jobs jobs or once its memory exceeds max_rss_bytes, so that the
+    pool sends it no more jobs and replaces it with a fresh worker.
+    """
+    for path in JOB_PATHS:
+        if str(path) not in sys.path:
+            sys.path.append(str(path))
+    for module in WARM_UP_MODULES:
+        __import__(module)
+
+    for jobs_done in itertools.count(1):
+        job = job_queue.get()
+        if job is None:
+            break
+        job_id, kind, kwargs = job
+        output = io.StringIO()
+        try:
+            with redirect_stdout(output):
+                result = JOB_HANDLERS[kind](**kwargs)
+            status = 'ok'
+        except Exception:  # pylint: disable=W0703
+            output.write(traceback.format_exc())
+            status, result = 'error', None
+        retiring = jobs_done >= max_jobs or \
+            current_rss_bytes() > max_rss_bytes
+        result_queue.put((status, job_id, result, output.getvalue(),
+                          retiring))
+        if retiring:
+            break
+
+
+class WorkerPool:
+    """
+    Long-lived worker processes that import pandas, sklearn and xgboost once.
+
+    Every worker has its own job queue and the pool sends a job only to an
+    idle worker, recording which worker runs it before sending it. Results
+    come back on a shared queue, where a collector thread resolves the
+    futures returned by submit and sends the next queued jobs. On every
+    pass the collector also replaces the workers that exited, retired
+    after max_jobs jobs or over the memory threshold, or killed, and fails
+    the job of a worker that died before sending its result instead of
+    letting it hang. A job that times out in run is cancelled and its
+    worker terminated, so it stops holding the data store.
+    """
+
+    # Seconds the collector waits for a result before checking the workers
+    POLL_SECONDS = 1
+
+    def __init__(self, size=2, max_jobs=20, max_rss_bytes=2 * 1024 ** 3):
+        self.size = size
+        self.max_jobs = max_jobs
+        self.max_rss_bytes = max_rss_bytes
+        self._context = multiprocessing.get_context('spawn')
+        self._result_queue = self._context.Queue()
+        self._job_ids = itertools.count()
+        self._futures = {}
+        self._pending = collections.deque()  # jobs not sent yet
+        self._workers = {}  # pid -> Process
+        self._job_queues = {}  # pid -> job queue of the worker
+        self._running = {}  # pid -> id of the job sent to the worker
+        self._retiring = set()  # pids of workers taking no more jobs
+        self._lock = threading.RLock()
+        self._closed = False
+        for _ in range(size):
+            self._start_worker()
+        self._collector = threading.Thread(
+            target=self._collect_results, daemon=True)
+        self._collector.start()
+
+    def _start_worker(self):
+        job_queue = self._context.Queue()
+        worker = self._context.Process(
+            target=worker_main, daemon=True,
+            args=(job_queue, self._result_queue, self.max_jobs,
+                  self.max_rss_bytes))
+        worker.start()
+        self._workers[worker.pid] = worker
+        self._job_queues[worker.pid] = job_queue
+
+    def submit(self, kind, **kwargs):
+        """Queues a job and returns a Future with its result."""
+        return self._submit(kind, kwargs)[1]
+
+    def _submit(self, kind, kwargs):
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f'Unknown job type: {kind}')
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('The worker pool is closed.')
+            job_id = next(self._job_ids)
+            self._futures[job_id] = future
+            self._pending.append((job_id, kind, kwargs))
+            self._dispatch()
+        return job_id, future
+
+    def run(self, kind, timeout=None, **kwargs):
+        """
+        Runs a job and waits for it, at most timeout seconds.
+        Returns the job result and its printed output.
+        Raises JobTimeoutError if the job did not finish in time, after
+        cancelling it.
+        """
+        job_id, future = self._submit(kind, kwargs)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError as e:
+            self.cancel(job_id)
+            raise JobTimeoutError(
+                f'The {kind} job did not finish in {timeout:.0f}s.') from e
+
+    def cancel(self, job_id):
+        """
+        Drops a queued job, or terminates the worker running it.
+        The worker is replaced by the collector.
+        """
+        with self._lock:
+            for job in self._pending:
+                if job[0] == job_id:
+                    self._pending.remove(job)
+                    self._resolve(job_id, error=WorkerJobError(
+                        f'Job {job_id} was cancelled.'))
+                    return
+            for pid, running_job in self._running.items():
+                if running_job == job_id:
+                    self._retiring.add(pid)
+                    self._workers[pid].terminate()
+                    return
+
+    def _dispatch(self):
+        """Sends queued jobs to the idle workers."""
+        with self._lock:
+            for pid, job_queue in self._job_queues.items():
+                if not self._pending:
+                    return
+                if pid in self._running or pid in self._retiring:
+                    continue
+                job = self._pending.popleft()
+                self._running[pid] = job[0]
+                job_queue.put(job)
+
+    def _resolve(self, job_id, result=None, error=None):
+        with self._lock:
+            future = self._futures.pop(job_id, None)
+        if future is None:
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _handle(self, message):
+        status, job_id, value, output, retiring = message
+        with self._lock:
+            for pid, running_job in list(self._running.items()):
+                if running_job == job_id:
+                    del self._running[pid]
+                    if retiring:
+                        self._retiring.add(pid)
+        if status == 'ok':
+            self._resolve(job_id, result=(value, output))
+        else:
+            self._resolve(job_id, error=WorkerJobError(
+                output.strip().splitlines()[-1], output))
+
+    def _collect_results(self):
+        while not self._closed:
+            try:
+                self._handle(self._result_queue.get(
+                    timeout=self.POLL_SECONDS))
+            except queue.Empty:
+                pass
+            self._replace_exited_workers()
+            self._dispatch()
+
+    def _read_sent_results(self):
+        """Handles the results already sent, without waiting."""
+        while True:
+            try:
+                self._handle(self._result_queue.get_nowait())
+            except queue.Empty:
+                return
+
+    def _replace_exited_workers(self):
+        exited = [(pid, worker) for pid, worker in list(self._workers.items())
+                  if not worker.is_alive()]
+        if not exited or self._closed:
+            return
+        # A worker sends its last result before exiting, read it first so
+        # that a finished job is not taken for lost
+        self._read_sent_results()
+        with self._lock:
+            for pid, worker in exited:
+                worker.join()
+                del self._workers[pid]
+                del self._job_queues[pid]
+                self._retiring.discard(pid)
+                job_id = self._running.pop(pid, None)
+                if job_id is not None:
+                    self._resolve(job_id, error=WorkerJobError(
+                        f'Worker {pid} exited with code {worker.exitcode} '
+                        f'while running job {job_id}.'))
+                self._start_worker()
+
+    def close(self):
+        """
+        Stops the workers once they finish their current jobs.
+        Jobs not started yet are failed.
+        """
+        with self._lock:
+            self._closed = True
+            pending = [job[0] for job in self._pending]
+            self._pending.clear()
+            workers = list(self._workers.values())
+            for job_queue in self._job_queues.values():
+                job_queue.put(None)
+        for job_id in pending:
+            self._resolve(job_id, error=WorkerJobError(
+                'The worker pool was closed.'))
+        for worker in workers:
+            worker.join()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_pool():
+    """Returns the pool of the serving process, starting it on first use."""
+    global _pool  # pylint: disable=W0603
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool(
+                size=int(os.getenv('WORKER_POOL_SIZE', '2')),
+                max_jobs=int(os.getenv('WORKER_MAX_JOBS', '20')),
+                max_rss_bytes=int(os.getenv('WORKER_MAX_RSS_MB', '2048'))
+                * 1024 ** 2)
+        return _pool
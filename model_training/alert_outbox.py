@@ -0,0 +1,231 @@
+"""Durable outbox of alert emails, delivered by a background sender."""
+import argparse
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+# pylint: disable=E0401
+import model_registry
+
+OUTBOX_DIR = Path(os.getenv(
+    'ALERT_OUTBOX_DIR',
+    Path(__file__).resolve().parent / 'models' / 'alert_outbox'))
+
+# Delivery attempts before an alert is moved to the failed folder
+MAX_ATTEMPTS = 8
+# Seconds before the first retry, doubled on every further failure
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+# Alerts sent over one SMTP connection
+BATCH_SIZE = 50
+
+
+def outbox_folder(state, outbox_dir=OUTBOX_DIR):
+    """Returns the 'pending', 'sent' or 'failed' folder of the outbox."""
+    folder = Path(outbox_dir) / state
+    folder.mkdir(parents=True, exist_ok=True)
+    return folder
+
+
+def enqueue_alert(subject, body, outbox_dir=OUTBOX_DIR):
+    """
+    Stores an alert in the outbox and returns its id.
+    Only a local file is written, the email is sent by deliver_pending.
+    """
+    alert_id = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime()) + \
+        f'-{uuid.uuid4().hex[:8]}'
+    alert = {'id': alert_id, 'subject': subject, 'body': body,
+             'created_at': time.time(), 'attempts': 0,
+             'next_attempt_at': 0, 'last_error': None}
+    model_registry.atomic_write_text(
+        outbox_folder('pending', outbox_dir) / f'{alert_id}.json',
+        json.dumps(alert, indent=4))
+    return alert_id
+
+
+def smtp_settings():
+    """Reads the SMTP settings from the environment."""
+    return {
+        'sender': os.getenv('SMTP_SENDER', 'default_sender@example.com'),
+        'receiver': os.getenv('SMTP_RECEIVER', 'default_receiver@example.com'),
+        'server': os.getenv('SMTP_SERVER', 'smtp.example.com'),
+        'port': int(os.getenv('SMTP_PORT', '587')),
+        # Without a user the server is used without login
+        'user': os.getenv('SMTP_USER', ''),
+        'password': os.getenv('SMTP_PASSWORD', ''),
+        # A local stand-in server usually has neither TLS nor login
+        'starttls': os.getenv('SMTP_STARTTLS', '1') != '0',
+        'timeout': float(os.getenv('SMTP_TIMEOUT', '10')),
+    }
+
+
+def due_alerts(outbox_dir=OUTBOX_DIR, now=None, limit=BATCH_SIZE):
+    """Returns the paths and contents of the pending alerts due for sending."""
+    now = time.time() if now is None else now
+    alerts = []
+    for path in sorted(outbox_folder('pending', outbox_dir).glob('*.json')):
+        with open(path, 'r', encoding='utf8') as f:
+            alert = json.load(f)
+        if alert['next_attempt_at'] <= now:
+            alerts.append((path, alert))
+        if len(alerts) >= limit:
+            break
+    return alerts
+
+
+def send_batch(alerts, settings):
+    """
+    Sends alerts over a single SMTP connection.
+    Returns the error of every alert that was not sent, by alert id.
+    Raises if the connection or the login fails, before anything is sent.
+    """
+    import smtplib
+    from email.mime.text import MIMEText
+
+    errors = {}
+    server = smtplib.SMTP(settings['server'], settings['port'],
+                          timeout=settings['timeout'])
+    try:
+        if settings['starttls']:
+            server.starttls()
+        if settings['user']:
+            server.login(settings['user'], settings['password'])
+        for alert in alerts:
+            msg = MIMEText(alert['body'])
+            msg['Subject'] = alert['subject']
+            msg['From'] = settings['sender']
+            msg['To'] = settings['receiver']
+            try:
+                server.sendmail(settings['sender'], settings['receiver'],
+                                msg.as_string())
+            except (smtplib.SMTPException, OSError) as e:
+                # e.g. a dropped connection or a socket timeout
+                errors[alert['id']] = str(e)
+    finally:
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            # The messages are already sent or failed, only the goodbye
+            # of the connection was lost
+            server.close()
+    return errors
+
+
+def retry_delay(attempts):
+    """Seconds to wait before the next attempt after the given failures."""
+    return min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+
+
+def deliver_pending(outbox_dir=OUTBOX_DIR, settings=None):
+    """
+    Sends the due alerts of the outbox in batches.
+    Sent alerts move to the 'sent' folder, failed ones are rescheduled with
+    an exponential backoff and moved to 'failed' after MAX_ATTEMPTS.
+    Returns the number of alerts sent.
+    """
+    settings = settings or smtp_settings()
+    sent = 0
+    while True:
+        alerts = due_alerts(outbox_dir)
+        if not alerts:
+            return sent
+        try:
+            errors = send_batch([alert for _, alert in alerts], settings)
+        except Exception as e:  # pylint: disable=W0703
+            # The connection failed, so none of the batch was sent
+            errors = {alert['id']: str(e) for _, alert in alerts}
+        now = time.time()
+        for path, alert in alerts:
+            if alert['id'] not in errors:
+                os.replace(path, outbox_folder('sent', outbox_dir) / path.name)
+                sent += 1
+                continue
+            alert['attempts'] += 1
+            alert['last_error'] = errors[alert['id']]
+            alert['next_attempt_at'] = now + retry_delay(alert['attempts'])
+            model_registry.atomic_write_text(path, json.dumps(alert, indent=4))
+            if alert['attempts'] >= MAX_ATTEMPTS:
+                os.replace(path, outbox_folder('failed', outbox_dir) / path.name)
+            print(f"Failed to send alert {alert['id']} "
+                  f"(attempt {alert['attempts']}): {alert['last_error']}")
+        if errors:
+            # Retry later instead of hammering an unavailable server
+            return sent
+
+
+class AlertSender:
+    """Background thread delivering the outbox every poll_seconds."""
+
+    def __init__(self, outbox_dir=OUTBOX_DIR, poll_seconds=30.0):
+        self.outbox_dir = outbox_dir
+        self.poll_seconds = poll_seconds
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        """Starts the sender thread."""
+        self._thread.start()
+        return self
+
+    def wake(self):
+        """Delivers the outbox now instead of at the next poll."""
+        self._wake.set()
+
+    def stop(self):
+        """Stops the sender thread after its current delivery."""
+        self._stopped.set()
+        self._wake.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                sent = deliver_pending(self.outbox_dir)
+                if sent:
+                    print(f'{sent} alert email(s) sent.')
+            except Exception as e:  # pylint: disable=W0703
+                print(f'Alert delivery failed: {e}')
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+
+_sender = None
+_sender_lock = threading.Lock()
+
+
+def get_alert_sender():
+    """Returns the sender of the serving process, starting it on first use."""
+    global _sender  # pylint: disable=W0603
+    with _sender_lock:
+        if _sender is None:
+            _sender = AlertSender(poll_seconds=float(
+                os.getenv('ALERT_POLL_SECONDS', '30'))).start()
+        return _sender
+
+
+def main():
+    """Function accepting arguments"""
+    parser = argparse.ArgumentParser(
+        description='Deliver the pending alert emails.')
+    parser.add_argument('--watch', action='store_true',
+                        help='Keep delivering new alerts until interrupted.')
+
+    args = parser.parse_args()
+
+    if args.watch:
+        sender = get_alert_sender()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            sender.stop()
+    else:
+        print(f'{deliver_pending()} alert email(s) sent.')
+
+
+if __name__ == '__main__':
+    main()
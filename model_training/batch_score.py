@@ -0,0 +1,187 @@
+"""Batch scoring of whole raw files with a registered model."""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import pandas as pd
+
+sys.path.append(
+    str(Path(__file__).resolve().parent.parent / 'data_pipeline' / 'src' / 'data'))
+# pylint: disable=E0401,C0413
+import column_types
+import dataset_io
+import encode_data_const
+import model_registry
+import process_data
+import schema
+import stage_metrics
+
+CHUNK_ROWS = 50000
+PREDICTION_COLUMN = 'PREDICTED PRICE'
+
+
+def load_scoring_model(version=None, registry_dir=model_registry.REGISTRY_DIR):
+    """Returns the model and metadata of a version, the promoted one by default."""
+    version = version or model_registry.current_version(registry_dir)
+    if version is None:
+        raise LookupError('No model version has been promoted yet.')
+    model, metadata = model_registry.load_model(version, registry_dir)
+    if not metadata.get('categories') and \
+            not (metadata.get('encodings') or {}).get('ARTIST'):
+        raise LookupError(
+            f'Model version {version} has no ARTIST encoding, '
+            'retrain it to score raw files.')
+    return model, metadata
+
+
+def select_chunks(input_file, chunk_rows, staging_dir):
+    """
+    First pass over a raw file: validates every chunk and keeps its rows
+    that pass the row-local filters (process_data.select_rows), staged as
+    pickles in staging_dir.
+    Returns the staged files, the number of raw rows and the PERIOD mode
+    of the whole file, the value run_pipeline fills empty PERIODs with.
+    """
+    staged_files, rows_in = [], 0
+    period_counts = pd.Series(dtype='int64')
+    chunks = dataset_io.iter_dataset_chunks(input_file, chunk_rows)
+    for number, chunk in enumerate(chunks):
+        rows_in += len(chunk)
+        selected, rejected = process_data.select_rows(chunk, scoring=True)
+        schema.quarantine(rejected, 'batch_score')
+        period_counts = period_counts.add(
+            selected['PERIOD'].value_counts(), fill_value=0)
+        staged_file = Path(staging_dir) / f'{number}.pkl'
+        selected.to_pickle(staged_file)
+        staged_files.append(staged_file)
+    return staged_files, rows_in, process_data.period_mode(period_counts)
+
+
+def transform_chunk(selected, mode_value, metadata, artist_resolver=None):
+    """
+    Cleans and encodes a chunk of selected rows the way the training data
+    was, with the PERIOD mode of the whole file.
+    Returns the cleaned rows and the model features, None for an empty chunk.
+    """
+    selected = process_data.artist_plan(artist_resolver).execute(selected)
+    cleaned, rejected = process_data.finish_cleaning(
+        selected, mode_value, scoring=True)
+    schema.quarantine(rejected, 'batch_score')
+    if cleaned.empty:
+        return cleaned, None
+    if metadata.get('categories'):
+        features = cleaned[metadata['features']].astype({
+            column: pd.CategoricalDtype(categories)
+            for column, categories in metadata['categories'].items()})
+    else:
+        features = model_registry.mask_sparse_zeros(
+            encode_data_const.encode_frame(
+                cleaned, metadata['encodings']['ARTIST'])[
+                    metadata['features']], metadata)
+    return cleaned, features
+
+
+def output_frame(cleaned, predictions):
+    """
+    Returns the cleaned rows with their predicted prices. Category columns
+    are written as text, their categories differ from chunk to chunk.
+    """
+    columns = {column: cleaned[column].astype(str)
+               for column in column_types.CATEGORICAL_COLUMNS
+               if column in cleaned.columns}
+    return cleaned.assign(**columns, **{PREDICTION_COLUMN: predictions})
+
+
+def score_file(input_file, output_file, version=None, chunk_rows=CHUNK_ROWS,
+               n_jobs=None, resolve_artists=False):
+    """
+    Scores a raw file chunk by chunk and writes the predicted prices.
+
+    A first pass validates and filters the chunks and counts the PERIOD
+    values, so empty PERIODs (and the YEARs taken from them) are filled
+    with the mode of the whole file, as run_pipeline fills them, and the
+    scores do not depend on chunk_rows. The selected rows are staged on
+    disk. Then only one chunk is transformed and one is predicted at a
+    time: while XGBoost predicts a chunk on n_jobs threads, the next
+    chunk is cleaned and encoded, so memory does not grow with the file.
+    The output is written chunk by chunk in the format of its extension,
+    Parquet by default.
+
+    Parameters:
+    input_file (str): Raw .xlsx, CSV or Parquet file, PRICE may be empty.
+    output_file (str): Path to the scored file.
+    version (str): Model version, the promoted one by default.
+    n_jobs (int): Prediction threads, all cores by default.
+
+    Returns:
+    int: Number of rows scored.
+    """
+    import artist_resolution
+
+    model, metadata = load_scoring_model(version)
+    model.set_params(n_jobs=n_jobs or os.cpu_count())
+    resolver = artist_resolution.ArtistResolver.load() \
+        if resolve_artists else None
+
+    def predict_and_write(writer, cleaned, features):
+        writer.write(output_frame(cleaned, model.predict(features)))
+        return len(cleaned)
+
+    start = time.perf_counter()
+    with stage_metrics.track_stage('batch_score') as stage, \
+            tempfile.TemporaryDirectory() as staging_dir, \
+            dataset_io.ChunkWriter(output_file) as writer, \
+            ThreadPoolExecutor(max_workers=1) as executor:
+        staged_files, stage['rows_in'], mode_value = select_chunks(
+            input_file, chunk_rows, staging_dir)
+        stage['rows_out'] = 0
+        pending = None
+        for staged_file in staged_files:
+            cleaned, features = transform_chunk(
+                pd.read_pickle(staged_file), mode_value, metadata, resolver)
+            if features is None:
+                continue
+            if pending is not None:
+                stage['rows_out'] += pending.result()
+            pending = executor.submit(
+                predict_and_write, writer, cleaned, features)
+        if pending is not None:
+            stage['rows_out'] += pending.result()
+    elapsed = time.perf_counter() - start
+
+    print(f"{stage['rows_out']} of {stage['rows_in']} rows scored with model "
+          f"version {metadata['version']} in {elapsed:.1f}s "
+          f"({stage['rows_out'] / max(elapsed, 1e-9):.0f} rows/s). "
+          f"Saved to {output_file}")
+    return stage['rows_out']
+
+
+def main():
+    """Function accepting arguments"""
+    parser = argparse.ArgumentParser(
+        description='Predict the prices of a whole raw auction file.')
+    parser.add_argument('input_file', type=str,
+                        help='Path to the raw .xlsx, CSV or Parquet file.')
+    parser.add_argument('output_file', type=str,
+                        help='Path to the scored .parquet, CSV or .xlsx file.')
+    parser.add_argument('--version', type=str, default=None,
+                        help='Model version, the promoted one by default.')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS,
+                        help='Rows transformed and predicted at once.')
+    parser.add_argument('--threads', type=int, default=None,
+                        help='Prediction threads, all cores by default.')
+    parser.add_argument('--resolve-artists', action='store_true',
+                        help='Map artists with the persisted artist mapping, '
+                             'for models trained with --resolve-artists.')
+
+    args = parser.parse_args()
+
+    score_file(args.input_file, args.output_file, args.version,
+               args.chunk_rows, args.threads, args.resolve_artists)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+"""Versioned store of the trained models with atomic promotion."""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from pathlib import Path
+# pylint: disable=E0401
+import tree_ensemble
+
+REGISTRY_DIR = Path(os.getenv(
+    'MODEL_REGISTRY_DIR',
+    Path(__file__).resolve().parent / 'models' / 'registry'))
+
+MODEL_FILE = 'model.joblib'
+# Trees of the model as NumPy arrays, served without xgboost and joblib
+TREES_FILE = 'trees.npz'
+METADATA_FILE = 'metadata.json'
+# Name of the promoted version, replaced atomically on promotion
+CURRENT_FILE = 'CURRENT'
+# Every promotion, so that a rollback can return to the previous version
+HISTORY_FILE = 'promotions.jsonl'
+
+
+def versions_dir(registry_dir=REGISTRY_DIR):
+    """Returns the folder holding one sub-folder per model version."""
+    return Path(registry_dir) / 'versions'
+
+
+def atomic_write_text(file_path, text):
+    """
+    Writes a text file through a temporary file and os.replace,
+    so readers see either the old or the new content, never a partial one.
+    """
+    file_path = Path(file_path)
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=file_path.parent,
+                                    prefix=f'.{file_path.name}.')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+
+def new_version_id():
+    """Returns a sortable version id: the UTC time and a random suffix."""
+    return time.strftime('%Y%m%dT%H%M%SZ', time.gmtime()) + \
+        f'-{uuid.uuid4().hex[:6]}'
+
+
+def register_model(model, metrics, features, categories=None,
+                   artifacts=None, source=None, encodings=None,
+                   sparse_features=None, registry_dir=REGISTRY_DIR):
+    """
+    Stores a trained model as a new version.
+
+    The version is written to a temporary folder which is renamed into
+    place once complete, so a version folder is never partially written.
+    XGBoost models the NumPy evaluator reproduces are also exported to
+    TREES_FILE.
+
+    Parameters:
+    model: Trained model, saved with joblib.
+    metrics (dict): Evaluation metrics, e.g. mape, mae, mse and r2.
+    features (list): Feature columns in the order the model expects.
+    categories (dict): Category lists of the categorical model.
+    encodings (dict): Value lists of the ordinal encoded features, by
+    feature, so new data can be encoded the same way.
+    sparse_features (list): Features the model was trained on with their
+    zeros absent from a sparse design, i.e. as missing values.
+    artifacts (list): Paths of further preprocessing files to keep.
+    source (str): Dataset the model was trained on.
+
+    Returns:
+    str: Id of the new version.
+    """
+    import joblib
+
+    versions = versions_dir(registry_dir)
+    versions.mkdir(parents=True, exist_ok=True)
+    version = new_version_id()
+    tmp_dir = Path(tempfile.mkdtemp(dir=versions, prefix=f'.{version}.'))
+    try:
+        joblib.dump(model, tmp_dir / MODEL_FILE)
+        try:
+            tree_ensemble.save_trees(tree_ensemble.export_booster(
+                model.get_booster(), features), tmp_dir / TREES_FILE)
+            trees_file = TREES_FILE
+        except (AttributeError, ValueError):
+            # Not an XGBoost model, or e.g. categorical splits
+            trees_file = None
+        artifact_names = []
+        for artifact in artifacts or []:
+            shutil.copy2(artifact, tmp_dir / Path(artifact).name)
+            artifact_names.append(Path(artifact).name)
+        metadata = {
+            'version': version,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'source': source,
+            'metrics': {name: float(value) for name, value in metrics.items()},
+            'features': list(features),
+            'categories': categories,
+            'encodings': encodings,
+            'sparse_features': sparse_features,
+            'artifacts': artifact_names,
+            'trees': trees_file,
+        }
+        with open(tmp_dir / METADATA_FILE, 'w', encoding='utf8') as f:
+            json.dump(metadata, f, indent=4)
+        os.rename(tmp_dir, versions / version)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return version
+
+
+def mask_sparse_zeros(X, metadata):
+    """
+    Returns the features with the zeros of the sparse features as NaN.
+    XGBoost reads an absent entry of a sparse design as missing, so a
+    model trained on one predicts dense records the same way only if
+    their zeros are missing too.
+    """
+    sparse_features = metadata.get('sparse_features')
+    if not sparse_features:
+        return X
+    X = X.copy()
+    X[sparse_features] = X[sparse_features].mask(X[sparse_features] == 0)
+    return X
+
+
+def list_versions(registry_dir=REGISTRY_DIR):
+    """Returns the metadata of all versions, oldest first."""
+    versions = versions_dir(registry_dir)
+    if not versions.exists():
+        return []
+    return [load_metadata(path.name, registry_dir)
+            for path in sorted(versions.iterdir())
+            if not path.name.startswith('.')]
+
+
+def load_metadata(version, registry_dir=REGISTRY_DIR):
+    """Returns the metadata of a version."""
+    metadata_file = versions_dir(registry_dir) / version / METADATA_FILE
+    if not metadata_file.exists():
+        raise KeyError(f'Unknown model version: {version}')
+    with open(metadata_file, 'r', encoding='utf8') as f:
+        return json.load(f)
+
+
+def load_model(version, registry_dir=REGISTRY_DIR):
+    """Returns the model and the metadata of a version."""
+    import joblib
+
+    metadata = load_metadata(version, registry_dir)
+    model = joblib.load(versions_dir(registry_dir) / version / MODEL_FILE)
+    return model, metadata
+
+
+def load_serving_model(version, registry_dir=REGISTRY_DIR):
+    """
+    Returns the exported trees of a version, which load in milliseconds
+    without xgboost, or the joblib model when the version has none.
+    The metadata is returned as well.
+    """
+    metadata = load_metadata(version, registry_dir)
+    if metadata.get('trees'):
+        return tree_ensemble.TreeEnsemble.load(
+            versions_dir(registry_dir) / version / metadata['trees']), metadata
+    return load_model(version, registry_dir)
+
+
+def current_version(registry_dir=REGISTRY_DIR):
+    """Returns the id of the promoted version, or None."""
+    current_file = Path(registry_dir) / CURRENT_FILE
+    try:
+        return current_file.read_text(encoding='utf8').strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def current_metrics(registry_dir=REGISTRY_DIR):
+    """Returns the metrics of the promoted version, or an empty dict."""
+    version = current_version(registry_dir)
+    if version is None:
+        return {}
+    return load_metadata(version, registry_dir)['metrics']
+
+
+def promote(version, registry_dir=REGISTRY_DIR):
+    """Makes a version the one served, replacing the CURRENT file atomically."""
+    load_metadata(version, registry_dir)
+    atomic_write_text(Path(registry_dir) / CURRENT_FILE, version + '\n')
+    with open(Path(registry_dir) / HISTORY_FILE, 'a', encoding='utf8') as f:
+        f.write(json.dumps({
+            'version': version,
+            'promoted_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        }) + '\n')
+    print(f"Promoted model version {version}")
+
+
+def rollback(registry_dir=REGISTRY_DIR):
+    """Promotes the version that was served before the current one."""
+    history_file = Path(registry_dir) / HISTORY_FILE
+    if not history_file.exists():
+        raise KeyError('No promotions to roll back.')
+    with open(history_file, 'r', encoding='utf8') as f:
+        history = [json.loads(line)['version'] for line in f if line.strip()]
+    current = current_version(registry_dir)
+    previous = [version for version in history if version != current]
+    if not previous:
+        raise KeyError('No previous model version to roll back to.')
+    promote(previous[-1], registry_dir)
+    return previous[-1]
+
+
+def main():
+    """Function accepting arguments"""
+    parser = argparse.ArgumentParser(
+        description='List, promote and roll back model versions.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('list', help='List the registered versions.')
+    promote_parser = subparsers.add_parser(
+        'promote', help='Serve the given version.')
+    promote_parser.add_argument('version', type=str)
+    subparsers.add_parser(
+        'rollback', help='Serve the previously promoted version.')
+
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        current = current_version()
+        for metadata in list_versions():
+            marker = '*' if metadata['version'] == current else ' '
+            print(f"{marker} {metadata['version']}  "
+                  f"MAPE {metadata['metrics'].get('mape', float('nan')):.2f}%  "
+                  f"{metadata['source']}")
+    elif args.command == 'promote':
+        promote(args.version)
+    else:
+        rollback()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,7 @@
+"""Puts the training scripts and the pipeline modules on the import path."""
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(ROOT / 'model_training'))
+sys.path.append(str(ROOT / 'data_pipeline' / 'src' / 'data'))
@@ -0,0 +1,87 @@
+"""Alerts of the outbox are delivered to a local stand-in SMTP server."""
+import socketserver
+import threading
+# pylint: disable=E0401
+import alert_outbox
+
+
+class StandInSMTPHandler(socketserver.StreamRequestHandler):
+    """Accepts every message, without TLS or AUTH, like a stand-in server."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.reply('220 stand-in ready')
+        while True:
+            line = self.rfile.readline().decode().strip()
+            command = line.split(' ', 1)[0].upper()
+            if command in ('EHLO', 'HELO', 'MAIL', 'RCPT', 'RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                while True:
+                    data_line = self.rfile.readline().decode()
+                    if data_line.rstrip('\r\n') == '.':
+                        break
+                    lines.append(data_line)
+                self.server.messages.append(''.join(lines))
+                self.reply('250 OK')
+            elif command == 'QUIT' or not line:
+                self.reply('221 Bye')
+                return
+            else:
+                # e.g. AUTH, which the stand-in does not offer
+                self.reply('502 Command not implemented')
+
+
+class StandInSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StandInSMTPHandler)
+        self.messages = []
+
+
+def stand_in_settings(server, monkeypatch):
+    monkeypatch.setenv('SMTP_SERVER', '127.0.0.1')
+    monkeypatch.setenv('SMTP_PORT', str(server.server_address[1]))
+    monkeypatch.setenv('SMTP_STARTTLS', '0')
+    monkeypatch.delenv('SMTP_USER', raising=False)
+    monkeypatch.delenv('SMTP_PASSWORD', raising=False)
+    return alert_outbox.smtp_settings()
+
+
+def test_deliver_pending_to_stand_in_server(tmp_path, monkeypatch):
+    server = StandInSMTPServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        settings = stand_in_settings(server, monkeypatch)
+        assert settings['user'] == ''
+        for number in range(3):
+            alert_outbox.enqueue_alert(f'Alert {number}', 'MAPE went up',
+                                       outbox_dir=tmp_path)
+
+        assert alert_outbox.deliver_pending(tmp_path, settings) == 3
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert len(server.messages) == 3
+    assert all('MAPE went up' in message for message in server.messages)
+    assert not list((tmp_path / 'pending').glob('*.json'))
+    assert len(list((tmp_path / 'sent').glob('*.json'))) == 3
+
+
+def test_unreachable_server_keeps_alerts_pending(tmp_path, monkeypatch):
+    server = StandInSMTPServer()
+    settings = stand_in_settings(server, monkeypatch)
+    # Nothing listens on the port once the server is closed
+    server.server_close()
+    alert_id = alert_outbox.enqueue_alert('Alert', 'MAPE went up',
+                                          outbox_dir=tmp_path)
+
+    assert alert_outbox.deliver_pending(tmp_path, settings) == 0
+    assert (tmp_path / 'pending' / f'{alert_id}.json').exists()
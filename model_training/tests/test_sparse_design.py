@@ -0,0 +1,65 @@
+"""A model trained on a sparse design predicts encoded records the same."""
+import numpy as np
+import pandas as pd
+import pytest
+# pylint: disable=E0401
+import encode_data
+import model_registry
+
+xgb = pytest.importorskip('xgboost')
+
+
+def filtered_frame(n_rows=400, seed=0):
+    """Returns filtered rows with a few values of every category."""
+    rng = np.random.default_rng(seed)
+    artists = np.array([f'Artist {i}' for i in range(8)])
+    artist = rng.integers(0, len(artists), n_rows)
+    signature = rng.integers(0, 3, n_rows)
+    return pd.DataFrame({
+        'ARTIST': artists[artist],
+        'TECHNIQUE': rng.choice(['Lithograph', 'Etching', 'Woodcut'], n_rows),
+        'SIGNATURE': np.array(['Hand signed', 'Not signed',
+                               'Plate signed'])[signature],
+        'CONDITION': rng.choice(['Good condition', 'New'], n_rows),
+        'TOTAL DIMENSIONS': rng.integers(0, 4, n_rows) * 500.0,
+        'YEAR': rng.integers(1960, 2000, n_rows),
+        'AUCTION DATE': pd.Timestamp('2024-05-11'),
+        'URL': [f'https://example.com/{i}' for i in range(n_rows)],
+        'ImageName': [f'{i}.jpg' for i in range(n_rows)],
+        'PRICE': 100.0 + artist * 50 + signature * 20 +
+                 rng.normal(0, 5, n_rows),
+    })
+
+
+@pytest.mark.parametrize('config', [
+    {'ARTIST': 'Ordinal', 'TECHNIQUE': 'Ordinal', 'SIGNATURE': 'Ordinal',
+     'CONDITION': 'Ordinal'},
+    {'ARTIST': 'Hash', 'TECHNIQUE': 'Ordinal', 'SIGNATURE': 'OneHot',
+     'CONDITION': 'OneHot'},
+])
+def test_sparse_and_dense_predictions_match(tmp_path, monkeypatch, config):
+    # The ordinal ARTIST encoding writes artist_order.json to the cwd
+    monkeypatch.chdir(tmp_path)
+    df = filtered_frame()
+    matrix, names, y, _, sparse_features = encode_data.encode_sparse(
+        df, config)
+    model = xgb.XGBRegressor(n_estimators=20).fit(matrix, y)
+    model.get_booster().feature_names = names
+
+    dense = encode_data.encode_frame(df, config)[names]
+    dense = model_registry.mask_sparse_zeros(
+        dense.apply(pd.to_numeric, errors='coerce'),
+        {'sparse_features': sparse_features})
+
+    np.testing.assert_array_equal(model.predict(matrix),
+                                  model.predict(dense))
+
+
+def test_ordinal_zeros_are_stored(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    config = {'ARTIST': 'Ordinal', 'TECHNIQUE': 'Ordinal',
+              'SIGNATURE': 'Ordinal', 'CONDITION': 'Ordinal'}
+    matrix, names, _, _, sparse_features = encode_data.encode_sparse(
+        filtered_frame(), config)
+    assert sparse_features == []
+    assert matrix.nnz == matrix.shape[0] * len(names)
@@ -0,0 +1,46 @@
+"""The NumPy tree evaluator predicts the same values as XGBoost."""
+import numpy as np
+import pandas as pd
+import pytest
+# pylint: disable=E0401
+import tree_ensemble
+
+xgb = pytest.importorskip('xgboost')
+
+
+def data_with_missing(n_rows=2000, n_features=8, seed=0):
+    """Returns float32 features with about 20% missing values, and a target."""
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n_rows, n_features)).astype(np.float32)
+    y = X[:, 0] * 3 + np.sin(X[:, 1]) + X[:, 2] * X[:, 3] + \
+        rng.normal(0, 0.1, n_rows)
+    X[rng.random(X.shape) < 0.2] = np.nan
+    return X, y
+
+
+@pytest.mark.parametrize('n_trees, max_depth', [(200, 6), (50, 10)])
+def test_predictions_equal_xgboost(n_trees, max_depth):
+    X, y = data_with_missing()
+    features = [f'f{i}' for i in range(X.shape[1])]
+    booster = xgb.train(
+        {'objective': 'reg:squarederror', 'max_depth': max_depth,
+         'eta': 0.1, 'seed': 0},
+        xgb.DMatrix(X, label=y, feature_names=features), n_trees)
+    ensemble = tree_ensemble.TreeEnsemble(
+        tree_ensemble.export_booster(booster, features))
+
+    # Unseen rows, with rows where every feature is missing
+    X_test, _ = data_with_missing(seed=1)
+    X_test[:10] = np.nan
+    expected = booster.predict(xgb.DMatrix(X_test, feature_names=features))
+    np.testing.assert_array_equal(ensemble.predict(X_test), expected)
+
+
+def test_categorical_splits_are_refused():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame({'c': pd.Categorical(rng.choice(list('abc'), 200))})
+    booster = xgb.train({'max_depth': 2},
+                        xgb.DMatrix(X, label=rng.normal(size=200),
+                                    enable_categorical=True), 2)
+    with pytest.raises(ValueError):
+        tree_ensemble.export_booster(booster, ['c'])
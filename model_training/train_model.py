@@ -1,14 +1,28 @@
 import os
-import smtplib
-from email.mime.text import MIMEText
+import sys
+import tempfile
 import numpy as np
 import pandas as pd
-import xgboost as xgb
-import joblib
-from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 from pathlib import Path
 import argparse
 
+sys.path.append(
+    str(Path(__file__).resolve().parent.parent / 'data_pipeline' / 'src' / 'data'))
+# pylint: disable=E0401,C0413
+import alert_outbox
+import column_types
+import columns_structure
+import dataset_io
+import encode_data
+import encode_data_const
+import model_registry
+import stage_metrics
+
+# Rows read at once when training from on-disk chunks
+CHUNK_ROWS = 100000
+# Boosting rounds, the XGBRegressor default
+N_ESTIMATORS = 100
+
 
 def mean_absolute_percentage_error(y_true, y_pred):
     y_true, y_pred = np.array(y_true), np.array(y_pred)
@@ -17,8 +31,38 @@ def mean_absolute_percentage_error(y_true, y_pred):
     return np.mean(np.abs((y_true - y_pred) / y_true)) * 100
 
 
-def load_dataset(file_path):
-    df = pd.read_excel(file_path)
+def load_dataset(file_path, categorical=False):
+    df = column_types.apply_dtype_policy(dataset_io.read_dataset(file_path))
+    if categorical:
+        df = prepare_categorical(df)
+    return split_features(df)
+
+
+def load_sparse_dataset(file_path):
+    """
+    Loads a sparse design matrix saved by 'encode_data.py --sparse'.
+    Returns the CSR features, PRICE, the feature names and ARTIST.
+    """
+    X, feature_names, y, artists = encode_data.load_sparse_design(file_path)
+    return X, pd.Series(y, name='PRICE'), feature_names, artists
+
+
+def prepare_categorical(df, artists=None):
+    """
+    Prepares the filtered, not encoded data for the categorical mode.
+    ARTIST, TECHNIQUE, SIGNATURE and CONDITION become category dtypes,
+    which XGBoost uses directly instead of the ordinal encoding.
+    ARTIST uses the given artists or those of the data.
+    """
+    df = column_types.to_categorical(
+        df[columns_structure.columns_to_select], artists)
+    if not pd.api.types.is_numeric_dtype(df['PRICE']):
+        df['PRICE'] = pd.to_numeric(
+            df['PRICE'].replace(',', '', regex=True), errors='coerce')
+    return df
+
+
+def split_features(df):
     # Drop unnecessary columns
     df = df.drop(columns=['AUCTION DATE', 'URL', 'ImageName'])
     # Separate features (X) and target (y)
@@ -27,131 +71,414 @@ def load_dataset(file_path):
     return X, y
 
 
+def train_regressor(X_train, y_train, categorical=False):
+    """
+    Trains the XGBoost model with the default parameters.
+    In the categorical mode the category columns are split on natively.
+    """
+    import xgboost as xgb
+
+    if categorical:
+        model = xgb.XGBRegressor(tree_method='hist', enable_categorical=True)
+    else:
+        model = xgb.XGBRegressor()
+    model.fit(X_train, y_train)
+    return model
+
+
 def notify_performance_drop(mape, baseline_mape):
+    """
+    Queues a performance alert in the alert outbox.
+    The email is sent by the background sender, so training never waits
+    on the SMTP server.
+    """
     message = f"Warning: Model MAPE has exceeded baseline by 10%.\n" \
               f"Model MAPE: {mape}%\nBaseline MAPE: {baseline_mape}%"
 
-    # Get email details from environment variables (safer than hardcoding)
-    sender = os.getenv('SMTP_SENDER', 'default_sender@example.com')
-    receiver = os.getenv('SMTP_RECEIVER', 'default_receiver@example.com')
-    smtp_server = os.getenv('SMTP_SERVER', 'smtp.example.com')
-    smtp_port = os.getenv('SMTP_PORT', 587)
-    smtp_user = os.getenv('SMTP_USER', 'default_user')
-    smtp_password = os.getenv('SMTP_PASSWORD', 'default_password')
-
-    msg = MIMEText(message)
-    msg['Subject'] = 'Model Performance Alert'
-    msg['From'] = sender
-    msg['To'] = receiver
-
-    # Connect to SMTP server and send email
-    try:
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(smtp_user, smtp_password)
-            server.sendmail(sender, receiver, msg.as_string())
-        print('Performance alert email sent.')
-    except Exception as e:
-        print(f'Failed to send email: {e}')
+    alert_id = alert_outbox.enqueue_alert('Model Performance Alert', message)
+    print(f'Performance alert {alert_id} queued.')
 
 
 def calculate_baseline(df):
     # Group by artist and calculate the mean price for each artist
-    baseline = df.groupby('ARTIST')['PRICE'].mean().reset_index()
+    baseline = df.groupby('ARTIST', observed=True)['PRICE'].mean().reset_index()
     # Merge the baseline back to the dataset to have the baseline prediction
     df = pd.merge(df, baseline, on='ARTIST', how='left',
                   suffixes=('', '_baseline'))
     return df['PRICE_baseline']
 
 
-def save_mape(mape, filepath='model_training/models/previous_mape.txt'):
-    """Save the current MAPE to a file."""
-    with open(filepath, 'w') as f:
-        f.write(str(mape))
-
-
-def load_previous_mape(filepath='model_training/models/previous_mape.txt'):
-    """Load the previous MAPE from a file if it exists."""
-    if Path(filepath).exists():
-        with open(filepath, 'r') as f:
-            return float(f.read().strip())
-    return None
-
-
-def main():
-    # Use argparse to accept the file name as an argument
-    parser = argparse.ArgumentParser(
-        description='Train XGBoost model on auction data.')
-    parser.add_argument(
-        'input_file', type=str,
-        help='Name of the input Excel file (without full path)')
-    args = parser.parse_args()
-
-    # Define the base path where the processed files are located
-    base_path = Path('data_pipeline/data/processed')
-
-    # Combine the base path with the input file name to get the full path
-    dataset_file = base_path / args.input_file
-
-    # Ensure the file exists before proceeding
-    if not dataset_file.exists():
-        print(f"Error: File {dataset_file} does not exist.")
-        return
+def model_categories(X):
+    """Returns the category lists the categorical model was trained with."""
+    return {column: X[column].cat.categories.tolist()
+            for column in column_types.CATEGORICAL_COLUMNS}
+
+
+def iter_feature_chunks(file_path, chunk_rows=CHUNK_ROWS, categorical=False,
+                        artists=None):
+    """
+    Yields the features and PRICE of a dataset chunk by chunk, prepared
+    like load_dataset prepares the whole dataset. In the categorical mode
+    artists are the ARTIST categories of every chunk, the artists of the
+    chunk by default. Numeric features are float32 in every chunk, as
+    XGBoost expects the same feature types from every batch.
+    """
+    for chunk in dataset_io.iter_dataset_chunks(file_path, chunk_rows):
+        df = column_types.apply_dtype_policy(chunk, artists)
+        if categorical:
+            df = prepare_categorical(df, artists)
+        X, y = split_features(df)
+        numeric = [column for column in X.columns
+                   if not isinstance(X[column].dtype, pd.CategoricalDtype)]
+        yield X.astype(dict.fromkeys(numeric, 'float32')), y
+
+
+def head_chunks(chunks, n_rows):
+    """Yields the (X, y) chunks up to the first n_rows rows."""
+    for X, y in chunks:
+        if n_rows <= 0:
+            return
+        yield X.iloc[:n_rows], y.iloc[:n_rows]
+        n_rows -= len(X)
+
+
+def external_memory_available():
+    """
+    Returns whether the installed XGBoost trains from external memory,
+    which needs ExtMemQuantileDMatrix (XGBoost 3.0 and newer).
+    """
+    import xgboost as xgb
+
+    return hasattr(xgb, 'ExtMemQuantileDMatrix')
+
+
+def batch_iterator(batches, cache_prefix):
+    """
+    Returns an XGBoost data iterator over the (X, y) chunks batches()
+    yields, started over on every reset. XGBoost pulls one chunk at a
+    time and keeps its quantized pages in files under cache_prefix.
+    """
+    import xgboost as xgb
+
+    class BatchIterator(xgb.DataIter):
+        """Feeds the chunks of batches() to XGBoost."""
+
+        def __init__(self):
+            super().__init__(cache_prefix=cache_prefix)
+            self.chunks = None
+
+        def next(self, input_data):
+            if self.chunks is None:
+                self.chunks = batches()
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return False
+            input_data(data=chunk[0], label=chunk[1])
+            return True
+
+        def reset(self):
+            self.chunks = None
+
+    return BatchIterator()
+
+
+class StreamedMetrics:
+    """
+    Accumulates MSE, MAE, MAPE and R2 over chunks of predictions, with
+    the values the metrics of the whole test set have.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.squared_error = self.absolute_error = 0.0
+        self.percentage_error = 0.0
+        # Mean of y_true and sum of its squared deviations from the mean
+        self.mean = self.m2 = 0.0
+
+    def update(self, y_true, y_pred):
+        """Adds a chunk of true and predicted values."""
+        y_true = np.asarray(y_true, dtype='float64')
+        y_pred = np.asarray(y_pred, dtype='float64')
+        n = len(y_true)
+        if n == 0:
+            return
+        errors = y_true - y_pred
+        self.squared_error += np.sum(errors ** 2)
+        self.absolute_error += np.sum(np.abs(errors))
+        self.percentage_error += \
+            mean_absolute_percentage_error(y_true, y_pred) * n
+        # Merges the variance of the chunk (Chan et al.)
+        mean = y_true.mean()
+        total = self.count + n
+        delta = mean - self.mean
+        self.m2 += np.sum((y_true - mean) ** 2) + \
+            delta ** 2 * self.count * n / total
+        self.mean += delta * n / total
+        self.count = total
+
+    @property
+    def mape(self):
+        """Mean absolute percentage error, in percent."""
+        return self.percentage_error / self.count
+
+    def results(self):
+        """Returns the mse, mae, mape and r2 of all chunks."""
+        if self.m2 > 0:
+            r2 = 1 - self.squared_error / self.m2
+        else:
+            r2 = 1.0 if self.squared_error == 0 else 0.0
+        return {'mse': self.squared_error / self.count,
+                'mae': self.absolute_error / self.count,
+                'mape': self.mape, 'r2': r2}
+
+
+def train_external_memory(dataset_file, categorical=False,
+                          chunk_rows=CHUNK_ROWS):
+    """
+    Trains and evaluates the model without loading the whole dataset.
+
+    The dataset is read in chunks of chunk_rows rows, three times: to
+    count the rows and sum the prices of every artist for the baseline,
+    to train on the first 80% of the rows and to evaluate the model and
+    the baseline. XGBoost builds its quantized training data from one
+    chunk at a time and caches it on disk (ExtMemQuantileDMatrix), so
+    memory is bounded by the chunk size instead of the dataset size.
+
+    Returns:
+    tuple: The model, the baseline MAPE, the model metrics, the feature
+    names and the categories of the categorical model.
+    """
+    import xgboost as xgb
+
+    # Count the rows, collect the artists and sum their prices
+    with stage_metrics.track_stage('train_model_load') as stage:
+        n_rows, artists, totals = 0, set(), None
+        for X, y in iter_feature_chunks(dataset_file, chunk_rows,
+                                        categorical):
+            n_rows += len(X)
+            if categorical:
+                artists.update(X['ARTIST'].cat.categories)
+            chunk_totals = pd.DataFrame({
+                'ARTIST': X['ARTIST'].astype(object),
+                'PRICE': y.astype('float64')}) \
+                .groupby('ARTIST')['PRICE'].agg(['sum', 'count'])
+            totals = chunk_totals if totals is None else \
+                totals.add(chunk_totals, fill_value=0)
+        stage['rows_in'] = stage['rows_out'] = n_rows
+    artists = sorted(artists) if categorical else None
+    # Mean price of every artist, the baseline prediction
+    baseline = totals['sum'] / totals['count']
+
+    def chunks():
+        return iter_feature_chunks(dataset_file, chunk_rows, categorical,
+                                   artists)
+
+    train_size = int(0.8 * n_rows)  # 80% for training
+    with stage_metrics.track_stage('train_model_fit') as stage, \
+            tempfile.TemporaryDirectory() as cache_dir:
+        batches = batch_iterator(lambda: head_chunks(chunks(), train_size),
+                                 os.path.join(cache_dir, 'train'))
+        dtrain = xgb.ExtMemQuantileDMatrix(
+            batches, enable_categorical=categorical)
+        # The parameters XGBRegressor trains with
+        booster = xgb.train({'objective': 'reg:squarederror',
+                             'tree_method': 'hist'},
+                            dtrain, num_boost_round=N_ESTIMATORS)
+        del dtrain
+        stage['rows_in'] = stage['rows_out'] = train_size
+
+    # Served and scored like a model trained by train_regressor
+    model = xgb.XGBRegressor(enable_categorical=categorical)
+    model.load_model(bytearray(booster.save_raw()))
+
+    with stage_metrics.track_stage('train_model_evaluate') as stage:
+        baseline_metrics, model_metrics = StreamedMetrics(), StreamedMetrics()
+        position, categories = 0, None
+        for X, y in chunks():
+            baseline_metrics.update(
+                y, X['ARTIST'].astype(object).map(baseline))
+            test_start = max(train_size - position, 0)
+            if test_start < len(X):
+                model_metrics.update(y.iloc[test_start:],
+                                     model.predict(X.iloc[test_start:]))
+            if categorical and categories is None:
+                categories = model_categories(X)
+            position += len(X)
+        stage['rows_in'] = n_rows
+        stage['rows_out'] = model_metrics.count
+
+    return (model, baseline_metrics.mape, model_metrics.results(),
+            booster.feature_names, categories)
+
+
+def train_in_memory(dataset_file, categorical=False):
+    """
+    Trains and evaluates the model on the whole dataset loaded in memory.
+    A .npz dataset is a sparse design matrix and is passed to XGBoost
+    without densifying it.
+
+    Returns:
+    tuple: The model, the baseline MAPE, the model metrics, the feature
+    names and the categories of the categorical model.
+    """
+    from sklearn.metrics import (
+        mean_squared_error, mean_absolute_error, r2_score)
 
     # Load the dataset
-    X, y = load_dataset(dataset_file)
+    with stage_metrics.track_stage('train_model_load') as stage:
+        if dataset_file.suffix == '.npz':
+            X, y, feature_names, artists = load_sparse_dataset(dataset_file)
+        else:
+            X, y = load_dataset(dataset_file, categorical)
+            feature_names, artists = list(X.columns), X['ARTIST']
+        stage['rows_in'] = stage['rows_out'] = X.shape[0]
 
     # Calculate baseline predictions
-    df = pd.read_excel(dataset_file)
-    baseline_y_pred = calculate_baseline(df)
+    with stage_metrics.track_stage('train_model_baseline') as stage:
+        # The loaded features already hold ARTIST and PRICE
+        baseline_y_pred = calculate_baseline(
+            pd.DataFrame({'ARTIST': artists, 'PRICE': y}))
+        stage['rows_in'] = stage['rows_out'] = X.shape[0]
 
     # Evaluate the baseline model performance
     baseline_mape = mean_absolute_percentage_error(y, baseline_y_pred)
-    print(f'Baseline MAPE: {baseline_mape}%')
-
-    # Load the previous MAPE from the file (if exists)
-    previous_mape = load_previous_mape()
 
     # Split the data into train and test sets
-    train_size = int(0.8 * len(X))  # 80% for training
+    train_size = int(0.8 * X.shape[0])  # 80% for training
     X_train, X_test = X[:train_size], X[train_size:]
     y_train, y_test = y[:train_size], y[train_size:]
 
     # Initialize and train the XGBoost model
-    model = xgb.XGBRegressor()
-    model.fit(X_train, y_train)
-
-    # Create a directory to save the model if it doesn't exist
-    model_output_path = Path('model_training/models')
-    model_output_path.mkdir(parents=True, exist_ok=True)
-
-    # Save the trained model
-    model_file = model_output_path / 'xgb_model_default_params.joblib'
-    joblib.dump(model, model_file)
-    print(f"Model saved to {model_file}")
+    with stage_metrics.track_stage('train_model_fit') as stage:
+        model = train_regressor(X_train, y_train, categorical)
+        # A sparse matrix carries no column names, the model needs them
+        # to predict on records
+        model.get_booster().feature_names = feature_names
+        stage['rows_in'] = stage['rows_out'] = X_train.shape[0]
 
     # Make predictions on the test set
-    y_pred = model.predict(X_test)
+    with stage_metrics.track_stage('train_model_evaluate') as stage:
+        y_pred = model.predict(X_test)
+
+        # Evaluate the model
+        evaluation = {'mse': mean_squared_error(y_test, y_pred),
+                      'mae': mean_absolute_error(y_test, y_pred),
+                      'mape': mean_absolute_percentage_error(y_test, y_pred),
+                      'r2': r2_score(y_test, y_pred)}
+        stage['rows_in'] = stage['rows_out'] = X_test.shape[0]
+
+    return (model, baseline_mape, evaluation, feature_names,
+            model_categories(X) if categorical else None)
+
+
+def train(input_file, categorical=False, promote=True, chunk_rows=None):
+    """
+    Trains and evaluates the model on a processed dataset.
+    The categorical mode trains on the filtered data from
+    'data_pipeline/data/interim' and skips the encoding stage.
+    A .npz dataset is a sparse design matrix and is passed to XGBoost
+    without densifying it.
+    With chunk_rows the dataset is never loaded as a whole: it is read
+    in chunks of chunk_rows rows and XGBoost trains from external memory
+    (see train_external_memory).
+    The model is stored as a new version of the model registry and
+    promoted, unless promote is False.
+    Returns the evaluation metrics and the version, or None if the dataset
+    does not exist.
+    """
+    # Define the base path where the processed files are located
+    if categorical:
+        base_path = Path('data_pipeline/data/interim')
+    else:
+        base_path = Path('data_pipeline/data/processed')
 
-    # Evaluate the model
-    mse = mean_squared_error(y_test, y_pred)
-    mae = mean_absolute_error(y_test, y_pred)
-    mape = mean_absolute_percentage_error(y_test, y_pred)
-    r2 = r2_score(y_test, y_pred)
+    # Combine the base path with the input file name to get the full path
+    dataset_file = base_path / input_file
+
+    # Ensure the file exists before proceeding
+    if not dataset_file.exists():
+        print(f"Error: File {dataset_file} does not exist.")
+        return None
+
+    if chunk_rows is not None and dataset_file.suffix == '.npz':
+        print(f"Error: {dataset_file} is a sparse design matrix, "
+              f"train on it without chunks.")
+        return None
+
+    if chunk_rows is not None and not external_memory_available():
+        import xgboost as xgb
+
+        print(f"Error: training from chunks needs XGBoost 3.0 or newer, "
+              f"found {xgb.__version__}.")
+        return None
+
+    # MAPE of the model served now (if any)
+    previous_mape = model_registry.current_metrics().get('mape')
+
+    if chunk_rows is None:
+        model, baseline_mape, evaluation, feature_names, categories = \
+            train_in_memory(dataset_file, categorical)
+    else:
+        model, baseline_mape, evaluation, feature_names, categories = \
+            train_external_memory(dataset_file, categorical, chunk_rows)
+    mse, mae, mape, r2 = (evaluation[name]
+                          for name in ('mse', 'mae', 'mape', 'r2'))
+    print(f'Baseline MAPE: {baseline_mape}%')
 
     # Check performance drop and notify if necessary
     if previous_mape is not None and mape > previous_mape * 1.10:
         notify_performance_drop(mape, previous_mape)
 
-    # Save the current MAPE for future comparison
-    save_mape(mape)
-
     # Print evaluation metrics
     print(f'MSE: {mse}')
     print(f'MAE: {mae}')
     print(f'MAPE: {mape}%')
     print(f'R2 Score: {r2}')
 
+    metrics = {'baseline_mape': baseline_mape, 'mse': mse, 'mae': mae,
+               'mape': mape, 'r2': r2}
+
+    # Store the model with its metrics as a new version
+    artists = None if categorical else \
+        encode_data_const.load_artists(dataset_file)
+    sparse_features = encode_data.load_sparse_features(dataset_file) \
+        if dataset_file.suffix == '.npz' else None
+    version = model_registry.register_model(
+        model, metrics, feature_names,
+        categories=categories,
+        source=str(dataset_file),
+        encodings={'ARTIST': artists} if artists is not None else None,
+        sparse_features=sparse_features)
+    print(f"Model saved as version {version}")
+    if promote:
+        model_registry.promote(version)
+
+    return {**metrics, 'version': version}
+
+
+def main():
+    # Use argparse to accept the file name as an argument
+    parser = argparse.ArgumentParser(
+        description='Train XGBoost model on auction data.')
+    parser.add_argument(
+        'input_file', type=str,
+        help='Name of the input Excel, Parquet or sparse .npz file (without full path)')
+    parser.add_argument(
+        '--categorical', action='store_true',
+        help='Train on the filtered data with native categorical support '
+             'instead of the encoded data.')
+    parser.add_argument(
+        '--no-promote', action='store_true',
+        help='Register the model without serving it.')
+    parser.add_argument(
+        '--chunk-rows', type=int, default=None,
+        help='Train from chunks of this many rows read from disk, with '
+             'XGBoost external memory, instead of loading the dataset.')
+    args = parser.parse_args()
+
+    train(args.input_file, args.categorical, promote=not args.no_promote,
+          chunk_rows=args.chunk_rows)
+
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,184 @@
+"""Tree ensembles exported to flat NumPy arrays and evaluated without xgboost."""
+import json
+import time
+import numpy as np
+
+# Objectives whose prediction is the raw sum of the trees
+IDENTITY_OBJECTIVES = {'reg:squarederror', 'reg:absoluteerror',
+                       'reg:pseudohubererror', 'reg:quantileerror'}
+# Rows evaluated at once, bounding the (rows x trees) node matrix
+BATCH_ROWS = 65536
+
+
+def parse_base_score(value):
+    """Parses the base score, a number or a one-element list in newer models."""
+    value = json.loads(value) if value.startswith('[') else float(value)
+    return float(value[0]) if isinstance(value, list) else value
+
+
+def export_booster(booster, features):
+    """
+    Converts an XGBoost booster to flat arrays.
+
+    The nodes of all trees are concatenated. Split nodes send a row to
+    'left' when its value is below 'threshold', to 'right' otherwise and
+    to 'default' when it is missing. Leaves point to themselves, so a
+    row that reached its leaf stays there while deeper trees are walked.
+
+    Raises ValueError for models the evaluator does not reproduce, i.e.
+    categorical splits, non-tree boosters and non-identity objectives.
+    """
+    model = json.loads(booster.save_raw('json'))['learner']
+    if model['gradient_booster']['name'] != 'gbtree':
+        raise ValueError('Only gbtree boosters can be exported.')
+    if model['objective']['name'] not in IDENTITY_OBJECTIVES:
+        raise ValueError(
+            f"Objective {model['objective']['name']} can not be exported.")
+    trees = model['gradient_booster']['model']['trees']
+    if int(model['gradient_booster']['model']['gbtree_model_param']
+           ['num_parallel_tree']) != 1:
+        raise ValueError('Forests of parallel trees can not be exported.')
+
+    roots, feature, threshold, left, right, default, value = \
+        [], [], [], [], [], [], []
+    depth, offset = 0, 0
+    for tree in trees:
+        if any(tree['split_type']):
+            raise ValueError('Categorical splits can not be exported.')
+        nodes = np.arange(len(tree['left_children']))
+        is_leaf = np.array(tree['left_children']) == -1
+        tree_left = np.where(is_leaf, nodes, tree['left_children']) + offset
+        tree_right = np.where(is_leaf, nodes, tree['right_children']) + offset
+        roots.append(offset)
+        feature.append(np.where(is_leaf, 0, tree['split_indices']))
+        # Leaves keep their value in split_conditions
+        conditions = np.array(tree['split_conditions'], dtype=np.float32)
+        threshold.append(np.where(is_leaf, np.float32(0), conditions))
+        value.append(np.where(is_leaf, conditions, np.float32(0)))
+        left.append(tree_left)
+        right.append(tree_right)
+        default.append(np.where(np.array(tree['default_left'], dtype=bool),
+                                tree_left, tree_right))
+        depth = max(depth, tree_depth(tree['left_children'],
+                                      tree['right_children']))
+        offset += len(nodes)
+
+    if features is None:
+        features = [f'f{index}' for index in range(
+            int(model['learner_model_param']['num_feature']))]
+    return {
+        'roots': np.array(roots, dtype=np.int32),
+        'feature': np.concatenate(feature).astype(np.int32),
+        'threshold': np.concatenate(threshold).astype(np.float32),
+        'left': np.concatenate(left).astype(np.int32),
+        'right': np.concatenate(right).astype(np.int32),
+        'default': np.concatenate(default).astype(np.int32),
+        'value': np.concatenate(value).astype(np.float32),
+        'base_score': np.float32(parse_base_score(
+            model['learner_model_param']['base_score'])),
+        'depth': np.int32(depth),
+        'features': np.array(features, dtype=str),
+    }
+
+
+def tree_depth(left_children, right_children):
+    """Returns the number of splits on the longest path of a tree."""
+    depth, level = 0, [0]
+    while True:
+        level = [child for node in level
+                 for child in (left_children[node], right_children[node])
+                 if child != -1]
+        if not level:
+            return depth
+        depth += 1
+
+
+def save_trees(arrays, file_path):
+    """Saves the exported arrays uncompressed, so they load without decoding."""
+    with open(file_path, 'wb') as f:
+        np.savez(f, **arrays)
+
+
+class TreeEnsemble:
+    """
+    Evaluates exported trees with NumPy only.
+
+    All trees of a batch of rows are walked together, one level per step,
+    as a (rows x trees) matrix of node indices. Values are compared in
+    float32 and the leaves are added tree by tree to the base score in
+    float32, as XGBoost does, so the predictions are equal to XGBoost's.
+    """
+
+    def __init__(self, arrays):
+        self.roots = arrays['roots']
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.left = arrays['left']
+        self.right = arrays['right']
+        self.default = arrays['default']
+        self.value = arrays['value']
+        self.base_score = np.float32(arrays['base_score'])
+        self.depth = int(arrays['depth'])
+        self.features = [str(feature) for feature in arrays['features']]
+        # Left and right child of node i at 2i and 2i + 1, so one step is
+        # a single lookup of children[2 * node + goes_right]
+        self._children = np.stack([self.left, self.right], axis=1).ravel()
+        self._default_right = self.default == self.right
+
+    @classmethod
+    def load(cls, file_path):
+        """Loads trees saved by save_trees."""
+        with np.load(file_path) as arrays:
+            return cls({name: arrays[name] for name in arrays.files})
+
+    def predict(self, X):
+        """Predicts a DataFrame with the model features, or a 2D array."""
+        if hasattr(X, 'columns'):
+            X = X[self.features].to_numpy(dtype=np.float32, na_value=np.nan)
+        X = np.asarray(X, dtype=np.float32)
+        return np.concatenate(
+            [self._predict_batch(X[start:start + BATCH_ROWS])
+             for start in range(0, len(X), BATCH_ROWS)]) \
+            if len(X) else np.empty(0, dtype=np.float32)
+
+    def _predict_batch(self, X):
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        for _ in range(self.depth):
+            values = X[rows, self.feature[nodes]]
+            goes_right = np.where(np.isnan(values), self._default_right[nodes],
+                                  ~(values < self.threshold[nodes]))
+            nodes = self._children[2 * nodes + goes_right]
+        leaves = self.value[nodes]
+        predictions = np.full(len(X), self.base_score, dtype=np.float32)
+        for tree in range(leaves.shape[1]):
+            predictions += leaves[:, tree]
+        return predictions
+
+
+def main():
+    """Function accepting arguments"""
+    import argparse
+    import joblib
+
+    parser = argparse.ArgumentParser(
+        description='Export an XGBoost model to flat NumPy tree arrays.')
+    parser.add_argument('model_file', type=str,
+                        help='Path to the joblib file of the XGBRegressor.')
+    parser.add_argument('output_file', type=str,
+                        help='Path to the .npz file of the trees.')
+
+    args = parser.parse_args()
+
+    booster = joblib.load(args.model_file).get_booster()
+    save_trees(export_booster(booster, booster.feature_names),
+               args.output_file)
+    start = time.perf_counter()
+    ensemble = TreeEnsemble.load(args.output_file)
+    print(f"{len(ensemble.roots)} trees with {len(ensemble.feature)} nodes "
+          f"saved to {args.output_file}, loaded in "
+          f"{(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()